@@ -21,6 +21,7 @@ from bpy.props import StringProperty, BoolProperty, EnumProperty
 from bpy.types import Operator
 
 from . import importBvh
+from . import bvhCache
 from . import registationCurve
 from . import cameraFollow
 from . import footskateCleanup
@@ -49,6 +50,12 @@ class MAOImportBVH(Operator, ImportHelper):
             default=True,
             )
 
+    use_cache: BoolProperty(
+            name="Use Cache",
+            description="Load parsed motion from .bvhc file beside the .bvh if it is up to date",
+            default=True,
+            )
+
     # blender's axis order is XYZ
     # but usually use ZXY
     axis: EnumProperty(
@@ -60,6 +67,7 @@ class MAOImportBVH(Operator, ImportHelper):
             )
 
     def execute(self, context):
+        bvhCache.BvhCache.enabled = self.use_cache
         path_animation = importBvh.MotionPathAnimation.AddPathAnimationFromFile(context, 
         (self.axis[0], self.axis[1], self.axis[2]), self.filepath)
         return {'FINISHED'}
@@ -125,6 +133,17 @@ class MAOGenerateAnimationPanel(bpy.types.Panel):
         row = layout.row()
         row.prop(context.scene,"bvh_animation_time_scaler",text="Time Scale")
 
+        row = layout.row()
+        row.prop(context.scene,"path_edit_incremental",text="Incremental Path Edit")
+        row.prop(context.scene,"path_edit_max_update_rate",text="Max Updates/s")
+
+        row = layout.row()
+        row.prop(context.scene,"path_segments",text="Path Segments")
+        row.prop(context.scene,"path_fit_tolerance",text="Fit Tolerance")
+
+        row = layout.row()
+        row.prop(context.scene,"keyframe_bulk_write",text="Bulk Keyframe Write")
+
         row = layout.row()
         row.operator('mao_animation.keyframe', text = "generate animation")
 
@@ -155,6 +174,18 @@ def register():
 
     bpy.types.Scene.bvh_animation_time_scaler = bpy.props.FloatProperty(default=1,min=0.001,max=10)
 
+    # update path in place while dragging control point, at most max_update_rate times per second(0 is no limit)
+    bpy.types.Scene.path_edit_incremental = bpy.props.BoolProperty(default=True)
+    bpy.types.Scene.path_edit_max_update_rate = bpy.props.FloatProperty(default=30,min=0,max=240)
+
+    # segments of path b-spline fitted when importing, if tolerance > 0
+    # the fewest segments(at most path_segments) whose fitting error <= tolerance is used
+    bpy.types.Scene.path_segments = bpy.props.IntProperty(default=1,min=1,max=256)
+    bpy.types.Scene.path_fit_tolerance = bpy.props.FloatProperty(default=0,min=0)
+
+    # write F-Curves of all frames at once, disable to insert keyframe frame by frame
+    bpy.types.Scene.keyframe_bulk_write = bpy.props.BoolProperty(default=True)
+
     registationCurve.register()
 
     cameraFollow.register()
@@ -177,6 +208,11 @@ def unregister():
     del bpy.types.Scene.select_collection_name
     del bpy.types.Scene.select_object_name
     del bpy.types.Scene.bvh_animation_time_scaler
+    del bpy.types.Scene.path_edit_incremental
+    del bpy.types.Scene.path_edit_max_update_rate
+    del bpy.types.Scene.path_segments
+    del bpy.types.Scene.path_fit_tolerance
+    del bpy.types.Scene.keyframe_bulk_write
 
 if __name__ == "__main__":
     register()
\ No newline at end of file
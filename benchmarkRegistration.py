@@ -0,0 +1,104 @@
+"""
+benchmark of time warp and whole registration curve on pairs of sample files,
+run without blender from this directory:
+python benchmarkRegistration.py [file_0.bvh file_1.bvh ...]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+import registrationCore
+import registrationPipeline
+
+SAMPLE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bvh_sample_files", "bvh_sample_files")
+
+SAMPLE_PAIRS = [
+    ("walk_loop.bvh", "frighten_walk.bvh"),
+    ("coolwalk.bvh", "sexywalk.bvh"),
+    ("cowboy.bvh", "footballexsize.bvh"),
+    ("ballet.bvh", "indiandance.bvh"),
+]
+
+# the list version is O(F0 * F1) python, skip it for long motion
+REFERENCE_MAX_CELLS = 400000
+
+# z is up in blender
+AXIS = ('X', 'Z', 'Y')
+
+# return:
+# motion:       registrationPipeline.MotionData
+# parameter:
+# file_path:    str, path of bvh
+def loadMotion(file_path):
+    return registrationPipeline.motionFromFile(file_path, AXIS)
+
+def measure(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+# return:
+# cost:     float, sum of distance of cells of path
+def pathCost(distance_map, path):
+    path = np.asarray(path)
+    return float(distance_map[path[:, 0], path[:, 1]].sum())
+
+def benchmarkPair(file_0, file_1, max_runs=(0, 2, 4), radius=8):
+    motion_0 = loadMotion(file_0)
+    motion_1 = loadMotion(file_1)
+    p_0 = motion_0.positions
+    p_1 = motion_1.positions
+    print("%s(%d) x %s(%d)" % (
+        os.path.basename(file_0), len(p_0), os.path.basename(file_1), len(p_1)))
+
+    (transform_map, distance_map), map_elapsed = measure(
+        lambda: (lambda T: (T, registrationCore.distanceMap(p_0, p_1, T)))(registrationCore.transformMap(p_0, p_1)))
+    print("    %-28s %8.3fs" % ("transform + distance map", map_elapsed))
+
+    rows = []
+    if distance_map.size <= REFERENCE_MAX_CELLS:
+        path, elapsed = measure(registrationCore.minimalCostConnectingPath, distance_map.tolist())
+        rows.append(("list(reference)", elapsed, path))
+
+    for max_run in max_runs:
+        path, elapsed = measure(registrationCore.timewarpPath, distance_map, max_run, False)
+        rows.append(("numpy, max run %d" % max_run, elapsed, path))
+        # multiscale compute its band of maps, full map is part of time of full time warp
+        rows.append(("map + numpy, max run %d" % max_run, map_elapsed + elapsed, path))
+        if max_run and registrationCore.numba is not None:
+            # first call compile kernel
+            registrationCore.timewarpPath(distance_map[:8, :8], max_run, True)
+            path, elapsed = measure(registrationCore.timewarpPath, distance_map, max_run, True)
+            rows.append(("numba, max run %d" % max_run, elapsed, path))
+
+        (path, transforms), elapsed = measure(
+            registrationCore.multiscaleTimewarp, p_0, p_1, radius, max_run=max_run)
+        rows.append(("multiscale, max run %d" % max_run, elapsed, path))
+
+    for name, elapsed, path in rows:
+        print("    %-28s %8.3fs  cost %12.2f  steps %d" % (name, elapsed, pathCost(distance_map, path), len(path)))
+
+    # whole registration curve, time warp -> alignment curve -> blend
+    for method in ('FULL', 'BAND', 'MULTISCALE'):
+        registration, elapsed = measure(
+            registrationPipeline.Registration, motion_0, motion_1, timewarp_method=method, timewarp_radius=radius)
+        B, blend_elapsed = measure(registration.blend, 0.5)
+        print("    %-28s %8.3fs  blend %8.3fs  steps %d" % (
+            "registration, " + method.lower(), elapsed, blend_elapsed, len(B)))
+
+def main(argv):
+    if len(argv) >= 2:
+        pairs = list(zip(argv[0::2], argv[1::2]))
+    else:
+        pairs = [
+            (os.path.join(SAMPLE_DIRECTORY, name_0), os.path.join(SAMPLE_DIRECTORY, name_1))
+            for name_0, name_1 in SAMPLE_PAIRS]
+
+    for file_0, file_1 in pairs:
+        benchmarkPair(file_0, file_1)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
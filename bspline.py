@@ -0,0 +1,233 @@
+"""
+piecewise uniform cubic b-spline evaluated and fitted with numpy, all parameters at once
+
+a spline of n segments has n + 3 control points, global parameter t in [0, 1]
+is mapped to segment s = floor(t * n) and local parameter t * n - s,
+points of segment s only depend on control points s ~ s+3
+"""
+
+import numpy as np
+
+# Geometric Matrix of uniform cubic b-spline
+GEOMETRIC_MATRIX = np.array((
+    [1, 4, 1, 0],
+    [-3, 0, 3, 0],
+    [3, -6, 3, 0],
+    [-1, 3, -3, 1],), dtype=np.float64) / 6.0
+
+# weight of second difference of control points added to fitting,
+# segments without data points(a jump of chord length) are interpolated by neighbor control points
+SMOOTHNESS = 1e-6
+
+# return:
+# M:    np.ndarray, shape is (n, 4), Monomial Bases (1, t, t^2, t^3) of every t
+# parameter:
+# t:            np.ndarray, shape is (n,)
+# derivative:   int, 0 is position, 1 is tangent, 2 is second derivative
+def monomialBases(t, derivative=0):
+    t = np.asarray(t, dtype=np.float64)
+    M = np.zeros((t.shape[0], 4))
+
+    if derivative == 0:
+        M[:, 0] = 1.0
+        M[:, 1] = t
+        M[:, 2] = t * t
+        M[:, 3] = t * t * t
+    elif derivative == 1:
+        M[:, 1] = 1.0
+        M[:, 2] = 2.0 * t
+        M[:, 3] = 3.0 * t * t
+    elif derivative == 2:
+        M[:, 2] = 2.0
+        M[:, 3] = 6.0 * t
+
+    return M
+
+# return:
+# B:    np.ndarray, shape is (n, 4), weight of 4 control points at every t
+# parameter: same as monomialBases
+def basisMatrix(t, derivative=0):
+    return monomialBases(t, derivative) @ GEOMETRIC_MATRIX
+
+# return:
+# spans:    np.ndarray, shape is (n,), segment index of every t
+# parameter:
+# t:        np.ndarray, shape is (n,)
+# segments: int
+def spanIndex(t, segments):
+    t = np.asarray(t, dtype=np.float64)
+    return np.clip(np.floor(t * segments).astype(np.intp), 0, segments - 1)
+
+# return:
+# spans:        np.ndarray, shape is (n,), segment index of every t
+# local_t:      np.ndarray, shape is (n,), parameter in segment [0, 1]
+def spanParameter(t, segments):
+    t = np.asarray(t, dtype=np.float64)
+    spans = spanIndex(t, segments)
+    return spans, t * segments - spans
+
+# return:
+# points:   np.ndarray, shape is (n, 3), (n x 4) @ (4 x 4) @ (4 x 3) of every segment
+# parameter:
+# t:            np.ndarray, shape is (n,), 0.0 <= t[i] <= 1.0
+# c_points:     np.ndarray or list[Vector], segments + 3 control points
+# derivative:   int, 1 return tangent d(point)/dt of every t
+def evaluate(t, c_points, derivative=0):
+    P = np.asarray([tuple(point)[0:3] for point in c_points], dtype=np.float64)
+    segments = len(P) - 3
+
+    spans, local_t = spanParameter(t, segments)
+    B = basisMatrix(local_t, derivative) * (segments ** derivative)
+
+    return np.einsum('nk,nkd->nd', B, P[spans[:, None] + np.arange(4)])
+
+# return:
+# c_points_amount:  int
+def controlPointsAmount(segments):
+    return segments + 3
+
+# every segment need enough data points, or its control points are not constrained by fitting
+# return:
+# segments: int, largest amount of segments for n data points, at least 1
+def maxSegments(n):
+    return max(n // 4, 1)
+
+# least square fitting of control points, only x and y are fitted, z is zero
+# design matrix has 4 nonzero per row(banded), it is solved directly by lstsq,
+# normal equation B^T B square condition number of chord length parameters with short segments
+# a small second difference term keep control points of empty segments on line of neighbors
+# return:
+# c_points: np.ndarray, shape is (segments+3, 3)
+# t:        np.ndarray, shape is (n,), chord length parameter of Q
+# parameter:
+# Q:            np.ndarray, shape is (n, 3), data points
+# segments:     int, amount of segments, clamped to maxSegments(n)
+def fit(Q, segments=1):
+    Q = np.asarray(Q, dtype=np.float64)
+    segments = min(segments, maxSegments(len(Q)))
+    amount = controlPointsAmount(segments)
+
+    t = chordLengthParameter(Q)
+    spans, local_t = spanParameter(t, segments)
+
+    # rows of data points, then rows of w D with target 0, D is second difference of control points
+    design = np.zeros((len(Q) + amount - 2, amount))
+    design[np.arange(len(Q))[:, None], spans[:, None] + np.arange(4)] = basisMatrix(local_t)
+    design[len(Q):] = np.sqrt(SMOOTHNESS * len(Q) / amount) * secondDifference(amount)
+    targets = np.zeros((len(design), 2))
+    targets[:len(Q)] = Q[:, 0:2]
+
+    c_points = np.zeros((amount, 3))
+    c_points[:, 0:2] = np.linalg.lstsq(design, targets, rcond=None)[0]
+
+    return c_points, t
+
+# return:
+# D:    np.ndarray, shape is (amount-2, amount), D @ P is P[i] - 2P[i+1] + P[i+2]
+# parameter:
+# amount:   int, amount of control points
+def secondDifference(amount):
+    D = np.zeros((max(amount - 2, 0), amount))
+    rows = np.arange(amount - 2)
+    D[rows, rows] = 1.0
+    D[rows, rows + 1] = -2.0
+    D[rows, rows + 2] = 1.0
+    return D
+
+# fit with smallest amount of segments(doubled every try) whose max error <= tolerance
+# return: same as fit
+# parameter:
+# Q:            np.ndarray, shape is (n, 3)
+# tolerance:    float, max distance of data point to spline in xy plane
+# max_segments: int
+def fitWithTolerance(Q, tolerance, max_segments=64):
+    Q = np.asarray(Q, dtype=np.float64)
+
+    segments = 1
+    while True:
+        c_points, t = fit(Q, segments)
+        error = np.linalg.norm((evaluate(t, c_points) - Q)[:, 0:2], axis=1).max()
+        if error <= tolerance or segments * 2 > min(max_segments, maxSegments(len(Q))):
+            return c_points, t
+        segments *= 2
+
+# return:
+# t:    np.ndarray, shape is (n,), t[0] = 0, t[n-1] = 1
+# parameter:
+# Q:    np.ndarray, shape is (n, 3)
+def chordLengthParameter(Q):
+    Q = np.asarray(Q, dtype=np.float64)
+
+    lengths = np.linalg.norm(np.diff(Q, axis=0), axis=1)
+
+    t = np.zeros(Q.shape[0])
+    t[1:] = np.cumsum(lengths)
+    if t[-1] > 0.0:
+        t /= t[-1]
+    t[-1] = 1.0
+
+    return t
+
+# chord length parameter computed in every segment separately, points stay in their segment,
+# so re-parameter after a local edit only change frames of edited segments
+# with 1 segment it is same as chordLengthParameter
+# return:
+# re_t:     np.ndarray, shape is (n,)
+# parameter:
+# t:        np.ndarray, shape is (n,), parameter decide segment of points
+# Q:        np.ndarray, shape is (n, 3), points
+# segments: int
+# frames:   np.ndarray, sorted indices of points to compute(whole segments), None is all
+# re_t:     np.ndarray, previous result, points not in frames are kept
+def reparameterize(t, Q, segments, frames=None, re_t=None):
+    Q = np.asarray(Q, dtype=np.float64)
+    spans = spanIndex(t, segments)
+
+    if frames is None:
+        frames = np.arange(len(Q))
+    if re_t is None:
+        re_t = np.array(t, dtype=np.float64)
+    else:
+        re_t = np.array(re_t, dtype=np.float64)
+    if len(frames) == 0:
+        return re_t
+
+    spans = spans[frames]
+    is_start = np.ones(len(frames), dtype=bool)
+    is_start[1:] = spans[1:] != spans[:-1]
+
+    lengths = np.zeros(len(frames))
+    lengths[1:] = np.linalg.norm(np.diff(Q[frames], axis=0), axis=1)
+    lengths[is_start] = 0.0
+    c = np.cumsum(lengths)
+
+    # cumulative length at start and end of own segment
+    start_idx = np.maximum.accumulate(np.where(is_start, np.arange(len(frames)), 0))
+    is_end = np.ones(len(frames), dtype=bool)
+    is_end[:-1] = is_start[1:]
+    end_idx = np.minimum.accumulate(np.where(is_end, np.arange(len(frames)), len(frames) - 1)[::-1])[::-1]
+
+    span_length = c[end_idx] - c[start_idx]
+    fraction = np.where(span_length > 0.0, (c - c[start_idx]) / np.where(span_length > 0.0, span_length, 1.0), 0.0)
+
+    re_t[frames] = (spans + fraction) / segments
+    if frames[-1] == len(Q) - 1:
+        re_t[-1] = 1.0
+
+    return re_t
+
+# return:
+# frames:   np.ndarray, indices of t in segments affected by changed control points
+# parameter:
+# t:                np.ndarray, shape is (n,)
+# segments:         int
+# c_points_idx:     list[int], index of changed control points
+def affectedFrames(t, segments, c_points_idx):
+    spans = set()
+    for idx in c_points_idx:
+        # control point idx is used by segment idx-3 ~ idx
+        for span in range(idx - 3, idx + 1):
+            if 0 <= span < segments:
+                spans.add(span)
+
+    return np.flatnonzero(np.isin(spanIndex(t, segments), list(spans)))
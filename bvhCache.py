@@ -0,0 +1,215 @@
+"""
+sidecar binary cache(.bvhc) of parsed bvh, channel data is loaded by np.memmap
+
+file layout:
+magic(4 bytes) | header length(uint32) | header(json, padded to DATA_ALIGN) | anim_data
+anim_data is (frames+1, joints, 6) array which is C order
+"""
+
+import os
+import json
+import struct
+
+import numpy as np
+
+MAGIC = b'BVHC'
+VERSION = 1
+DATA_ALIGN = 64
+EXTENSION = '.bvhc'
+
+class BvhCache:
+    enabled = True
+
+    hits = 0
+    misses = 0
+
+    # return:
+    # path: str, path of cache file of bvh file and axis
+    # parameter:
+    # file_path:    str, path of bvh
+    # axis:         tuple(str, str, str), blender axis to data axis
+    @staticmethod
+    def GetCachePath(file_path, axis):
+        base = os.path.splitext(file_path)[0]
+        return base + "." + "".join(axis) + EXTENSION
+
+    @staticmethod
+    def getSourceKey(file_path):
+        stat = os.stat(file_path)
+        return {
+            'path': os.path.abspath(file_path),
+            'mtime': stat.st_mtime_ns,
+            'size': stat.st_size,
+        }
+
+    @staticmethod
+    def readHeader(cache_file):
+        if cache_file.read(len(MAGIC)) != MAGIC:
+            return None, None
+        header_length = struct.unpack('<I', cache_file.read(4))[0]
+        header = json.loads(cache_file.read(header_length).decode('utf-8'))
+
+        data_offset = len(MAGIC) + 4 + header_length
+        return header, data_offset
+
+    # return:
+    # None if cache is missing or stale, else
+    # joints:       list[dict], same as bvhReader.readHierarchy
+    # frames:       int
+    # frame_time:   float
+    # anim_data:    np.memmap, shape is (frames+1, joints, 6), copy on write
+    # parameter:
+    # file_path:    str, path of bvh
+    # axis:         tuple(str, str, str)
+    @classmethod
+    def Load(cls, file_path, axis):
+        if not cls.enabled:
+            return None
+
+        cache_path = cls.GetCachePath(file_path, axis)
+        if not os.path.exists(cache_path):
+            cls.misses += 1
+            return None
+
+        try:
+            source = cls.getSourceKey(file_path)
+            with open(cache_path, 'rb') as cache_file:
+                header, data_offset = cls.readHeader(cache_file)
+
+            if (header is None or header['version'] != VERSION or
+                header['source'] != source or tuple(header['axis']) != tuple(axis)):
+                cls.misses += 1
+                return None
+
+            # mode 'c' is copy on write, file is never changed by editing animation
+            anim_data = np.memmap(
+                cache_path, dtype=np.dtype(header['dtype']), mode='c',
+                offset=data_offset, shape=tuple(header['shape']))
+
+            cached = header['joints'], header['frames'], header['frame_time'], anim_data
+        except (OSError, ValueError, TypeError, KeyError, struct.error):
+            # corrupt header or truncated data, bvh is parsed again
+            cls.Invalidate(file_path, axis)
+            cls.misses += 1
+            return None
+
+        cls.hits += 1
+        return cached
+
+    # write cache file, failure(e.g. read only directory) is ignored
+    # return:
+    # bool, cache file is written
+    # parameter:
+    # file_path:    str, path of bvh
+    # axis:         tuple(str, str, str)
+    # joints:       list[dict], from bvhReader.readHierarchy
+    # frames:       int
+    # frame_time:   float
+    # anim_data:    np.ndarray, shape is (frames+1, joints, 6)
+    @classmethod
+    def Save(cls, file_path, axis, joints, frames, frame_time, anim_data):
+        if not cls.enabled:
+            return False
+
+        anim_data = np.ascontiguousarray(anim_data)
+
+        cache_path = cls.GetCachePath(file_path, axis)
+        try:
+            header = {
+                'version': VERSION,
+                'source': cls.getSourceKey(file_path),
+                'axis': list(axis),
+                'joints': joints,
+                'frames': frames,
+                'frame_time': frame_time,
+                'dtype': anim_data.dtype.str,
+                'shape': list(anim_data.shape),
+            }
+            header_bytes = json.dumps(header).encode('utf-8')
+            # pad header so data start at aligned offset
+            header_bytes += b' ' * (-(len(MAGIC) + 4 + len(header_bytes)) % DATA_ALIGN)
+
+            # write to temp file and rename, other reader never see half file
+            temp_path = cache_path + ".tmp"
+            with open(temp_path, 'wb') as cache_file:
+                cache_file.write(MAGIC)
+                cache_file.write(struct.pack('<I', len(header_bytes)))
+                cache_file.write(header_bytes)
+                anim_data.tofile(cache_file)
+            os.replace(temp_path, cache_path)
+        except OSError:
+            return False
+
+        return True
+
+    # delete cache files of bvh file
+    # return:
+    # int, amount of deleted files
+    # parameter:
+    # file_path:    str, path of bvh
+    # axis:         tuple(str, str, str), None mean all axis
+    @classmethod
+    def Invalidate(cls, file_path, axis=None):
+        if axis is not None:
+            cache_paths = [cls.GetCachePath(file_path, axis)]
+        else:
+            base = os.path.splitext(file_path)[0]
+            directory = os.path.dirname(file_path) or '.'
+            prefix = os.path.basename(base) + "."
+            cache_paths = [
+                os.path.join(directory, name) for name in os.listdir(directory)
+                if name.startswith(prefix) and name.endswith(EXTENSION) and
+                len(name) == len(prefix) + 3 + len(EXTENSION)]
+
+        removed = 0
+        for cache_path in cache_paths:
+            try:
+                os.remove(cache_path)
+                removed += 1
+            except OSError:
+                pass
+
+        return removed
+
+    # delete stale cache files(source is deleted or changed) in directory
+    # return:
+    # int, amount of deleted files
+    # parameter:
+    # directory:    str
+    # remove_all:   bool, delete every cache file
+    @classmethod
+    def Cleanup(cls, directory, remove_all=False):
+        removed = 0
+        for name in os.listdir(directory):
+            if not name.endswith(EXTENSION):
+                continue
+
+            cache_path = os.path.join(directory, name)
+            is_stale = remove_all
+            if not is_stale:
+                try:
+                    with open(cache_path, 'rb') as cache_file:
+                        header, data_offset = cls.readHeader(cache_file)
+                    source = header['source']
+                    is_stale = (header['version'] != VERSION or
+                                cls.getSourceKey(source['path']) != source)
+                except (OSError, ValueError, TypeError, KeyError, struct.error):
+                    is_stale = True
+
+            if is_stale:
+                try:
+                    os.remove(cache_path)
+                    removed += 1
+                except OSError:
+                    pass
+
+        return removed
+
+    @classmethod
+    def GetStats(cls):
+        return {'hits': cls.hits, 'misses': cls.misses}
+
+    @classmethod
+    def ResetStats(cls):
+        cls.hits = 0
+        cls.misses = 0
@@ -0,0 +1,253 @@
+"""
+read bvh file in one pass:
+HIERARCHY is tokenized line by line, then MOTION rows are streamed in chunks
+from the same file handle into numpy array
+"""
+
+import itertools
+import warnings
+
+import numpy as np
+
+# default amount of frame rows convert at once
+FRAME_CHUNK = 4096
+
+# read HIERARCHY and the header of MOTION section, file stop at first frame row
+# return:
+# joints:       list[dict], in file order, every joint is
+#               {'name': str, 'parent': int(-1 is root), 'offset': tuple(x, y, z),
+#                'channels': list[str], 'end': tuple(x, y, z) offset of End Site or None}
+# frames:       int, number of frames
+# frame_time:   float, time per frame(sec/frame)
+# parameter:
+# file:         file object, opened in text mode
+def readHierarchy(file):
+    joints = []
+    # -1 is root's parent, None is End Site
+    joints_stack = [-1]
+    frames = None
+    frame_time = None
+
+    is_first_line = True
+    for line in file:
+        tokens = line.split()
+        if not tokens:
+            continue
+
+        if is_first_line:
+            if tokens[0].lower() != 'hierarchy':
+                raise Exception("This is not a BVH file")
+            is_first_line = False
+            continue
+
+        keyword = tokens[0].lower()
+        # root or joint
+        if keyword in {'root', 'joint'}:
+            joints.append({
+                'name': tokens[1],
+                'parent': joints_stack[-1],
+                'offset': (0.0, 0.0, 0.0),
+                'channels': [],
+                'end': None,
+            })
+            joints_stack.append(len(joints) - 1)
+
+        elif keyword == 'end' and len(tokens) > 1 and tokens[1].lower() == 'site':
+            # Just so we can remove the parents in a uniform way,
+            # the end has kids so this is a placeholder.
+            joints_stack.append(None)
+
+        elif keyword == 'offset':
+            offset = (float(tokens[1]), float(tokens[2]), float(tokens[3]))
+            if joints_stack[-1] is None:
+                # offset of End Site belong to its joint
+                joints[joints_stack[-2]]['end'] = offset
+            else:
+                joints[joints_stack[-1]]['offset'] = offset
+
+        elif keyword == 'channels':
+            joints[joints_stack[-1]]['channels'] = tokens[2:]
+
+        elif keyword == '}':
+            joints_stack.pop()
+
+        elif keyword == 'frames:':
+            frames = int(tokens[1])
+
+        elif keyword == 'frame' and len(tokens) > 2 and tokens[1].lower() == 'time:':
+            frame_time = float(tokens[2])
+            # next line is first frame
+            break
+
+    return joints, frames, frame_time
+
+# return:
+# channel_amount:   int, total channel in a line
+# parameter:
+# joints:           list[dict], from readHierarchy
+def countChannels(joints):
+    return sum(len(joint['channels']) for joint in joints)
+
+# return:
+# frames_data:  np.ndarray, shape is (frames, channel_amount), one row per frame
+# parameter:
+# text:             str, all frame rows of MOTION section(after "Frame Time:" line)
+# channel_amount:   int, total channel in a line
+# frames:           int, number of frames, None mean read all rows
+# dtype:            np.float32 or np.float64
+def parseFrames(text, channel_amount, frames=None, dtype=np.float64):
+    # whitespace and newline are both separator, so whole section convert at once
+    # token is not number stop fromstring(DeprecationWarning, ValueError in newer numpy)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', DeprecationWarning)
+            values = np.fromstring(text, dtype=dtype, sep=' ')
+    except ValueError:
+        values = None
+
+    # a blank or broken line shift every following frame, those texts are parsed line by line
+    lines = text.count('\n') + (len(text) > 0 and not text.endswith('\n'))
+    if values is None or values.size != lines * channel_amount:
+        values = parseLines(text.splitlines(), channel_amount, dtype)
+
+    rows = values.size // channel_amount
+    if frames is not None:
+        rows = min(rows, frames)
+
+    return values[:rows * channel_amount].reshape(rows, channel_amount)
+
+# lines whose amount of values is not channel_amount are skipped
+# return:
+# values:   np.ndarray, shape is (rows * channel_amount,)
+# parameter:
+# lines:            list[str], frame rows
+# channel_amount:   int, total channel in a line
+# dtype:            np.float32 or np.float64
+def parseLines(lines, channel_amount, dtype=np.float64):
+    rows = [tokens for tokens in (line.split() for line in lines) if len(tokens) == channel_amount]
+    if not rows:
+        return np.zeros(0, dtype=dtype)
+
+    # token is not number raise ValueError
+    return np.array(rows, dtype=dtype).reshape(-1)
+
+# stream frame rows from file, file must be at first frame row(after readHierarchy)
+# yield:
+# frames_data:  np.ndarray, shape is (<=chunk, channel_amount)
+# parameter:
+# file:             file object
+# channel_amount:   int, total channel in a line
+# frames:           int, number of frames, None mean read until end of file
+# chunk:            int, amount of lines convert at once
+# dtype:            np.float32 or np.float64
+def readFrameChunks(file, channel_amount, frames=None, chunk=FRAME_CHUNK, dtype=np.float64):
+    remain = frames
+    while remain is None or remain > 0:
+        lines = list(itertools.islice(file, chunk))
+        if not lines:
+            break
+
+        frames_data = parseFrames(''.join(lines), channel_amount, remain, dtype)
+        if remain is not None:
+            remain -= frames_data.shape[0]
+
+        yield frames_data
+
+# read all frame rows from file into one array, peak memory is output + one chunk
+# return:
+# frames_data:  np.ndarray, shape is (frames, channel_amount)
+# parameter: same as readFrameChunks
+def readFrames(file, channel_amount, frames=None, chunk=FRAME_CHUNK, dtype=np.float64):
+    if frames is None:
+        chunks = list(readFrameChunks(file, channel_amount, None, chunk, dtype))
+        if not chunks:
+            return np.zeros((0, channel_amount), dtype=dtype)
+        return np.concatenate(chunks)
+
+    frames_data = np.empty((frames, channel_amount), dtype=dtype)
+    row = 0
+    for data in readFrameChunks(file, channel_amount, frames, chunk, dtype):
+        frames_data[row:row + data.shape[0]] = data
+        row += data.shape[0]
+
+    return frames_data[:row]
+
+# generator for batch tools, never materialise whole motion
+# yield:
+# frames_data:  np.ndarray, shape is (<=chunk, channel_amount), raw channels in file order
+# parameter:
+# path:     str, path of bvh
+# chunk:    int, amount of frames per yield
+# dtype:    np.float32 or np.float64
+def iterFrames(path, chunk=FRAME_CHUNK, dtype=np.float64):
+    with open(path, 'r') as file:
+        joints, frames, frame_time = readHierarchy(file)
+        channel_amount = countChannels(joints)
+
+        yield from readFrameChunks(file, channel_amount, frames, chunk, dtype)
+
+# return:
+# channel_index:    np.ndarray, shape is (joints, 6)
+#                   channel_index[j] is column of (lx, ly, lz, rx, ry, rz) of joint j in a line
+#                   -1 mean joint has not that channel
+# channel_amount:   int, total channel in a line
+# parameter:
+# nodes_list:   list[NodeBVH], sorted by index
+def computeChannelIndex(nodes_list):
+    channel_index = np.full((len(nodes_list), 6), -1, dtype=np.intp)
+
+    line_idx = 0
+    for j, node in enumerate(nodes_list):
+        for i, axis in enumerate('XYZ'):
+            if axis in node.position_idx:
+                channel_index[j][i] = node.position_idx[axis] + line_idx
+            if axis in node.rotation_idx:
+                channel_index[j][i+3] = node.rotation_idx[axis] + line_idx
+
+        # offset line_idx
+        line_idx += len(node.position_idx)
+        line_idx += len(node.rotation_idx)
+
+    return channel_index, line_idx
+
+# return:
+# anim_data:    np.ndarray, shape is (frames+1, joints, 6)
+#               anim_data[0] is all zero(initial pose), anim_data[f+1] is frame f
+# parameter:
+# frames_data:      np.ndarray, shape is (frames, channel_amount)
+# channel_index:    np.ndarray, from computeChannelIndex
+def createAnimData(frames_data, channel_index):
+    frames = frames_data.shape[0]
+    joints = channel_index.shape[0]
+
+    anim_data = np.zeros((frames + 1, joints, 6), dtype=frames_data.dtype)
+
+    if frames_data.size > 0:
+        missing = channel_index < 0
+        anim_data[1:] = frames_data[:, np.where(missing, 0, channel_index)]
+        anim_data[1:, missing] = 0.0
+
+    return anim_data
+
+# computeChannelIndex of joints from readHierarchy, no NodeBVH
+# return: same as computeChannelIndex
+# parameter:
+# joints:   list[dict], from readHierarchy
+# axis:     tuple(str, str, str), blender axis to data axis, same as MotionPathAnimation.axis
+def computeJointsChannelIndex(joints, axis=('X', 'Y', 'Z')):
+    axis_d2b = {axis[0]:'X', axis[1]:'Y', axis[2]:'Z'}
+    channel_index = np.full((len(joints), 6), -1, dtype=np.intp)
+
+    line_idx = 0
+    for j, joint in enumerate(joints):
+        for i, channel in enumerate(joint['channels']):
+            channel = channel.lower()
+            column = 'XYZ'.index(axis_d2b[channel[0].upper()])
+            if channel.endswith('position'):
+                channel_index[j][column] = line_idx + i
+            elif channel.endswith('rotation'):
+                channel_index[j][column + 3] = line_idx + i
+
+        line_idx += len(joint['channels'])
+
+    return channel_index, line_idx
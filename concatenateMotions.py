@@ -1,5 +1,6 @@
 import math
 
+import numpy as np
 import bpy
 import bmesh
 from mathutils import Vector, Euler, Matrix, Quaternion, geometry
@@ -41,10 +42,10 @@ class ConcatenateMotions(Operator):
         if not NodeBVH.compareSkeleton(path_animation0.nodes_bvh, path_animation1.nodes_bvh):
             return {'CANCELLED'}
 
-        # create new bvh animation class
-        path_animation = path_animation0.copy()
+        # create new bvh animation class, anim_data is not copied, it is replaced by concatenated one
+        path_animation = path_animation0.copy(anim_data=False)
         # update new animation datas
-        self.concatenate(path_animation, path_animation1)
+        self.concatenate(path_animation, path_animation0, path_animation1)
         # rename
         path_animation.name = path_animation0.name + "$" + path_animation1.name
         # update new animation length
@@ -57,76 +58,65 @@ class ConcatenateMotions(Operator):
 
         return {'FINISHED'}
 
-    def concatenate(self, a0, a1):
+    # concatenate (frames+1, joints, 6) anim_data of a0 and a1 into animation
+    # parameter:
+    # animation:    MotionPathAnimation, copy of a0 without anim_data
+    # a0, a1:       MotionPathAnimation, skeletons of a0 and a1 are same
+    def concatenate(self, animation, a0, a1):
+        nodes_list = sorted(a0.nodes_bvh.values(), key=lambda node: node.index)
 
-        # append animation data
-        for node0 in a0.nodes_bvh.values():
-            node1 = a1.nodes_bvh[node0.name]
-            for i in range(2, len(node1.anim_data)):
-                data = node1.anim_data[i]
-                node0.anim_data.append([data[0], data[1], data[2], data[3], data[4], data[5]])
-            
-        # change root orientation
-        concatenate_frame = a0.frames_bvh + 1
-
-        concatenate_offset = [0, 0, 0, 0, 0, 0]
+        # joint axis of a1 in order of a0, it is a view if both are same order
+        order = [a1.nodes_bvh[node.name].index for node in nodes_list]
+        data1 = a1.anim_data[2:]
+        if order != list(range(len(order))):
+            data1 = data1[:, order]
 
-        root = NodeBVH.getRoot(a0.nodes_bvh)
+        # append animation data, rest pose and first frame of a1 are skipped
+        anim_data = np.concatenate((a0.anim_data, data1))
+        del data1
 
-        for i in range(6):
-            concatenate_offset[i] = root.anim_data[concatenate_frame-1][i] - root.anim_data[concatenate_frame][i]
+        # change root orientation, every channel of root continue from last frame of a0
+        concatenate_frame = a0.frames_bvh + 1
 
-        for i in range(concatenate_frame, len(root.anim_data)):
-            for j in range(6):
-                root.anim_data[i][j] += concatenate_offset[j]
+        root = NodeBVH.getRoot(a0.nodes_bvh)
+        root_data = anim_data[:, root.index]
+        root_data[concatenate_frame:] += root_data[concatenate_frame-1] - root_data[concatenate_frame]
 
         # smooth
-        for node in a0.nodes_bvh.values():
-            self.smooth(node, node.anim_data, concatenate_frame-1, 30)
-
-    def smooth(self, node, data, frame_concatenate, smooth_window):
-        
-        # order = ""
-        # start = min(node.rotation_idx.values())
-        # for i in range(start, start+3):
-        #     if node.rotation_idx['X'] == i:
-        #         order += "X"
-        #     elif node.rotation_idx['Y'] == i:
-        #         order += "Y"
-        #     elif node.rotation_idx['Z'] == i:
-        #         order += "Z"
-
-        # rot0 = NodeBVH.getRotation(node, frame_concatenate).to_quaternion()
-        # rot1 = NodeBVH.getRotation(node, frame_concatenate+1).to_quaternion()
-
-        # rot_diff = rot1.rotation_difference(rot0)
-
+        self.smooth(anim_data, concatenate_frame-1, 30)
+
+        # new_anim_data follow the concatenated anim_data, nodes view one array
+        animation.anim_data = anim_data
+        animation.new_anim_data = anim_data.copy()
+        NodeBVH.bindAnimData(animation.nodes_bvh, animation.anim_data, animation.new_anim_data)
+        animation.invalidatePoseCache()
+
+    # spread the rotation jump at concatenate frame over smooth_window frames of every joint
+    # parameter:
+    # data:                 np.ndarray, shape is (frames+1, joints, 6), modified in place
+    # frame_concatenate:    int, last frame of first motion
+    # smooth_window:        int
+    def smooth(self, data, frame_concatenate, smooth_window):
         frame_count = len(data)
-        for s in range(-smooth_window, smooth_window+1):
-            currentFrame = frame_concatenate + s
-            if currentFrame > 0 and currentFrame < frame_count:
-                data_idx = currentFrame + 1
-
-                # rot = NodeBVH.getRotation(node, data_idx).to_quaternion()
-
-                # factor = self.smooth_y(currentFrame, frame_concatenate, smooth_window)
-                # if factor < 0:
-                #     rot_diff.invert()
 
-                # rot = rot.slerp(rot @ rot_diff, abs(factor))
+        # frame frame_concatenate + s is data[frame_concatenate + s + 1]
+        frames = np.arange(frame_concatenate - smooth_window, frame_concatenate + smooth_window + 1)
+        valid = (frames > 0) & (frames + 1 < frame_count)
+        frames = frames[valid]
+        if len(frames) == 0:
+            return
 
-                # euler = rot.to_euler(order, Euler((data[data_idx][3],data[data_idx][4],data[data_idx][5]),order))
+        kernel = self.smoothKernel(smooth_window)[valid]
 
-                # data[data_idx][3] = euler[0]
-                # data[data_idx][4] = euler[1]
-                # data[data_idx][5] = euler[2]
+        # rotation jump of every joint, measured before smoothing
+        diff = data[frame_concatenate+1, :, 3:6] - data[frame_concatenate, :, 3:6]
+        data[frames[0]+1:frames[-1]+2, :, 3:6] += kernel[:, None, None] * diff
 
-                factor = self.smooth_y(currentFrame, frame_concatenate, smooth_window)
-                for i in (3,4,5):
-                    diff = (data[frame_concatenate+1][i] - data[frame_concatenate][i])
-                    data[data_idx][i] = data[data_idx][i] + diff * factor
+    # return:
+    # kernel:   np.ndarray, shape is (2*smooth_window+1,), smooth_y of offset -smooth_window to smooth_window
+    def smoothKernel(self, smooth_window):
+        return np.array([self.smooth_y(s, 0, smooth_window) for s in range(-smooth_window, smooth_window+1)])
 
-    
     def smooth_y(self, f, d, s):
         res = 0
 
@@ -1,5 +1,6 @@
 import bpy
 import bmesh
+import numpy as np
 
 from mathutils import Vector, Matrix
 
@@ -149,6 +150,31 @@ def createPolyCurve(context, collection, name, points):
 
     return curve_ob
 
+# update points of poly curve in place instead of removing and creating object
+# parameter
+# curve_ob: bpy.types.object, created by createPolyCurve
+# points:   list[Vector] or np.ndarray (n, 3)
+def updatePolyCurve(curve_ob, points):
+    points = np.asarray(points, dtype=np.float32).reshape(-1, 3)
+
+    curve_data = curve_ob.data
+    polyline = curve_data.splines[0]
+
+    # amount of points is changed, only a new spline can remove points
+    if len(polyline.points) > len(points):
+        curve_data.splines.remove(polyline)
+        polyline = curve_data.splines.new('POLY')
+    if len(polyline.points) < len(points):
+        polyline.points.add(len(points) - len(polyline.points))
+
+    co = np.ones((len(points), 4), dtype=np.float32)
+    co[:, 0:3] = points
+    polyline.points.foreach_set('co', co.ravel())
+
+    curve_data.update_tag()
+
+    return curve_ob
+
 # return
 # b_point:  Vecotr
 # parameter
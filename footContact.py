@@ -0,0 +1,106 @@
+"""
+foot contact labelling of whole motion, frames are labelled at once from world positions of foot
+only depend on numpy, so it can be used without blender
+
+interval is (start, end) of frames, end is exclusive
+"""
+
+import numpy as np
+
+# return:
+# contact:          np.ndarray, shape is (F,), bool
+# parameter:
+# positions:        np.ndarray, shape is (F, 3), world position of foot, z is up
+# frame_time:       float, second of a frame
+# height_threshold: float, foot is low when height above lowest foot is below
+#                   height_threshold * height range of foot
+# speed_threshold:  float, foot is still when speed is below speed_threshold * median speed of foot
+# hysteresis:       float, contact is kept until foot is higher or faster than (1 + hysteresis) * threshold
+def detectContacts(positions, frame_time, height_threshold=0.2, speed_threshold=0.5, hysteresis=0.5):
+    positions = np.asarray(positions, dtype=np.float64)
+    # speed is unknown without 2 frames
+    if len(positions) < 2:
+        return np.zeros(len(positions), dtype=bool)
+
+    height = positions[:, 2] - positions[:, 2].min()
+    height_range = max(height.max(), 1e-8)
+
+    # central difference, one side at both ends
+    speed = np.linalg.norm(np.gradient(positions, axis=0), axis=-1) / frame_time
+    speed_scale = max(np.median(speed), 1e-8)
+
+    enter = (height < height_threshold * height_range) & (speed < speed_threshold * speed_scale)
+    stay = ((height < (1.0 + hysteresis) * height_threshold * height_range) &
+            (speed < (1.0 + hysteresis) * speed_threshold * speed_scale))
+    enter &= stay
+
+    # contact start at enter frame and last until stay is false
+    index = np.arange(len(positions))
+    last_enter = np.maximum.accumulate(np.where(enter, index, -1))
+    last_leave = np.maximum.accumulate(np.where(stay, -1, index))
+
+    return stay & (last_enter > last_leave)
+
+# return:
+# intervals:    list[(int, int)], intervals of True frames
+# parameter:
+# mask:         np.ndarray, shape is (F,), bool
+# min_frames:   int, shorter intervals are dropped
+def maskToIntervals(mask, min_frames=1):
+    edges = np.diff(np.concatenate(([0], np.asarray(mask, dtype=np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    keep = ends - starts >= min_frames
+    return [(int(start), int(end)) for start, end in zip(starts[keep], ends[keep])]
+
+# return:
+# mask:         np.ndarray, shape is (frames,), bool
+def intervalsToMask(intervals, frames):
+    mask = np.zeros(frames, dtype=bool)
+    for start, end in intervals:
+        mask[start:end] = True
+    return mask
+
+# weight of cleanup of every frame, 1 in contact, falling to 0 in margin before and after contact
+# return:
+# weights:      np.ndarray, shape is (frames,), frames with weight > 0 are modified
+# parameter:
+# intervals:    list[(int, int)]
+# frames:       int
+# margin:       int, frames of blend in and blend out
+def contactWeights(intervals, frames, margin):
+    index = np.arange(frames)
+    # distance to the nearest contact frame
+    distance = np.full(frames, np.inf)
+    for start, end in intervals:
+        distance = np.minimum(distance, np.maximum(np.maximum(start - index, index - (end - 1)), 0))
+
+    t = np.clip(distance / (margin + 1), 0.0, 1.0)
+    # same as FootskateCleanup.AlphaBlend
+    return 2 * t * t * t - 3 * t * t + 1
+
+# return:
+# targets:      np.ndarray, shape is (F, 3), foot of every contact interval is planted at
+#               median of its position, height is not lower than plane_height
+# parameter:
+# positions:    np.ndarray, shape is (F, 3), world position of foot
+# intervals:    list[(int, int)]
+# weights:      np.ndarray, shape is (F,), from contactWeights
+# plane_height: float
+def contactTargets(positions, intervals, weights, plane_height):
+    positions = np.asarray(positions, dtype=np.float64)
+    if not intervals:
+        return positions.copy()
+
+    # margin frames use target of the nearest interval
+    centers = np.array([(start + end - 1) / 2.0 for start, end in intervals])
+    bounds = (centers[1:] + centers[:-1]) / 2.0
+    nearest = np.searchsorted(bounds, np.arange(len(positions)))
+
+    # foot is ankle, it is planted at its own contact height, not at plane
+    anchors = np.array([np.median(positions[start:end], axis=0) for start, end in intervals])
+    anchors[:, 2] = np.maximum(anchors[:, 2], plane_height)
+    planted = anchors[nearest]
+
+    return positions + weights[:, None] * (planted - positions)
@@ -2,12 +2,17 @@ import math
 
 import bpy
 import bmesh
+import numpy as np
 from mathutils import Vector, Euler, Matrix, Quaternion, geometry
 
 from bpy.props import StringProperty, BoolProperty, FloatProperty, EnumProperty
 from bpy.types import Operator
 
 from .importBvh import NodeBVH, MotionPathAnimation
+from .kinematics import PoseCache, PoseFK, matricesToQuaternions, quaternionsToMatrices
+from .keyframeWriter import KeyframePatch
+from . import inverseKinematics
+from . import footContact
 
 class FootskateCleanup:
 
@@ -15,6 +20,7 @@ class FootskateCleanup:
     def AlphaBlend(cls, t):
         return 2 * t * t * t - 3 * t * t + 1
     
+    # reference of inverseKinematics.solveFABRIK, one chain of one frame
     @classmethod
     def SolveIK(cls, jointPositions, jointRotations, target, useConstraint, constraint, Iterations=10, Epsilon=0.0001):
         totalLength = 0
@@ -105,6 +111,21 @@ class ApplyFootskateCleanup(Operator):
     left_foot = bpy.props.EnumProperty(name="LeftFootJoint", items = loadJoints)
     right_foot = bpy.props.EnumProperty(name="RightFootJoint", items = loadJoints)
 
+    ik_method = bpy.props.EnumProperty(
+            name="IK Method",
+            items=(('FABRIK', "FABRIK", "iterative, pole is current knee"),
+                   ('TWO_BONE', "Two Bone", "analytic solution of foot, knee and hip, no iteration")),
+            default='FABRIK',
+            )
+
+    # foot contact labelling, see footContact.detectContacts
+    contact_height = bpy.props.FloatProperty(name="Contact Height", default=0.2, min=0.0, max=1.0)
+    contact_speed = bpy.props.FloatProperty(name="Contact Speed", default=0.5, min=0.0, max=10.0)
+    contact_hysteresis = bpy.props.FloatProperty(name="Hysteresis", default=0.5, min=0.0, max=10.0)
+    contact_min_frames = bpy.props.IntProperty(name="Min Contact Frames", default=3, min=1, max=100)
+    # frames of blend in and blend out around contact
+    contact_margin = bpy.props.IntProperty(name="Blend Frames", default=5, min=0, max=100)
+
     @classmethod
     def poll(cls, context):
         animation_name = bpy.context.scene.footskate_cleanup_select_collection_name
@@ -134,6 +155,17 @@ class ApplyFootskateCleanup(Operator):
         row.prop(self, "left_foot")
         row = layout.row()
         row.prop(self, "right_foot")
+        row = layout.row()
+        row.prop(self, "ik_method")
+
+        row = layout.row()
+        row.prop(self, "contact_height")
+        row.prop(self, "contact_speed")
+        row = layout.row()
+        row.prop(self, "contact_hysteresis")
+        row.prop(self, "contact_min_frames")
+        row = layout.row()
+        row.prop(self, "contact_margin")
 
     def execute(self, context):
 
@@ -159,78 +191,104 @@ class ApplyFootskateCleanup(Operator):
         animation.context.scene.frame_start = 0
         animation.context.scene.frame_end = animation.frames_bvh - 1
 
-        root = NodeBVH.getRoot(animation.nodes_bvh)
-
-        for frame_idx in range(animation.frames_bvh):
-            animation.context.scene.frame_set(frame_idx * animation.interpolation_scaler)
-
-            self.SolveFootNode(animation, left, frame_idx)
-            self.SolveFootNode(animation, right, frame_idx)
-
-    def SolveFootNode(self, animation, footNode, frame_idx):
-        kneeNode = footNode.parent
-        hipNode  = kneeNode.parent
-
-        nodes = (footNode, kneeNode, hipNode)
-
-        jointPoses = []
-        jointRots  = []
-
-        for node in nodes:
-            ob = animation.skeleton.all_objects[animation.name+"."+node.name+"_head"]
-            jointPoses.append(ob.location.copy())
-            jointRots.append(ob.rotation_quaternion.copy())
-
-        intersection = geometry.intersect_line_plane(jointPoses[0], jointPoses[0] + Vector((0,0,1)), Vector((0,0,self.plane_height)), Vector((0,0,1)))
-
-        if intersection[2] > jointPoses[0][2]:
-            jointPoses, jointRots = FootskateCleanup.SolveIK(jointPoses, jointRots, intersection, True, jointPoses[1].copy(), Iterations=15)
-            
-            for i in range(len(nodes)):
-                # translation
-                translation = Matrix.Translation(jointPoses[i])
-                # rotation
-                rotation = jointRots[i].to_matrix()
-                for x in range(3):
-                    for y in range(3):
-                        translation[x][y] = rotation[x][y]
-
-                nodes[i].model_mat = translation
-                nodes[i].world_head = nodes[i].model_mat @ Vector((0.0, 0.0, 0.0))
-                nodes[i].world_tail = nodes[i].model_mat @ Vector(nodes[i].local_tail - nodes[i].local_head)
-
-            # update foot node's children
-            for child in footNode.children:
-                NodeBVH.updateWorldPosition(child, footNode.model_mat, frame_idx)
-            
-            # recursive set animation keyframe from hip node
-            self.SetAnimationFrame(animation, hipNode)
-
-    def SetAnimationFrame(self, animation, node):
-        # head
-        ob = animation.skeleton.all_objects[animation.name+"."+node.name+"_head"]
-
-        ob.location = (node.world_head.xyz)
-        ob.keyframe_insert(data_path="location", index=-1)
-
-        # is leaf
-        if len(node.children) == 0:
-            ob = animation.skeleton.all_objects[animation.name+"."+node.name+"_tail"]
-
-            ob.location = (node.world_tail.xyz)
-            ob.keyframe_insert(data_path="location", index=-1)
-
-        # line of head_to_tail
-        ob = animation.skeleton.all_objects[animation.name+"."+node.name]
-
-        ob.location = (node.world_head.xyz)
-        ob.keyframe_insert(data_path="location", index=-1)
-
-        ob.rotation_quaternion = (node.model_mat).to_quaternion()
-        ob.keyframe_insert(data_path="rotation_quaternion", index=-1)
-
+        # pose of keyframes(see MotionPathAnimation.createKeyFrame), corrected in place
+        pose = animation.getPose(PoseCache.PATH)
+        model_mats = pose.model_mats.copy()
+
+        # all frames of a foot are solved at once, only contact frames and their margins
+        modified = np.zeros(animation.frames_bvh, dtype=bool)
+        solved = []
+        for footNode in (left, right):
+            chain = [footNode.index, footNode.parent.index, footNode.parent.parent.index]
+
+            # (frames, 3, 3) positions and (frames, 3, 4) rotations of (foot, knee, hip)
+            jointPoses = pose.world_heads[:, chain]
+            jointRots = matricesToQuaternions(pose.model_mats[:, chain])
+
+            frames, targets = self.LabelFootContacts(animation, footNode, jointPoses[:, 0])
+            modified[frames] = True
+
+            jointPoses, jointRots = self.SolveFootNode(jointPoses[frames], jointRots[frames], targets)
+            self.ApplyFootNode(model_mats, footNode, frames, jointPoses, jointRots)
+
+            solved.append((self.GetSubtree(footNode.parent.parent), frames))
+
+        # only changed keyframes of hip and its descendants are patched, once per F-Curve
+        corrected = PoseFK(model_mats, animation.getForwardKinematics().tail_offsets)
+        keyframe_numbers = np.arange(animation.frames_bvh) * animation.interpolation_scaler
+
+        patch = KeyframePatch()
+        for nodes, frames in solved:
+            animation.writeNodesKeyframes(nodes, corrected, keyframe_numbers, frames, patch)
+        changed = patch.apply()
+
+        # cached pose of keyframes is the corrected pose, later edits and cleanup start from it
+        animation.getPoseCache().setPose(PoseCache.PATH, corrected)
+
+        self.report({'INFO'}, "Footskate cleanup modified %d of %d frames (%.1f%%), %d keyframes" % (
+            modified.sum(), animation.frames_bvh, 100.0 * modified.mean(), changed))
+
+    # contact intervals of foot are stored in animation.foot_contacts
+    # return:
+    # frames:       np.ndarray, index of frames to solve
+    # targets:      np.ndarray, shape is (len(frames), 3), target of foot
+    # parameter:
+    # positions:    np.ndarray, shape is (frames, 3), world position of foot
+    def LabelFootContacts(self, animation, footNode, positions):
+        contact = footContact.detectContacts(
+            positions, animation.frame_time_bvh,
+            self.contact_height, self.contact_speed, self.contact_hysteresis)
+        intervals = footContact.maskToIntervals(contact, self.contact_min_frames)
+        animation.foot_contacts[footNode.name] = intervals
+
+        weights = footContact.contactWeights(intervals, len(positions), self.contact_margin)
+        targets = footContact.contactTargets(positions, intervals, weights, self.plane_height)
+        # foot is never below plane
+        targets[:, 2] = np.maximum(targets[:, 2], self.plane_height)
+
+        frames = np.flatnonzero((weights > 0.0) | (positions[:, 2] < self.plane_height))
+        return frames, targets[frames]
+
+    # return:
+    # jointPoses:   np.ndarray, shape is (frames, 3, 3)
+    # jointRots:    np.ndarray, shape is (frames, 3, 4)
+    # parameter:
+    # targets:      np.ndarray, shape is (frames, 3), target of foot
+    def SolveFootNode(self, jointPoses, jointRots, targets):
+        if self.ik_method == 'TWO_BONE':
+            return inverseKinematics.solveTwoBone(jointPoses, targets, jointPoses[:, 1], jointRots)
+
+        return inverseKinematics.solveFABRIK(jointPoses, targets, jointPoses[:, 1], jointRots, iterations=15)
+
+    # write solved (foot, knee, hip) to model matrices of frames,
+    # descendants of foot keep their transform relative to foot
+    # parameter:
+    # model_mats:   np.ndarray, shape is (all frames, joints, 4, 4)
+    # frames:       np.ndarray, index of solved frames
+    # jointPoses:   np.ndarray, shape is (frames, 3, 3)
+    # jointRots:    np.ndarray, shape is (frames, 3, 4)
+    def ApplyFootNode(self, model_mats, footNode, frames, jointPoses, jointRots):
+        chain = [footNode.index, footNode.parent.index, footNode.parent.parent.index]
+        descendants = [node.index for node in self.GetSubtree(footNode)[1:]]
+
+        chain_mats = np.zeros((len(frames), 3, 4, 4))
+        chain_mats[..., :3, :3] = quaternionsToMatrices(jointRots)
+        chain_mats[..., :3, 3] = jointPoses
+        chain_mats[..., 3, 3] = 1.0
+
+        delta = chain_mats[:, 0] @ np.linalg.inv(model_mats[frames, footNode.index])
+        model_mats[frames[:, None], chain] = chain_mats
+        if descendants:
+            model_mats[frames[:, None], descendants] = delta[:, None] @ model_mats[frames[:, None], descendants]
+
+    # return:
+    # nodes:    list[NodeBVH], node and all its descendants, node is first
+    @staticmethod
+    def GetSubtree(node):
+        nodes = [node]
         for child in node.children:
-            self.SetAnimationFrame(animation, child)
+            nodes.extend(ApplyFootskateCleanup.GetSubtree(child))
+        return nodes
 
 def draw(context, layout):
     row = layout.row()
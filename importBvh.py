@@ -5,9 +5,16 @@ modify from import_bvh.py
 import bpy
 import math
 import os
+import time
+import numpy as np
 from mathutils import Vector, Euler, Matrix
 
-from .createBlenderThing import createCollection, createCamera, createCube, createLine, createPyramid, createPolyCurve
+from .createBlenderThing import createCollection, createCamera, createCube, createLine, createPyramid, createPolyCurve, updatePolyCurve
+from .bvhReader import readHierarchy, readFrames, computeChannelIndex, createAnimData
+from .bvhCache import BvhCache
+from .kinematics import ForwardKinematics, PoseCache, matricesToQuaternions
+from .keyframeWriter import writeKeyframes, clearKeyframes
+from . import bspline
 
 # axis and index relationship
 axis_idx = {
@@ -35,8 +42,9 @@ class NodeBVH:
         'world_tail',
         # Localspace rest location for the tail of this node.
         'local_tail',
-        # A list one tuple's one for each frame: (locx, locy, locz, rotx, roty, rotz),
+        # A (frames+1, 6) array one row for each frame: (locx, locy, locz, rotx, roty, rotz),
         # euler rotation ALWAYS stored xyz order, even when native used.
+        # usually it is a view of (frames+1, joints, 6) array of MotionPathAnimation
         'anim_data',
         'new_anim_data',
         # Index from the file, not strictly needed but nice to maintain order.
@@ -68,25 +76,22 @@ class NodeBVH:
 
         self.children = []
 
-        # List of 6 length tuples: (lx, ly, lz, rx, ry, rz)
+        # Array of 6 length rows: (lx, ly, lz, rx, ry, rz)
         # even if the channels aren't used they will just be zero.
-        self.anim_data = [(0.0, 0.0, 0.0, 0.0, 0.0, 0.0)]
-        self.new_anim_data = [(0.0, 0.0, 0.0, 0.0, 0.0, 0.0)]
+        self.anim_data = np.zeros((1, 6))
+        self.new_anim_data = np.zeros((1, 6))
     
-    def copy(self):
+    # anim_data: bool, False mean anim_data will be bound later by bindAnimData
+    def copy(self, anim_data=True):
         node = NodeBVH(self.name, self.local_head.copy(), self.world_head.copy(), 
                         None, self.position_idx, self.rotation_idx, self.index)
         
         node.local_tail = self.local_tail.copy()
         node.world_tail = self.world_tail.copy()
 
-        node.anim_data = []
-        for data in self.anim_data:
-            node.anim_data.append([data[0], data[1], data[2], data[3], data[4], data[5]])
-
-        node.new_anim_data = []
-        for data in self.new_anim_data:
-            node.new_anim_data.append([data[0], data[1], data[2], data[3], data[4], data[5]]) 
+        if anim_data:
+            node.anim_data = np.array(self.anim_data)
+            node.new_anim_data = np.array(self.new_anim_data)
 
         return node
 
@@ -125,8 +130,9 @@ class NodeBVH:
 
         return order
 
+    # pose: PoseFK of nodes_bvh without root transform, None will compute it
     @classmethod
-    def nodesBVHCopy(cls, nodes_bvh, frames_bvh):
+    def nodesBVHCopy(cls, nodes_bvh, frames_bvh, pose=None):
         nodes_clone = nodes_bvh.copy()
         for node in nodes_bvh.values():
             nodes_clone[node.name] = node.copy()
@@ -141,8 +147,7 @@ class NodeBVH:
                 for child_name in childs_name:
                     nodes_clone[node.name].children.append(nodes_clone[child_name])
 
-        for frame_idx in range(frames_bvh):
-            NodeBVH.updateNodesWorldPosition(nodes_clone, frame_idx)
+        NodeBVH.updateNodesWorldPositions(nodes_clone, frames_bvh, pose=pose)
 
         return nodes_clone
 
@@ -222,6 +227,89 @@ class NodeBVH:
 
         cls.updateWorldPosition(root, model_matrix, frame_idx)
 
+    # let anim_data of every node is a view of (frames+1, joints, 6) array
+    # parameter:
+    # nodes_bvh:        dict[name:NodeBVH]
+    # anim_data:        np.ndarray, shape is (frames+1, joints, 6)
+    # new_anim_data:    np.ndarray, shape is (frames+1, joints, 6)
+    @staticmethod
+    def bindAnimData(nodes_bvh, anim_data, new_anim_data):
+        for node in nodes_bvh.values():
+            node.anim_data = anim_data[:, node.index]
+            node.new_anim_data = new_anim_data[:, node.index]
+
+    # stack anim_data of every node to (frames+1, joints, 6) array and bind nodes to it
+    # return:
+    # anim_data:        np.ndarray, shape is (frames+1, joints, 6)
+    # new_anim_data:    np.ndarray, shape is (frames+1, joints, 6)
+    @staticmethod
+    def packAnimData(nodes_bvh):
+        nodes_list = sorted(nodes_bvh.values(), key=lambda node: node.index)
+
+        anim_data = np.stack([np.asarray(node.anim_data, dtype=np.float64) for node in nodes_list], axis=1)
+        new_anim_data = np.stack([np.asarray(node.new_anim_data, dtype=np.float64) for node in nodes_list], axis=1)
+
+        NodeBVH.bindAnimData(nodes_bvh, anim_data, new_anim_data)
+
+        return anim_data, new_anim_data
+
+    # return:
+    # anim_data:    np.ndarray, shape is (frames+1, joints, 6), joint axis is node.index
+    @staticmethod
+    def gatherAnimData(nodes_bvh):
+        nodes_list = sorted(nodes_bvh.values(), key=lambda node: node.index)
+        return np.stack([np.asarray(node.anim_data, dtype=np.float64) for node in nodes_list], axis=1)
+
+    # batched version of updateNodesWorldPosition, all frames are computed at once
+    # nodes keep world position of last frame, same as calling updateNodesWorldPosition per frame
+    # return:
+    # pose:     PoseFK, world transform of every frame and joint
+    # parameter:
+    # nodes_bvh:            dict[name:NodeBVH]
+    # frames_bvh:           int, number of frames
+    # model_matrices:       list[Matrix] or np.ndarray (frames, 4, 4), None is identity
+    # forward_kinematics:   ForwardKinematics of nodes_bvh, None will create one
+    # anim_data:            np.ndarray (frames+1, joints, 6), None will gather from nodes
+    # pose:                 PoseFK already computed(e.g. from PoseCache), skip forward kinematics
+    @classmethod
+    def updateNodesWorldPositions(cls, nodes_bvh, frames_bvh, model_matrices=None,
+        forward_kinematics=None, anim_data=None, pose=None):
+        if forward_kinematics is None:
+            forward_kinematics = ForwardKinematics(nodes_bvh)
+
+        if pose is None:
+            if anim_data is None:
+                anim_data = NodeBVH.gatherAnimData(nodes_bvh)
+            if model_matrices is not None:
+                model_matrices = np.array(model_matrices, dtype=np.float64)
+
+            pose = forward_kinematics.compute(anim_data, model_matrices, np.arange(frames_bvh))
+
+        # root's new_anim_data is world position and rotation
+        nodes_list = sorted(nodes_bvh.values(), key=lambda node: node.index)
+        root_data, roots = forward_kinematics.computeRootData(pose)
+        for r, j in enumerate(roots):
+            root = nodes_list[j]
+            amount = min(frames_bvh, len(root.new_anim_data) - 1)
+            root.new_anim_data[1:amount + 1] = root_data[:amount, r]
+
+        if frames_bvh > 0:
+            NodeBVH.applyPose(nodes_bvh, pose, frames_bvh - 1)
+
+        return pose
+
+    # set model_mat, world_head and world_tail of nodes by PoseFK
+    # parameter:
+    # nodes_bvh:    dict[name:NodeBVH]
+    # pose:         PoseFK
+    # frame_idx:    int, index of pose's frame
+    @staticmethod
+    def applyPose(nodes_bvh, pose, frame_idx):
+        for node in nodes_bvh.values():
+            node.model_mat = Matrix(pose.model_mats[frame_idx, node.index].tolist())
+            node.world_head = Vector(pose.world_heads[frame_idx, node.index].tolist())
+            node.world_tail = Vector(pose.world_tails[frame_idx, node.index].tolist())
+
     @staticmethod
     def getRoot(nodes_bvh):
         # find first root
@@ -367,6 +455,48 @@ class MotionPathAnimation:
         
         return None
 
+    def getForwardKinematics(self):
+        if self.forward_kinematics is None:
+            self.forward_kinematics = ForwardKinematics(self.nodes_bvh)
+        return self.forward_kinematics
+
+    def getPoseCache(self):
+        if self.pose_cache is None:
+            self.pose_cache = PoseCache(self.getForwardKinematics())
+        return self.pose_cache
+
+    # must be called when anim_data or init_to_new_matrixs is changed
+    # parameter:
+    # key:  str, PoseCache.IDENTITY or PoseCache.PATH, None mean all
+    def invalidatePoseCache(self, key=None):
+        if self.pose_cache is not None:
+            self.pose_cache.invalidate(key)
+
+    # return:
+    # pose:     PoseFK, world pose of all frames and joints
+    # parameter:
+    # key:      str, PoseCache.IDENTITY(original motion) or PoseCache.PATH(apply init_to_new_matrixs)
+    def getPose(self, key=PoseCache.PATH):
+        root_matrices = None
+        if key == PoseCache.PATH:
+            root_matrices = np.array(self.init_to_new_matrixs, dtype=np.float64)
+
+        return self.getPoseCache().getPose(key, self.anim_data, self.frames_bvh, root_matrices)
+
+    # update world position of nodes by cached pose
+    # return:
+    # pose:     PoseFK
+    # parameter:
+    # key:      str, PoseCache.IDENTITY or PoseCache.PATH
+    def updateWorldPositions(self, key=PoseCache.PATH):
+        return NodeBVH.updateNodesWorldPositions(
+            self.nodes_bvh, self.frames_bvh,
+            forward_kinematics=self.getForwardKinematics(), pose=self.getPose(key))
+
+    # amount of segments of piecewise b-spline path
+    def getPathSegments(self):
+        return len(self.init_c_points) - 3
+
     def setFrameScaler(self, scaler_factor):
         self.interpolation_scaler = scaler_factor
 
@@ -385,6 +515,12 @@ class MotionPathAnimation:
 
         self.interpolation_scaler = 1
 
+        # control points of init_path and parameter of new_path's points
+        self.init_c_points = None
+        self.new_path_t = []
+        # control points of new_path when it was updated last time, to find moved control points
+        self.last_c_points = None
+
         self.animation_center = Vector()
 
         self.collection = None
@@ -393,9 +529,29 @@ class MotionPathAnimation:
         self.frames_bvh = None
         self.frame_time_bvh = None
 
+        # (frames+1, joints, 6) array, anim_data of each node is a view of it
+        self.anim_data = None
+        self.new_anim_data = None
+
         self.skeleton_data = None
 
-    def copy(self):
+        # topology of nodes_bvh for batched forward kinematics, create by getForwardKinematics
+        self.forward_kinematics = None
+        # world pose of all frames keyed by root transform, create by getPoseCache
+        self.pose_cache = None
+
+        # foot contact intervals of footskate cleanup, dict[foot name:list[(start, end)]]
+        self.foot_contacts = {}
+
+        # incremental path editing
+        # hash of control points' location when path was updated last time
+        self.control_points_hash = None
+        self.last_path_update_time = 0.0
+        self.has_pending_path_update = False
+
+    # parameter:
+    # anim_data:    bool, copy anim_data and new_anim_data, nodes are not bound to any array if False
+    def copy(self, anim_data=True):
         path_animation = MotionPathAnimation(self.context, self.axis)
 
         path_animation.frames_bvh     = self.frames_bvh    
@@ -406,7 +562,12 @@ class MotionPathAnimation:
         # copy nodes
         path_animation.nodes_bvh = {}
         for node in self.nodes_bvh.values():
-            path_animation.nodes_bvh[node.name] = node.copy()
+            path_animation.nodes_bvh[node.name] = node.copy(anim_data=False)
+
+        if anim_data:
+            path_animation.anim_data = self.anim_data.copy()
+            path_animation.new_anim_data = self.new_anim_data.copy()
+            NodeBVH.bindAnimData(path_animation.nodes_bvh, path_animation.anim_data, path_animation.new_anim_data)
 
         # remap nodes' child & parent node
         for node in self.nodes_bvh.values():
@@ -431,24 +592,47 @@ class MotionPathAnimation:
     # file_path: str, path of bvh
     def loadBVHFromFile(self, file_path):
         self.file_path = file_path
-        self.nodes_bvh, self.frames_bvh, self.frame_time_bvh = self.readNodeBVH(self.file_path)
 
         base = os.path.basename(file_path)
         self.name = os.path.splitext(base)[0]
 
-        if self.frame_time_bvh is None:
-            # default is 1 sec
-            frame_time_bvh = 1
+        # parsed skeleton and anim_data are mapped from .bvhc file if it is valid
+        cached = BvhCache.Load(self.file_path, self.axis)
+        if cached is not None:
+            joints, self.frames_bvh, self.frame_time_bvh, anim_data = cached
+            self.nodes_bvh = self.createNodesBVH(joints)
 
-        if self.frames_bvh is None:
-            report(
-                {'WARNING'},
-                "The BVH file does not contain frame duration in its MOTION "
-                "section, assuming the BVH and Blender scene have the same "
-                "frame rate"
-            )
-        else:
-            self.readKeyFrameBVH(self.file_path)
+            # both are copy on write mapping of the same file
+            self.anim_data = anim_data
+            self.new_anim_data = np.memmap(
+                anim_data.filename, dtype=anim_data.dtype, mode='c',
+                offset=anim_data.offset, shape=anim_data.shape)
+            NodeBVH.bindAnimData(self.nodes_bvh, self.anim_data, self.new_anim_data)
+
+            self.init_animation_object()
+            return
+
+        # HIERARCHY and MOTION are read from the same file handle in one pass
+        with open(self.file_path, 'r') as file:
+            joints, self.frames_bvh, self.frame_time_bvh = readHierarchy(file)
+            self.nodes_bvh = self.createNodesBVH(joints)
+
+            if self.frame_time_bvh is None:
+                # default is 1 sec
+                frame_time_bvh = 1
+
+            if self.frames_bvh is None:
+                report(
+                    {'WARNING'},
+                    "The BVH file does not contain frame duration in its MOTION "
+                    "section, assuming the BVH and Blender scene have the same "
+                    "frame rate"
+                )
+            else:
+                self.readKeyFrameBVH(file)
+
+        if self.frames_bvh is not None:
+            BvhCache.Save(self.file_path, self.axis, joints, self.frames_bvh, self.frame_time_bvh, self.anim_data)
 
             self.init_animation_object()
     
@@ -462,6 +646,8 @@ class MotionPathAnimation:
         self.frames_bvh = frames_bvh
         self.frame_time_bvh = frame_time_bvh
 
+        self.anim_data, self.new_anim_data = NodeBVH.packAnimData(self.nodes_bvh)
+
         self.init_animation_object()
 
     # call once to create skeleton and path edit event
@@ -490,7 +676,10 @@ class MotionPathAnimation:
                 # if ob.name in {point.name for point in self.path_c_points_ob}:
                 if ob.users_collection[0] is self.control_points:
                     # update bspline
-                    self.updateNewPathAndMotionCurve()
+                    if scene.path_edit_incremental:
+                        self.requestPathUpdate(scene.path_edit_max_update_rate)
+                    else:
+                        self.updateNewPathAndMotionCurve()
                     break
         
         # clear handler, if only one animation you can enable this!
@@ -501,135 +690,76 @@ class MotionPathAnimation:
         return {'FINISHED'}
 
     
-    # read all node of bvh
+    # create all node of bvh
     # return:
     # nodes_bvh: dict[name:NodeBVH]
-    # frames:       int, number of frames
-    # frame_time:   float, time per frame(sec/frame) 
     # parameter:
-    # file_path:    str, path of file
-    def readNodeBVH(self, file_path):
-        file = open(file_path, 'rU')
-
-        file_lines = file.readlines()
-
-        file.close()
-
-        # convert to 2D list
-        file_lines = [ll for ll in [l.split() for l in file_lines] if ll]
-        
-        # for line in file_lines:
-        #     print(line)
-        
-         # Create hierarchy as empties
-        if file_lines[0][0].lower() == 'hierarchy':
-            # print 'Importing the BVH Hierarchy for:', file_path
-            pass
-        else:
-            raise Exception("This is not a BVH file")
-
-
-
+    # joints:       list[dict], from bvhReader.readHierarchy(or bvh cache)
+    def createNodesBVH(self, joints):
         nodes_bvh = {None:None}
-        nodes_stack = [None]
-        frames = None
-        frame_time = None
-
-        line_idx = 0
-        while line_idx < len(file_lines):
-            #root or joint
-            if file_lines[line_idx][0].lower() in {'root', 'joint'}:
-                
-
-                name = file_lines[line_idx][1]
-                local_offset = Vector()
-                world_offset = Vector()
-                # position_idx = {'X': 0, 'Y': 1, 'Z': 2}
-                position_idx = {}
-                rotation_idx = {}
-
-                
-                # offset
-                line_idx += 2
-                
-                local_offset = Vector((
-                    float(file_lines[line_idx][axis_idx[self.axis_b2d['X']]+1]),
-                    float(file_lines[line_idx][axis_idx[self.axis_b2d['Y']]+1]),
-                    float(file_lines[line_idx][axis_idx[self.axis_b2d['Z']]+1]),
-                ))
-                
-
-
-                # channels
-                line_idx += 1
-                
-                channelIndex = 0
-                for channel in file_lines[line_idx][2:]:
-                    channel = channel.lower()
-
-                    if channel == 'xposition':
-                        position_idx[self.axis_d2b['X']] = channelIndex
-                    elif channel == 'yposition':
-                        position_idx[self.axis_d2b['Y']] = channelIndex
-                    elif channel == 'zposition':
-                        position_idx[self.axis_d2b['Z']] = channelIndex
-
-                    elif channel == 'xrotation':
-                        rotation_idx[self.axis_d2b['X']] = channelIndex
-                    elif channel == 'yrotation':
-                        rotation_idx[self.axis_d2b['Y']] = channelIndex
-                    elif channel == 'zrotation':
-                        rotation_idx[self.axis_d2b['Z']] = channelIndex
-
-                    channelIndex += 1
-                    
-                parent = nodes_stack[-1]
-                 # Apply the parents offset accumulatively
-                if parent is None:   # is root
-                    world_offset = Vector(local_offset)
-                else:
-                    world_offset = parent.world_head + local_offset
-
-                nodes_bvh[name] = NodeBVH(
-                    name,
-                    local_offset,
-                    world_offset,
-                    parent,
-                    position_idx,
-                    rotation_idx,
-                    len(nodes_bvh) - 1,
-                )
+        nodes_list = []
+
+        for joint in joints:
+            name = joint['name']
+            # position_idx = {'X': 0, 'Y': 1, 'Z': 2}
+            position_idx = {}
+            rotation_idx = {}
+
+            # offset
+            local_offset = Vector((
+                joint['offset'][axis_idx[self.axis_b2d['X']]],
+                joint['offset'][axis_idx[self.axis_b2d['Y']]],
+                joint['offset'][axis_idx[self.axis_b2d['Z']]],
+            ))
+
+            # channels
+            channelIndex = 0
+            for channel in joint['channels']:
+                channel = channel.lower()
+
+                if channel == 'xposition':
+                    position_idx[self.axis_d2b['X']] = channelIndex
+                elif channel == 'yposition':
+                    position_idx[self.axis_d2b['Y']] = channelIndex
+                elif channel == 'zposition':
+                    position_idx[self.axis_d2b['Z']] = channelIndex
+
+                elif channel == 'xrotation':
+                    rotation_idx[self.axis_d2b['X']] = channelIndex
+                elif channel == 'yrotation':
+                    rotation_idx[self.axis_d2b['Y']] = channelIndex
+                elif channel == 'zrotation':
+                    rotation_idx[self.axis_d2b['Z']] = channelIndex
+
+                channelIndex += 1
+
+            parent = nodes_list[joint['parent']] if joint['parent'] >= 0 else None
+            # Apply the parents offset accumulatively
+            if parent is None:   # is root
+                world_offset = Vector(local_offset)
+            else:
+                world_offset = parent.world_head + local_offset
+
+            nodes_bvh[name] = NodeBVH(
+                name,
+                local_offset,
+                world_offset,
+                parent,
+                position_idx,
+                rotation_idx,
+                len(nodes_bvh) - 1,
+            )
+            nodes_list.append(nodes_bvh[name])
 
-                nodes_stack.append(nodes_bvh[name])
-                        
-            elif file_lines[line_idx][0].lower() == 'end' and file_lines[line_idx][1].lower() == 'site' :
-                #offset
-                line_idx += 2
+            # End Site
+            if joint['end'] is not None:
                 offset = Vector((
-                    float(file_lines[line_idx][axis_idx[self.axis_b2d['X']]+1]),
-                    float(file_lines[line_idx][axis_idx[self.axis_b2d['Y']]+1]),
-                    float(file_lines[line_idx][axis_idx[self.axis_b2d['Z']]+1]),
+                    joint['end'][axis_idx[self.axis_b2d['X']]],
+                    joint['end'][axis_idx[self.axis_b2d['Y']]],
+                    joint['end'][axis_idx[self.axis_b2d['Z']]],
                 ))
-                nodes_stack[-1].local_tail = nodes_stack[-1].local_head + offset
-                nodes_stack[-1].world_tail = nodes_stack[-1].world_head + offset
-
-                # Just so we can remove the parents in a uniform way,
-                # the end has kids so this is a placeholder.
-                nodes_stack.append(None)
-                
-            elif file_lines[line_idx][0] == '}':
-                nodes_stack.pop()
-
-            elif file_lines[line_idx][0].lower() in {"motion"}:
-                # Frames:
-                line_idx += 1
-                frames = int(file_lines[line_idx][1])
-                # Frame Time:
-                line_idx += 1
-                frame_time = float(file_lines[line_idx][2])
-
-            line_idx += 1
-
+                nodes_bvh[name].local_tail = nodes_bvh[name].local_head + offset
+                nodes_bvh[name].world_tail = nodes_bvh[name].world_head + offset
 
         # remove None element
         nodes_bvh.pop(None)
@@ -664,58 +794,26 @@ class MotionPathAnimation:
                 node.local_tail = node.local_head + local_mean
 
 
-        return nodes_bvh, frames, frame_time
+        return nodes_bvh
     
     # read key frame animation info into nodes_bvh
+    # frame rows are streamed from file in chunks and converted to one (frames, channels) array,
+    # anim_data of every node is a view of self.anim_data
     # parameter:
-    # file_path:    str, path of file
-    def readKeyFrameBVH(self, file_path):
-        file = open(file_path, 'rU')
-        file_lines = file.readlines()
-        file.close()
-
+    # file:     file object of bvh, at first frame row of MOTION(after readHierarchy)
+    def readKeyFrameBVH(self, file):
         # create list ane sort it by index
         nodes_list = list(self.nodes_bvh.values())
         nodes_list.sort(key=lambda node: node.index)
 
-        # total parameter in a line
-        parameter_amount = 0
-        for node in nodes_list:
-            parameter_amount += len(node.position_idx)
-            parameter_amount += len(node.rotation_idx)
-
-        # convert to 2D list
-        file_lines = [ll for ll in [l.split() for l in file_lines] if ll]
-
-        for line in file_lines:
-            # read paremeter to node
-            if len(line) == parameter_amount:
-                line_idx = 0
-                for node in nodes_list:
-                    #default (lx, ly, lz, rx, ry, rz)
-                    data = [0, 0, 0, 0, 0, 0]
-                    if node.hasLocation():
-                        for i in range(len(node.position_idx)):
-                            # 0, 1, 2 -> lx, ly ,lz
-                            axis = axis_idx[i]
-                            idx = node.position_idx[axis] + line_idx
-                            data[i] = float(line[idx])
-                        
-
-                    if node.hasRotation():
-                        for i in range(len(node.rotation_idx)):
-                            # 3, 4, 5 -> rx, ry ,rz
-                            axis = axis_idx[i]
-                            idx = node.rotation_idx[axis] + line_idx
-                            data[i+3] = float(line[idx])
-
-                            
-                    # offset line_idx
-                    line_idx += len(node.position_idx)
-                    line_idx += len(node.rotation_idx)
-                    
-                    node.anim_data.append(list(data))
-                    node.new_anim_data.append(list(data))
+        channel_index, parameter_amount = computeChannelIndex(nodes_list)
+
+        frames_data = readFrames(file, parameter_amount, self.frames_bvh)
+
+        self.anim_data = createAnimData(frames_data, channel_index)
+        self.new_anim_data = self.anim_data.copy()
+
+        NodeBVH.bindAnimData(self.nodes_bvh, self.anim_data, self.new_anim_data)
 
 
     #
@@ -747,6 +845,95 @@ class MotionPathAnimation:
         self.createKeyFrame()
     #
     def createKeyFrame(self):
+        if self.context.scene.keyframe_bulk_write:
+            self.createKeyFrameBulk()
+        else:
+            self.createKeyFramePerFrame()
+
+    # write F-Curves of all frames at once from cached pose, no frame_set
+    # replace keyframes of skeleton objects of nodes by pose of all frames
+    # parameter:
+    # nodes:        list[NodeBVH]
+    # pose:         PoseFK
+    # frames:       np.ndarray, shape is (frames,), frame number of keyframes
+    # frame_indices:np.ndarray, index of changed frames of pose, None is all frames
+    # patch:        KeyframePatch, collect keyframes of frame_indices instead of replacing F-Curves
+    def writeNodesKeyframes(self, nodes, pose, frames, frame_indices=None, patch=None):
+        if frame_indices is None:
+            frame_indices = slice(None)
+        indices = [node.index for node in nodes]
+        quaternions = matricesToQuaternions(pose.model_mats[frame_indices][:, indices])
+
+        def write(ob, data_path, values):
+            if patch is None:
+                writeKeyframes(ob, data_path, frames[frame_indices], values)
+            else:
+                patch.add(ob, data_path, frames[frame_indices], values)
+
+        for i, node in enumerate(nodes):
+            heads = pose.world_heads[frame_indices, node.index]
+
+            # head
+            ob = self.skeleton.all_objects[self.name+"."+node.name+"_head"]
+            write(ob, "location", heads)
+
+            # is leaf
+            if len(node.children) == 0:
+                ob = self.skeleton.all_objects[self.name+"."+node.name+"_tail"]
+                write(ob, "location", pose.world_tails[frame_indices, node.index])
+
+            # line of head_to_tail
+            ob = self.skeleton.all_objects[self.name+"."+node.name]
+            write(ob, "location", heads)
+
+            ob.rotation_mode = 'QUATERNION'
+            write(ob, "rotation_quaternion", quaternions[:, i])
+
+    def createKeyFrameBulk(self):
+        # set key frame start and end
+        self.context.scene.frame_start = 0
+        self.context.scene.frame_end = (self.frames_bvh - 1) * self.interpolation_scaler
+
+        root = NodeBVH.getRoot(self.nodes_bvh)
+
+        pose = self.updateWorldPositions(PoseCache.PATH)
+        frames = np.arange(self.frames_bvh) * self.interpolation_scaler
+        self.writeNodesKeyframes(list(self.nodes_bvh.values()), pose, frames)
+
+        # is root
+        if bpy.context.scene.select_object_name == "":
+            bpy.context.scene.select_object_name = root.name
+
+        # camera look at front direction of new path
+        points = self.new_path.data.splines[0].points
+        new_curve = np.empty(len(points) * 4, dtype=np.float32)
+        points.foreach_get('co', new_curve)
+        new_curve = new_curve.reshape(-1, 4)[:self.frames_bvh, 0:3].astype(np.float64)
+
+        fronts = np.zeros((self.frames_bvh, 3))
+        if self.frames_bvh > 1:
+            fronts[1:] = new_curve[1:] - new_curve[:-1]
+            fronts[0] = fronts[1]
+
+        # default camera front direct is (0, 0, -1)
+        # we default is (1, 0, 0), so rotate 90 degree by x-axis
+        rotation = computeOrientations(fronts, np.array([0.0, 0.0, 1.0])) @ np.array(Matrix.Rotation(math.radians(90.0), 3, 'X'))
+
+        lengths = np.linalg.norm(fronts, axis=1, keepdims=True)
+        offsets = np.where(lengths > 0.0, fronts / np.where(lengths > 0.0, lengths, 1.0), 0.0) * 2.0
+
+        root_heads = pose.world_heads[:, root.index]
+        writeKeyframes(self.camera, "location", frames, root_heads + offsets)
+
+        self.camera.rotation_mode = 'QUATERNION'
+        writeKeyframes(self.camera, "rotation_quaternion", frames, matricesToQuaternions(rotation))
+
+        self.animation_center = Vector()
+        if self.frames_bvh > 0:
+            self.animation_center = Vector(root_heads.mean(axis=0).tolist())
+
+    # set every frame and insert keyframe, slow but same as blender's keyframe_insert
+    def createKeyFramePerFrame(self):
         self.animation_center = Vector()
 
         # set key frame start and end
@@ -756,8 +943,9 @@ class MotionPathAnimation:
         root = NodeBVH.getRoot(self.nodes_bvh)
 
         new_curve   = self.new_path.data.splines[0].points.values()
+        pose = self.updateWorldPositions(PoseCache.PATH)
         for frame_idx in range(self.frames_bvh):
-            NodeBVH.updateNodesWorldPosition(self.nodes_bvh, frame_idx, self.init_to_new_matrixs[frame_idx])
+            NodeBVH.applyPose(self.nodes_bvh, pose, frame_idx)
 
             self.context.scene.frame_set(frame_idx * self.interpolation_scaler)
 
@@ -815,17 +1003,19 @@ class MotionPathAnimation:
     def deleteKeyFrame(self):
         self.has_animation = False
 
-        for frame_idx in range(self.frames_bvh):
-            for node in self.nodes_bvh.values():
-                ob = self.skeleton.all_objects[self.name+"."+node.name+"_head"]
-                ob.keyframe_delete(data_path="location", index=-1)
-                if len(node.children) == 0:
-                    ob = self.skeleton.all_objects[self.name+"."+node.name+"_tail"]
-                    ob.keyframe_delete(data_path="location", index=-1)
+        # remove F-Curves of every object instead of keyframe of every frame
+        data_paths = {"location", "rotation_quaternion"}
+        for node in self.nodes_bvh.values():
+            ob = self.skeleton.all_objects[self.name+"."+node.name+"_head"]
+            clearKeyframes(ob, data_paths)
+            if len(node.children) == 0:
+                ob = self.skeleton.all_objects[self.name+"."+node.name+"_tail"]
+                clearKeyframes(ob, data_paths)
 
-                ob = self.skeleton.all_objects[self.name+"."+node.name]
-                ob.keyframe_delete(data_path="location", index=-1)
-                ob.keyframe_delete(data_path="rotation_quaternion", index=-1)
+            ob = self.skeleton.all_objects[self.name+"."+node.name]
+            clearKeyframes(ob, data_paths)
+
+        clearKeyframes(self.camera, data_paths)
 
 
     #
@@ -838,8 +1028,6 @@ class MotionPathAnimation:
 
     #
     def createInitialMotionCurve(self):
-        curve = []
-        
         # use root to track curve
         root = None
         for node in self.nodes_bvh.values():
@@ -847,9 +1035,8 @@ class MotionPathAnimation:
                 root = node
                 break
 
-        for frame_idx in range(self.frames_bvh):
-            NodeBVH.updateNodesWorldPosition(self.nodes_bvh, frame_idx)
-            curve.append((root.world_head))
+        pose = self.updateWorldPositions(PoseCache.IDENTITY)
+        curve = pose.world_heads[:, root.index]
 
         return createPolyCurve(self.context, self.path, "initial_motion", curve)
     # 
@@ -857,52 +1044,86 @@ class MotionPathAnimation:
 
         self.control_points = createCollection(self.path, self.name+".control_points")
 
-        c_points, self.t = solveCubicBspline(self.init_motion.data.splines[0].points.values())
+        # fit root trajectory directly, not reading points back from init_motion curve
+        root = NodeBVH.getRoot(self.nodes_bvh)
+        Q = self.getPose(PoseCache.IDENTITY).world_heads[:, root.index]
+
+        scene = self.context.scene
+        if scene.path_fit_tolerance > 0.0:
+            c_points, self.t = bspline.fitWithTolerance(Q, scene.path_fit_tolerance, scene.path_segments)
+        else:
+            c_points, self.t = bspline.fit(Q, scene.path_segments)
         for i in range(len(c_points)):
             createCube(self.control_points, "c_"+str(i), c_points[i], 10.0)
 
+        self.init_c_points = c_points
+        # parameter of points of new_path
+        self.new_path_t = self.t.copy()
+        self.re_t = self.t.copy()
+        self.last_c_points = c_points.copy()
+        self.control_points_hash = hashControlPoints(c_points)
+
         return (
         createCubicBspline(self.context, self.path, c_points, "init_path", self.t),
         createCubicBspline(self.context, self.path, c_points, "new_path", self.t))
     #
-    def createNewMotionCurve(self):
+    # compute self.init_to_new_matrixs(init path to new path) of every frame
+    # position and tangent of both path are evaluated from b-spline directly
+    # parameter:
+    # c_points: list[Vector], control points of new path, None will read from control point objects
+    # frames:   np.ndarray, only matrixs of these frames are recomputed, None mean all
+    def computeInitToNewMatrixs(self, c_points=None, frames=None):
+        if c_points is None:
+            c_points = self.getControlPoints()
+
+        t = np.asarray(self.t)[:self.frames_bvh]
+        new_path_t = np.asarray(self.new_path_t)[:self.frames_bvh]
+        if frames is not None:
+            t = t[frames]
+            new_path_t = new_path_t[frames]
+
+        p0  = bspline.evaluate(t, self.init_c_points)
+        f0  = bspline.evaluate(t, self.init_c_points, 1)
+        p   = bspline.evaluate(new_path_t, c_points)
+        f   = bspline.evaluate(new_path_t, c_points, 1)
+
+        R0 = computeOrientations(f0, np.array([0.0, 0.0, 1.0]))
+        R = computeOrientations(f, np.array([0.0, 0.0, 1.0]))
+
+        # P @ R @ R0.inverted() @ P0.inverted()
+        rotation = R @ np.linalg.inv(R0)
+
+        matrixs = np.zeros((len(p), 4, 4))
+        matrixs[:, :3, :3] = rotation
+        matrixs[:, :3, 3] = p - np.einsum('fab,fb->fa', rotation, p0)
+        matrixs[:, 3, 3] = 1.0
+
+        if frames is None:
+            self.init_to_new_matrixs = matrixs
+            # path is changed
+            self.invalidatePoseCache(PoseCache.PATH)
+        else:
+            self.init_to_new_matrixs[frames] = matrixs
+            self.getPoseCache().updatePose(
+                PoseCache.PATH, self.anim_data, self.frames_bvh, frames, self.init_to_new_matrixs)
+
+    # return:
+    # curve:    np.ndarray (frames, 3), root position of new motion
+    # parameter:
+    # c_points: list[Vector], control points of new path, None will read from control point objects
+    # frames:   np.ndarray, frames whose path is changed, None mean all
+    def computeNewMotion(self, c_points=None, frames=None):
         # use root to track curve
         root = NodeBVH.getRoot(self.nodes_bvh)
-        
-        curve = []
 
-        self.init_to_new_matrixs = []
-        init_curve  = self.init_path.data.splines[0].points.values()
-        new_curve   = self.new_path.data.splines[0].points.values()
-        for i in range(self.frames_bvh):
-            p0  = init_curve[i].co
-            p   = new_curve[i].co
-
-            P0 = Matrix.Translation(p0)
-            P = Matrix.Translation(p)
-
-            R0 = Matrix.Identity(4)
-            R = Matrix.Identity(4)
-            if (i == 0):
-                f0 = init_curve[i+1].co - init_curve[i].co
-                f = new_curve[i+1].co - new_curve[i].co
-            else:
-                f0 = init_curve[i].co - init_curve[i-1].co
-                f = new_curve[i].co - new_curve[i-1].co
-                
-            if f0.length > 0.001:
-                R0 = computeOrientation(f0, Vector([0, 0, 1]))
-            if f.length > 0.001:
-                R = computeOrientation(f, Vector([0, 0, 1]))
-            
-                
+        self.computeInitToNewMatrixs(c_points, frames)
 
-            matrix = P @ R @ R0.inverted() @ P0.inverted()
+        pose = self.updateWorldPositions(PoseCache.PATH)
+        return pose.world_heads[:, root.index]
 
-            self.init_to_new_matrixs.append(matrix)
-            
-            NodeBVH.updateNodesWorldPosition(self.nodes_bvh, i, matrix)
-            curve.append((root.world_head))
+    #
+    def createNewMotionCurve(self):
+        curve = self.computeNewMotion()
 
         return createPolyCurve(self.context, self.path, "new_motion", curve)
 
@@ -915,7 +1136,8 @@ class MotionPathAnimation:
         Q = []
         for point in self.new_motion.data.splines[0].points.values():
             Q.append(point.co.xyz)
-        self.re_t = computeChordLengthParameter(Q)
+        self.re_t = bspline.reparameterize(self.t, Q, self.getPathSegments())
+        self.new_path_t = self.re_t.copy()
 
         return createCubicBspline(self.context, self.path, c_points, path_name, self.re_t)
 
@@ -950,6 +1172,8 @@ class MotionPathAnimation:
             c_points.append(c_point_ob.location.xyz)
 
         self.new_path = createCubicBspline(self.context, self.path, c_points, path_name, self.t)
+        self.new_path_t = self.t.copy()
+        self.last_c_points = np.array(c_points)
         self.new_motion = self.createNewMotionCurve()
 
         # reparameter
@@ -957,53 +1181,90 @@ class MotionPathAnimation:
         self.new_path = self.createNewReparameterPathCurve(path_name)
         bpy.data.objects.remove(self.new_motion)
         self.new_motion = self.createNewMotionCurve()
+
+    def getControlPoints(self):
+        return [c_point_ob.location.xyz for c_point_ob in self.control_points.all_objects.values()]
+
+    # update new_path and new_motion in place, only root transforms are recomputed
+    # a control point only affect 4 segments of path, so only frames in these segments are recomputed
+    # parameter:
+    # c_points: list[Vector], control points
+    def updateNewPathAndMotionCurveIncremental(self, c_points):
+        c_points = np.array([tuple(point) for point in c_points], dtype=np.float64)
+        segments = self.getPathSegments()
+
+        frames = None
+        if (self.last_c_points is not None and self.last_c_points.shape == c_points.shape and
+            self.init_to_new_matrixs is not None):
+            moved = np.flatnonzero(np.any(c_points != self.last_c_points, axis=1))
+            frames = bspline.affectedFrames(self.t[:self.frames_bvh], segments, moved)
+            if len(frames) == 0:
+                return
+        self.last_c_points = c_points
+
+        self.new_path_t = np.array(self.new_path_t, dtype=np.float64)
+        if frames is None:
+            self.new_path_t[:] = self.t
+        else:
+            self.new_path_t[frames] = self.t[frames]
+        new_motion = self.computeNewMotion(c_points, frames)
+
+        # reparameter, only segments of changed frames
+        self.re_t = bspline.reparameterize(self.t, new_motion, segments, frames, self.re_t)
+        if frames is None:
+            self.new_path_t[:] = self.re_t
+        else:
+            self.new_path_t[frames] = self.re_t[frames]
+
+        updatePolyCurve(self.new_path, bspline.evaluate(self.new_path_t, c_points))
+        updatePolyCurve(self.new_motion, self.computeNewMotion(c_points, frames))
+
+    # called by depsgraph handler while control point is moved,
+    # skip if control points are not changed and run at most max_update_rate times per second,
+    # the last throttled change is applied by timer
+    # parameter:
+    # max_update_rate:  float, 0 mean no limit
+    def requestPathUpdate(self, max_update_rate=0.0):
+        c_points = self.getControlPoints()
+        c_points_hash = hashControlPoints(c_points)
+        if c_points_hash == self.control_points_hash:
+            return False
+
+        if max_update_rate > 0.0:
+            interval = 1.0 / max_update_rate
+            elapsed = time.perf_counter() - self.last_path_update_time
+            if elapsed < interval:
+                if not self.has_pending_path_update:
+                    self.has_pending_path_update = True
+                    bpy.app.timers.register(self.flushPathUpdate, first_interval=interval - elapsed)
+                return False
+
+        self.control_points_hash = c_points_hash
+        self.last_path_update_time = time.perf_counter()
+        self.updateNewPathAndMotionCurveIncremental(c_points)
+        return True
+
+    # timer callback of throttled update
+    def flushPathUpdate(self):
+        self.has_pending_path_update = False
+        self.requestPathUpdate()
+        # one shot timer
+        return None
     
 
+# return
+# b_point:  Vector
+# parameter
+# t:        float, parameter[0, 1]
+# c_points: list[Vector], segments + 3 control point
 def cubicBspline(t, c_points):
-    # Monomial Bases
-    M = Vector()
-    # Geometric Matrix
-    G = Matrix((
-        [1, 4, 1, 0],
-        [-3, 0, 3, 0],
-        [3, -6, 3, 0],
-        [-1, 3, -3, 1],))
-    G *= 0.16667
-    # Control point
-    p = []
-    for point in c_points:
-        p.append(point)
-    P = Vector()
-
-    b_point = Vector([0, 0, 0])
-
-    M = Vector([1, t, t*t, t*t*t])
-
-    for dimension in range(0, 3):
-        P = Vector([
-                p[0][dimension],
-                p[1][dimension],
-                p[2][dimension],
-                p[3][dimension]
-        ])
-
-        b_point[dimension] = M @ G @ P
-
-    return b_point
+    return Vector(bspline.evaluate([t], c_points)[0].tolist())
 
 # c_points: list[Vector], object of control points
 # t: list[float], 0.0<=t_list[i]<=1.0
 def createCubicBspline(context, collection, c_points, name, t):
-    
     # points of Bspline
-    Bspline = []
-
-    for i in range(len(t)):
-        Bspline.append(cubicBspline(t[i], c_points))
-
-    # for i in range(subdivision + 1):
-    #     t = i / subdivision
-    #     Bspline.append(cubicBspline(t, c_points))
+    Bspline = bspline.evaluate(t, c_points)
 
     return createPolyCurve(context, collection, name, Bspline)
 
@@ -1013,95 +1274,14 @@ def createCubicBspline(context, collection, c_points, name, t):
 # parameter
 # initial_curve:list[Vector]
 def solveCubicBspline(initial_curve):
-    # if initial_curve_ob.type == 'CURVE':
-    #     init_curve = initial_curve_ob.data
-
-    # # points of initial path is data point 
-    # Q = []
-    # for point in init_curve.splines[0].points.values():
-    #     Q.append(point.co.xyz)
-
-    Q = []
-    for point in initial_curve:
-        Q.append(point.co.xyz)
-
-    # have n point, 0 <= i <= n-1
-    n = len(Q)
-
-    # use cubic b-spline to fit
-    def B3_0(t):
-        return 0.16667 * (1-t) * (1-t) * (1-t)
-    def B3_1(t):
-        return 0.16667 * (3*t*t*t - 6*t*t + 4)
-    def B3_2(t):
-        return 0.16667 * (-3*t*t*t + 3*t*t + 3*t + 1)
-    def B3_3(t):
-        return 0.16667 * t*t*t
-    
-    t = computeChordLengthParameter(Q)
-
-    # use least square
-    # solve Ax = b
-    A = Matrix(([0, 0, 0, 0],[0, 0, 0, 0],[0, 0, 0, 0],[0, 0, 0, 0]))
-    # 4 control point 
-    p = [Vector(), Vector(), Vector(), Vector()]
-
-    # A
-    for i in range(0, n):
-        B0 = B3_0(t[i])
-        B1 = B3_1(t[i])
-        B2 = B3_2(t[i])
-        B3 = B3_3(t[i])
-
-        A[0][0] +=  B0 * B0
-        A[0][1] +=  B0 * B1
-        A[0][2] +=  B0 * B2
-        A[0][3] +=  B0 * B3
-
-        A[1][1] +=  B1 * B1
-        A[1][2] +=  B1 * B2
-        A[1][3] +=  B1 * B3
-
-        A[2][2] +=  B2 * B2
-        A[2][3] +=  B2 * B3
-
-        A[3][3] +=  B3 * B3
-
-    A[1][0] = A[0][1]
-
-    A[2][0] = A[0][2]
-    A[2][1] = A[1][2]
-
-    A[3][0] = A[0][3]
-    A[3][1] = A[1][3]
-    A[3][2] = A[2][3]
-
-    # dimension mean is x, y, z
-    for dimension in range(0, 2):
-        b = Vector([0, 0, 0, 0])
-        for i in range(0, n):
-            b[0] += B3_0(t[i]) * Q[i][dimension]
-            b[1] += B3_1(t[i]) * Q[i][dimension]
-            b[2] += B3_2(t[i]) * Q[i][dimension]
-            b[3] += B3_3(t[i]) * Q[i][dimension]
-
-        x = Vector()
-
-        # solve Ax = b
-        # x = inverse(A)b
-        x = A.inverted() @ b
-
-        p[0][dimension] = x[0]
-        p[1][dimension] = x[1]
-        p[2][dimension] = x[2]
-        p[3][dimension] = x[3]
-    
-    p[0][2] = 0
-    p[1][2] = 0
-    p[2][2] = 0
-    p[3][2] = 0
+    Q = [tuple(point.co.xyz) for point in initial_curve]
+
+    c_points, t = bspline.fit(Q)
 
-    return p, t
+    return [Vector(point) for point in c_points.tolist()], t
+
+def hashControlPoints(c_points):
+    return hash(tuple(tuple(point) for point in c_points))
 
 def computeOrientation(front, world_up):
     y = front.normalized().xyz
@@ -1109,26 +1289,26 @@ def computeOrientation(front, world_up):
     z = x.cross(y)
     return Matrix((x, y, z)).transposed().to_4x4()
 
-def computeChordLengthParameter(Q):
-    # have n point, 0 <= i <= n-1
-    n = len(Q)
-    # computer distance of curve
-    d = 0
-    for i in range(1, n):
-        d += (Q[i] - Q[i-1]).length
-
-    # define t[i] with chord-length
-    # t[0] = 0, t[n-1] = 1
-    t = [0.0,]
-    for i in range(1, n):
-        t.append(t[i-1] + (Q[i] - Q[i-1]).length/d)
-    t[n-1] = 1.0
-
-    return t
+# batched computeOrientation, identity if front is too short
+# return:
+# R:    np.ndarray, shape is (n, 3, 3), columns are (x, y, z)
+# parameter:
+# fronts:   np.ndarray, shape is (n, 3)
+# world_up: np.ndarray, shape is (3,)
+def computeOrientations(fronts, world_up):
+    lengths = np.linalg.norm(fronts, axis=1)
+    is_valid = lengths > 1e-8
 
+    y = fronts / np.where(is_valid, lengths, 1.0)[:, None]
+    x = np.cross(y, world_up)
+    z = np.cross(x, y)
+    # front is parallel to world_up
+    is_valid &= np.linalg.norm(x, axis=1) > 1e-8
 
+    R = np.stack((x, y, z), axis=2)
+    R[~is_valid] = np.identity(3)
 
+    return R
 
-    
-        
-      
\ No newline at end of file
+def computeChordLengthParameter(Q):
+    return bspline.chordLengthParameter(Q)
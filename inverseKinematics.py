@@ -0,0 +1,181 @@
+"""
+batched inverse kinematics of joint chains, all frames at once
+only depend on numpy, so it can be used without blender
+
+chain is ordered from end effector to root, e.g. (foot, knee, hip), root is fixed
+"""
+
+import numpy as np
+
+# bone of line object points to -z, see FootskateCleanup.SolveIK
+BONE_DIRECTION = np.array((0.0, 0.0, -1.0))
+
+# return: normalized vectors, zero vector is kept zero, same as mathutils Vector.normalized()
+def normalize(vecs):
+    length = np.linalg.norm(vecs, axis=-1, keepdims=True)
+    return np.divide(vecs, length, out=np.zeros_like(vecs), where=length > 0.0)
+
+def dot(a, b):
+    return np.einsum('...i,...i->...', a, b)
+
+# rotate vectors around normalized axis by angle(right hand), same as Quaternion(axis, angle) @ vec
+def rotateAroundAxis(vecs, axis, angle):
+    cos = np.cos(angle)[..., None]
+    sin = np.sin(angle)[..., None]
+    return vecs * cos + np.cross(axis, vecs) * sin + axis * dot(axis, vecs)[..., None] * (1.0 - cos)
+
+# any vector orthogonal to a, same as ortho_v3_v3 of blender
+def orthogonal(a):
+    dominant = np.argmax(np.abs(a), axis=-1)
+    return np.select(
+        [dominant[..., None] == 0, dominant[..., None] == 1],
+        [np.stack((-a[..., 1] - a[..., 2], a[..., 0], a[..., 0]), axis=-1),
+         np.stack((a[..., 1], -a[..., 0] - a[..., 2], a[..., 1]), axis=-1)],
+        np.stack((a[..., 2], a[..., 2], -a[..., 0] - a[..., 1]), axis=-1))
+
+# same as mathutils Vector.rotation_difference(), a and b are normalized
+# return:
+# quats:    np.ndarray, shape is (..., 4), (w, x, y, z)
+def rotationDifference(a, b):
+    a, b = np.broadcast_arrays(a, b)
+    axis = np.cross(a, b)
+    axis_length = np.linalg.norm(axis, axis=-1)
+    angle = np.arccos(np.clip(dot(a, b), -1.0, 1.0))
+
+    # a and b are parallel, any orthogonal axis of a
+    parallel = axis_length <= np.finfo(np.float32).eps
+    axis = np.where(parallel[..., None], normalize(orthogonal(a)), normalize(axis))
+    angle = np.where(parallel, np.where(dot(a, b) > 0.0, 0.0, np.pi), angle)
+
+    return np.concatenate((np.cos(angle / 2.0)[..., None], axis * np.sin(angle / 2.0)[..., None]), axis=-1)
+
+# rotation of joints from directions of bones, joint i rotate BONE_DIRECTION to bone (i-1) - i
+# return:
+# rotations:    np.ndarray, shape is (F, n, 4), rotation of end effector is copied from joint_rotations
+def boneRotations(positions, joint_rotations=None):
+    rotations = np.zeros(positions.shape[:-1] + (4,))
+    rotations[..., 0] = 1.0
+    if joint_rotations is not None:
+        rotations[:, 0] = joint_rotations[:, 0]
+
+    rotations[:, 1:] = rotationDifference(BONE_DIRECTION, normalize(positions[:, :-1] - positions[:, 1:]))
+    return rotations
+
+# rotate middle joints around line of their neighbours toward pole, vectorized pole constraint of SolveIK
+def applyPoleConstraint(positions, pole):
+    for i in range(1, positions.shape[1] - 1):
+        normal = normalize(positions[:, i + 1] - positions[:, i - 1])
+        point = positions[:, i - 1]
+
+        # intersection of line(p, p + normal) and plane(point, normal)
+        projection_pole = pole - dot(pole - point, normal)[:, None] * normal
+        projection_bone = positions[:, i] - dot(positions[:, i] - point, normal)[:, None] * normal
+
+        V_a = projection_bone - point
+        V_b = projection_pole - point
+
+        angle = np.arccos(np.clip(dot(normalize(V_a), normalize(V_b)), -1.0, 1.0))
+        angle = np.where(dot(normal, np.cross(V_a, V_b)) < 0.0, -angle, angle)
+
+        positions[:, i] = rotateAroundAxis(positions[:, i] - point, normal, angle) + point
+
+# vectorized FootskateCleanup.SolveIK(FABRIK) of F chains, every frame stops when it converges
+# return:
+# positions:        np.ndarray, shape is (F, n, 3)
+# rotations:        np.ndarray, shape is (F, n, 4), quaternion(w, x, y, z)
+# parameter:
+# joint_positions:  np.ndarray, shape is (F, n, 3), from end effector to root
+# targets:          np.ndarray, shape is (F, 3), target of end effector
+# pole:             np.ndarray, shape is (F, 3), pole of middle joints, None is no constraint
+# joint_rotations:  np.ndarray, shape is (F, n, 4), rotation of end effector is kept
+# iterations:       int
+# epsilon:          float
+def solveFABRIK(joint_positions, targets, pole=None, joint_rotations=None, iterations=10, epsilon=0.0001):
+    positions = np.array(joint_positions, dtype=np.float64)
+    targets = np.asarray(targets, dtype=np.float64)
+
+    bone_lengths = np.linalg.norm(positions[:, :-1] - positions[:, 1:], axis=-1)
+    total_length = bone_lengths.sum(axis=-1)
+
+    # target is out of reach, stretch chain toward target
+    unreachable = np.linalg.norm(positions[:, -1] - targets, axis=-1) > total_length
+    if unreachable.any():
+        stretch = positions[unreachable]
+        for i in range(stretch.shape[1] - 2, -1, -1):
+            vec = normalize(targets[unreachable] - stretch[:, i + 1])
+            stretch[:, i] = stretch[:, i + 1] + vec * bone_lengths[unreachable, i, None]
+        positions[unreachable] = stretch
+
+    # iterate backward & forward, only frames not converged yet
+    active = np.flatnonzero(~unreachable)
+    last = positions[active, 0].copy()
+    for k in range(iterations):
+        if len(active) == 0:
+            break
+
+        chain = positions[active]
+        lengths = bone_lengths[active]
+
+        chain[:, 0] = targets[active]
+        for i in range(1, chain.shape[1] - 1):
+            vec = normalize(chain[:, i] - chain[:, i - 1])
+            chain[:, i] = chain[:, i - 1] + vec * lengths[:, i - 1, None]
+
+        for i in range(chain.shape[1] - 2, -1, -1):
+            vec = normalize(chain[:, i] - chain[:, i + 1])
+            chain[:, i] = chain[:, i + 1] + vec * lengths[:, i, None]
+
+        positions[active] = chain
+
+        moving = np.linalg.norm(chain[:, 0] - last, axis=-1) >= epsilon
+        active = active[moving]
+        last = chain[moving, 0]
+
+    if pole is not None:
+        applyPoleConstraint(positions, np.asarray(pole, dtype=np.float64))
+
+    return positions, boneRotations(positions, joint_rotations)
+
+# analytic inverse kinematics of 2 bones chain(foot, knee, hip), no iteration
+# knee is in plane of hip, target and pole, angle of knee is from law of cosines
+# return:
+# positions:        np.ndarray, shape is (F, 3, 3)
+# rotations:        np.ndarray, shape is (F, 3, 4), quaternion(w, x, y, z)
+# parameter:
+# joint_positions:  np.ndarray, shape is (F, 3, 3), (foot, knee, hip)
+# targets:          np.ndarray, shape is (F, 3), target of foot
+# pole:             np.ndarray, shape is (F, 3), None is current knee
+# joint_rotations:  np.ndarray, shape is (F, 3, 4), rotation of foot is kept
+def solveTwoBone(joint_positions, targets, pole=None, joint_rotations=None):
+    positions = np.array(joint_positions, dtype=np.float64)
+    targets = np.asarray(targets, dtype=np.float64)
+    pole = positions[:, 1].copy() if pole is None else np.asarray(pole, dtype=np.float64)
+
+    foot, knee, hip = positions[:, 0], positions[:, 1], positions[:, 2]
+    thigh = np.linalg.norm(knee - hip, axis=-1)
+    shin = np.linalg.norm(foot - knee, axis=-1)
+
+    to_target = targets - hip
+    distance = np.linalg.norm(to_target, axis=-1)
+    direction = normalize(to_target)
+
+    # out of reach is straight leg toward target, too close is folded leg
+    reach = np.clip(distance, np.abs(thigh - shin), thigh + shin)
+
+    # angle between thigh and hip to target
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cos = (thigh * thigh + reach * reach - shin * shin) / (2.0 * thigh * reach)
+    cos = np.clip(np.nan_to_num(cos, nan=1.0), -1.0, 1.0)
+    sin = np.sqrt(1.0 - cos * cos)
+
+    # bend direction is pole projected on plane orthogonal to hip to target,
+    # pole on line of hip to target(e.g. knee of straight leg) bend to any orthogonal direction
+    bend = pole - hip
+    bend = normalize(bend - dot(bend, direction)[:, None] * direction)
+    straight = np.linalg.norm(bend, axis=-1) == 0.0
+    bend[straight] = normalize(orthogonal(direction[straight]))
+
+    positions[:, 1] = hip + thigh[:, None] * (cos[:, None] * direction + sin[:, None] * bend)
+    positions[:, 0] = hip + reach[:, None] * direction
+
+    return positions, boneRotations(positions, joint_rotations)
@@ -0,0 +1,139 @@
+"""
+write keyframes of all frames at once, F-Curves are filled by foreach_set instead of
+scene.frame_set + keyframe_insert per frame
+"""
+
+import bpy
+import numpy as np
+
+# same group as keyframe_insert of object transform
+ACTION_GROUP = "Object Transforms"
+
+# return:
+# action:   bpy.types.Action, action of object, created if object has not
+# parameter:
+# ob:       bpy.types.Object
+def getAction(ob):
+    if ob.animation_data is None:
+        ob.animation_data_create()
+
+    action = ob.animation_data.action
+    if action is None:
+        action = bpy.data.actions.new(ob.name + "Action")
+        ob.animation_data.action = action
+
+    return action
+
+# replace F-Curves of data_path by keyframes of every frame
+# parameter:
+# ob:           bpy.types.Object
+# data_path:    str, e.g. "location", "rotation_quaternion"
+# frames:       np.ndarray, shape is (F,), frame number of keyframes
+# values:       np.ndarray, shape is (F, channels), channel i is written to F-Curve of index i
+def writeKeyframes(ob, data_path, frames, values):
+    action = getAction(ob)
+
+    values = np.asarray(values).reshape(len(frames), -1)
+    co = np.empty((len(frames), 2), dtype=np.float32)
+    co[:, 0] = frames
+
+    for index in range(values.shape[1]):
+        # new F-Curve is cheaper than removing keyframe points one by one
+        fcurve = action.fcurves.find(data_path, index=index)
+        if fcurve is not None:
+            action.fcurves.remove(fcurve)
+        fcurve = action.fcurves.new(data_path, index=index, action_group=ACTION_GROUP)
+
+        fcurve.keyframe_points.add(len(frames))
+        co[:, 1] = values[:, index]
+        fcurve.keyframe_points.foreach_set('co', co.ravel())
+        # sort keyframes and recalculate auto handles
+        fcurve.update()
+
+# remove F-Curves of data_paths, cost is amount of F-Curves, not keyframes
+# parameter:
+# ob:           bpy.types.Object
+# data_paths:   set[str], None mean remove whole action from object
+def clearKeyframes(ob, data_paths=None):
+    if ob.animation_data is None or ob.animation_data.action is None:
+        return
+
+    action = ob.animation_data.action
+    if data_paths is None:
+        ob.animation_data.action = None
+        if action.users == 0:
+            bpy.data.actions.remove(action)
+        return
+
+    for fcurve in [fcurve for fcurve in action.fcurves if fcurve.data_path in data_paths]:
+        action.fcurves.remove(fcurve)
+
+# set keyframes of frames of data_path, other keyframes of F-Curves are kept,
+# keyframe points are read and written once per F-Curve
+# parameter:
+# ob:           bpy.types.Object
+# data_path:    str, e.g. "location", "rotation_quaternion"
+# frames:       np.ndarray, shape is (F,), frame number of keyframes, unique
+# values:       np.ndarray, shape is (F, channels), channel i is written to F-Curve of index i
+def patchKeyframes(ob, data_path, frames, values):
+    action = getAction(ob)
+
+    frames = np.asarray(frames, dtype=np.float32)
+    values = np.asarray(values).reshape(len(frames), -1)
+
+    for index in range(values.shape[1]):
+        fcurve = action.fcurves.find(data_path, index=index)
+        if fcurve is None:
+            fcurve = action.fcurves.new(data_path, index=index, action_group=ACTION_GROUP)
+
+        amount = len(fcurve.keyframe_points)
+        co = np.empty(amount * 2, dtype=np.float32)
+        fcurve.keyframe_points.foreach_get('co', co)
+        co = co.reshape(-1, 2)
+
+        # keyframe points are sorted by frame, existing keyframes are changed in place
+        found = np.zeros(len(frames), dtype=bool)
+        if amount:
+            position = np.minimum(np.searchsorted(co[:, 0], frames), amount - 1)
+            found = co[position, 0] == frames
+            co[position[found], 1] = values[found, index]
+
+        missing = ~found
+        if missing.any():
+            fcurve.keyframe_points.add(int(missing.sum()))
+            co = np.concatenate((co, np.stack((frames[missing], values[missing, index]), axis=-1)))
+
+        fcurve.keyframe_points.foreach_set('co', co.astype(np.float32).ravel())
+        # sort keyframes and recalculate auto handles
+        fcurve.update()
+
+# changed keyframes collected over a whole operation, every F-Curve is patched once by apply
+class KeyframePatch:
+
+    def __init__(self):
+        # (object name, data_path): (object, list[frames], list[values])
+        self.curves = {}
+
+    # parameter: same as patchKeyframes
+    def add(self, ob, data_path, frames, values):
+        ob_frames, ob_values = self.curves.setdefault((ob.name, data_path), (ob, [], []))[1:]
+        ob_frames.append(np.asarray(frames, dtype=np.float32).reshape(-1))
+        ob_values.append(np.asarray(values).reshape(len(ob_frames[-1]), -1))
+
+    # return:
+    # int, amount of changed keyframes of all F-Curves
+    def apply(self):
+        changed = 0
+        for (name, data_path), (ob, ob_frames, ob_values) in self.curves.items():
+            frames = np.concatenate(ob_frames)
+            values = np.concatenate(ob_values)
+
+            # the last value of the same frame is kept
+            frames, last = np.unique(frames[::-1], return_index=True)
+            values = values[::-1][last]
+
+            patchKeyframes(ob, data_path, frames, values)
+            changed += len(frames) * values.shape[1]
+
+        self.curves = {}
+        return changed
@@ -0,0 +1,498 @@
+"""
+batched forward kinematics of bvh skeleton, all frames x all joints at once
+only depend on numpy, so it can be used without blender
+"""
+
+import numpy as np
+
+AXIS_INDEX = {'X': 0, 'Y': 1, 'Z': 2}
+
+# return:
+# mats:     np.ndarray, shape is (..., 3, 3), rotation matrix of angles around axis
+# parameter:
+# angles:   np.ndarray, radians
+# axis:     str, 'X', 'Y' or 'Z'
+def axisRotationMatrices(angles, axis):
+    c = np.cos(angles)
+    s = np.sin(angles)
+
+    mats = np.zeros(angles.shape + (3, 3))
+    i = AXIS_INDEX[axis]
+    j, k = (i + 1) % 3, (i + 2) % 3
+
+    mats[..., i, i] = 1.0
+    mats[..., j, j] = c
+    mats[..., j, k] = -s
+    mats[..., k, j] = s
+    mats[..., k, k] = c
+
+    return mats
+
+# same as NodeBVH.getRotation, rotation = R_order[0] @ R_order[1] @ R_order[2]
+# return:
+# mats:     np.ndarray, shape is (..., 3, 3)
+# parameter:
+# rotations:    np.ndarray, shape is (..., 3), (rx, ry, rz) in degrees
+# order:        str, e.g. 'ZXY'
+def eulerToMatrices(rotations, order):
+    radians = np.radians(rotations)
+
+    mats = None
+    for axis in order:
+        rotation = axisRotationMatrices(radians[..., AXIS_INDEX[axis]], axis)
+        mats = rotation if mats is None else mats @ rotation
+
+    if mats is None:
+        mats = np.broadcast_to(np.identity(3), rotations.shape[:-1] + (3, 3)).copy()
+
+    return mats
+
+# same as mathutils Matrix.to_euler(order), order is blender euler order
+# e.g. 'XYZ' mean matrix = Rz @ Ry @ Rx
+# return:
+# eulers:   np.ndarray, shape is (..., 3), (x, y, z) in radians
+# parameter:
+# mats:     np.ndarray, shape is (..., 3, 3) or (..., 4, 4), must have no scale
+# order:    str
+def matricesToEuler(mats, order):
+    # i, j, k and parity of blender rotation order
+    i, j, k = (AXIS_INDEX[axis] for axis in order)
+    parity = order in {'XZY', 'YXZ', 'ZYX'}
+
+    # blender's mat[col][row]
+    m = np.swapaxes(mats[..., :3, :3], -1, -2)
+
+    cy = np.hypot(m[..., i, i], m[..., i, j])
+    is_regular = cy > 16.0 * np.finfo(np.float32).eps
+
+    eul1 = np.zeros(mats.shape[:-2] + (3,))
+    eul2 = np.zeros(mats.shape[:-2] + (3,))
+
+    eul1[..., i] = np.where(is_regular, np.arctan2(m[..., j, k], m[..., k, k]), np.arctan2(-m[..., k, j], m[..., j, j]))
+    eul1[..., j] = np.arctan2(-m[..., i, k], cy)
+    eul1[..., k] = np.where(is_regular, np.arctan2(m[..., i, j], m[..., i, i]), 0.0)
+
+    eul2[..., i] = np.where(is_regular, np.arctan2(-m[..., j, k], -m[..., k, k]), eul1[..., i])
+    eul2[..., j] = np.where(is_regular, np.arctan2(-m[..., i, k], -cy), eul1[..., j])
+    eul2[..., k] = np.where(is_regular, np.arctan2(-m[..., i, j], -m[..., i, i]), eul1[..., k])
+
+    if parity:
+        eul1 = -eul1
+        eul2 = -eul2
+
+    # choose the one which has smaller rotation
+    use_eul2 = np.abs(eul1).sum(axis=-1) > np.abs(eul2).sum(axis=-1)
+    return np.where(use_eul2[..., None], eul2, eul1)
+
+# same as mathutils Matrix.to_quaternion(), w is never negative
+# return:
+# quats:    np.ndarray, shape is (..., 4), (w, x, y, z)
+# parameter:
+# mats:     np.ndarray, shape is (..., 3, 3) or (..., 4, 4)
+def matricesToQuaternions(mats):
+    # blender's mat[col][row], columns are normalized
+    m = np.swapaxes(mats[..., :3, :3], -1, -2)
+    m = m / np.linalg.norm(m, axis=-1, keepdims=True)
+
+    m00, m11, m22 = m[..., 0, 0], m[..., 1, 1], m[..., 2, 2]
+    quats = np.empty(m.shape[:-2] + (4,))
+
+    # every branch is computed, the largest component is divisor
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s = 2.0 * np.sqrt(np.maximum(1.0 + m00 + m11 + m22, 0.0))
+        q_w = np.stack((
+            0.25 * s,
+            (m[..., 1, 2] - m[..., 2, 1]) / s,
+            (m[..., 2, 0] - m[..., 0, 2]) / s,
+            (m[..., 0, 1] - m[..., 1, 0]) / s), axis=-1)
+
+        s = 2.0 * np.sqrt(np.maximum(1.0 + m00 - m11 - m22, 0.0))
+        q_x = np.stack((
+            (m[..., 1, 2] - m[..., 2, 1]) / s,
+            0.25 * s,
+            (m[..., 1, 0] + m[..., 0, 1]) / s,
+            (m[..., 2, 0] + m[..., 0, 2]) / s), axis=-1)
+
+        s = 2.0 * np.sqrt(np.maximum(1.0 - m00 + m11 - m22, 0.0))
+        q_y = np.stack((
+            (m[..., 2, 0] - m[..., 0, 2]) / s,
+            (m[..., 1, 0] + m[..., 0, 1]) / s,
+            0.25 * s,
+            (m[..., 2, 1] + m[..., 1, 2]) / s), axis=-1)
+
+        s = 2.0 * np.sqrt(np.maximum(1.0 - m00 - m11 + m22, 0.0))
+        q_z = np.stack((
+            (m[..., 0, 1] - m[..., 1, 0]) / s,
+            (m[..., 2, 0] + m[..., 0, 2]) / s,
+            (m[..., 2, 1] + m[..., 1, 2]) / s,
+            0.25 * s), axis=-1)
+
+    use_w = 0.25 * (1.0 + m00 + m11 + m22) > 1e-4
+    use_x = ~use_w & (m00 > m11) & (m00 > m22)
+    use_y = ~use_w & ~use_x & (m11 > m22)
+
+    quats[...] = q_z
+    quats[use_y] = q_y[use_y]
+    quats[use_x] = q_x[use_x]
+    quats[use_w] = q_w[use_w]
+
+    quats /= np.linalg.norm(quats, axis=-1, keepdims=True)
+    quats[quats[..., 0] < 0.0] *= -1.0
+
+    return quats
+
+# same as mathutils Quaternion.to_matrix(), quaternions are normalized first
+# return:
+# mats:     np.ndarray, shape is (..., 3, 3)
+# parameter:
+# quats:    np.ndarray, shape is (..., 4), (w, x, y, z)
+def quaternionsToMatrices(quats):
+    quats = quats / np.linalg.norm(quats, axis=-1, keepdims=True)
+    w, x, y, z = quats[..., 0], quats[..., 1], quats[..., 2], quats[..., 3]
+
+    return np.stack((
+        np.stack((1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y)), axis=-1),
+        np.stack((2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x)), axis=-1),
+        np.stack((2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)), axis=-1)), axis=-2)
+
+# result of ForwardKinematics.compute, joint axis is node.index
+# model_mats:   np.ndarray, shape is (frames, joints, 4, 4), local to world matrix
+# world_heads:  np.ndarray, shape is (frames, joints, 3)
+# world_tails:  np.ndarray, shape is (frames, joints, 3)
+class PoseFK:
+    __slots__ = (
+        'model_mats',
+        'world_heads',
+        'world_tails',
+        # (frames, roots, 6) root's new_anim_data, computed once by ForwardKinematics.computeRootData
+        'root_data',
+    )
+
+    # tail_offsets: np.ndarray, shape is (joints, 3), local_tail - local_head
+    def __init__(self, model_mats, tail_offsets):
+        self.model_mats = model_mats
+        # views of model_mats
+        self.world_heads = model_mats[..., :3, 3]
+        self.world_tails = np.einsum('fjab,jb->fja', model_mats[..., :3, :3], tail_offsets) + self.world_heads
+        self.root_data = None
+
+    # pose with root_matrices applied before root, forward kinematics is not needed
+    # because root transform only change the whole skeleton rigidly
+    # return:
+    # pose:     PoseFK
+    # parameter:
+    # root_matrices:    np.ndarray, shape is (4, 4) or (frames, 4, 4)
+    def transformed(self, root_matrices):
+        root_matrices = np.asarray(root_matrices, dtype=np.float64)
+        if root_matrices.ndim == 2:
+            root_matrices = root_matrices[None]
+
+        pose = PoseFK.__new__(PoseFK)
+        pose.model_mats = root_matrices[:, None] @ self.model_mats
+        pose.world_heads = pose.model_mats[..., :3, 3]
+        pose.world_tails = (
+            np.einsum('fab,fjb->fja', root_matrices[:, :3, :3], self.world_tails) + root_matrices[:, None, :3, 3])
+        pose.root_data = None
+
+        return pose
+
+    # in place version of transformed for part of frames, used by local path edit
+    # parameter:
+    # source:           PoseFK, untransformed pose
+    # root_matrices:    np.ndarray, shape is (len(frame_indices), 4, 4)
+    # frame_indices:    np.ndarray, frames to update
+    def transformFrames(self, source, root_matrices, frame_indices):
+        root_matrices = np.asarray(root_matrices, dtype=np.float64)
+
+        self.model_mats[frame_indices] = root_matrices[:, None] @ source.model_mats[frame_indices]
+        self.world_tails[frame_indices] = (
+            np.einsum('fab,fjb->fja', root_matrices[:, :3, :3], source.world_tails[frame_indices]) +
+            root_matrices[:, None, :3, 3])
+
+    @property
+    def frames(self):
+        return self.model_mats.shape[0]
+
+    def getModelMatrix(self, frame_idx, joint_idx):
+        return self.model_mats[frame_idx, joint_idx]
+
+    def getWorldHead(self, frame_idx, joint_idx):
+        return self.world_heads[frame_idx, joint_idx]
+
+    def getWorldTail(self, frame_idx, joint_idx):
+        return self.world_tails[frame_idx, joint_idx]
+
+    # world orientation, view of model_mats
+    def getWorldRotation(self, frame_idx, joint_idx):
+        return self.model_mats[frame_idx, joint_idx, :3, :3]
+
+# precompute topology of skeleton once, then compute world transform of all frames
+class ForwardKinematics:
+
+    # parameter:
+    # nodes_bvh:    dict[name:NodeBVH], node.index must be 0 ~ joints-1
+    def __init__(self, nodes_bvh):
+        nodes_list = sorted(nodes_bvh.values(), key=lambda node: node.index)
+
+        self.initialize(
+            [node.name for node in nodes_list],
+            # -1 is root
+            [-1 if node.parent is None else node.parent.index for node in nodes_list],
+            [tuple(node.local_head) for node in nodes_list],
+            [tuple(node.local_tail - node.local_head) for node in nodes_list],
+            [node.getRotationOrder() if node.hasRotation() else '' for node in nodes_list])
+
+    # skeleton of joints from bvhReader.readHierarchy without NodeBVH(no blender),
+    # axis, tail and rotation order are same as MotionPathAnimation.createNodesBVH
+    # parameter:
+    # joints:   list[dict], from bvhReader.readHierarchy
+    # axis:     tuple(str, str, str), blender axis to data axis
+    @classmethod
+    def fromJoints(cls, joints, axis=('X', 'Y', 'Z')):
+        axis_d2b = {axis[0]:'X', axis[1]:'Y', axis[2]:'Z'}
+        # blender axis x, y, z of data offset
+        columns = ['XYZ'.index(axis[i]) for i in range(3)]
+
+        def toBlender(offset):
+            return np.array([offset[column] for column in columns], dtype=np.float64)
+
+        local_heads = [toBlender(joint['offset']) for joint in joints]
+
+        children = [[] for joint in joints]
+        for j, joint in enumerate(joints):
+            if joint['parent'] >= 0:
+                children[joint['parent']].append(j)
+
+        tail_offsets = []
+        rotation_orders = []
+        for j, joint in enumerate(joints):
+            if children[j]:
+                # mean of all children's head
+                tail_offsets.append(np.mean([local_heads[c] for c in children[j]], axis=0))
+            elif joint['end'] is not None:
+                tail_offsets.append(toBlender(joint['end']))
+            else:
+                tail_offsets.append(np.zeros(3))
+
+            # blender axis in channel order
+            rotation_orders.append(''.join(
+                axis_d2b[channel[0].upper()] for channel in joint['channels']
+                if channel.lower().endswith('rotation')))
+
+        forward_kinematics = cls.__new__(cls)
+        forward_kinematics.initialize(
+            [joint['name'] for joint in joints], [joint['parent'] for joint in joints],
+            local_heads, tail_offsets, rotation_orders)
+        return forward_kinematics
+
+    def initialize(self, names, parents, local_heads, tail_offsets, rotation_orders):
+        self.joints = len(names)
+        self.names = list(names)
+
+        self.parents = np.array(parents, dtype=np.intp).reshape(-1)
+
+        self.local_heads = np.array(local_heads, dtype=np.float64).reshape(-1, 3)
+        self.tail_offsets = np.array(tail_offsets, dtype=np.float64).reshape(-1, 3)
+
+        # joints which have same rotation order are computed together
+        self.rotation_orders = list(rotation_orders)
+        self.order_groups = {}
+        for j, order in enumerate(self.rotation_orders):
+            self.order_groups.setdefault(order, []).append(j)
+        for order in self.order_groups:
+            self.order_groups[order] = np.array(self.order_groups[order], dtype=np.intp)
+
+        # topological levels, parent's level is always computed before child's
+        depths = np.zeros(self.joints, dtype=np.intp)
+        for j in self.topologicalOrder():
+            if self.parents[j] >= 0:
+                depths[j] = depths[self.parents[j]] + 1
+
+        self.levels = [np.flatnonzero(depths == d) for d in range(depths.max() + 1)] if self.joints else []
+
+    def topologicalOrder(self):
+        children = [[] for j in range(self.joints)]
+        roots = []
+        for j, parent in enumerate(self.parents):
+            if parent < 0:
+                roots.append(j)
+            else:
+                children[parent].append(j)
+
+        order = []
+        stack = list(reversed(roots))
+        while stack:
+            j = stack.pop()
+            order.append(j)
+            stack.extend(reversed(children[j]))
+
+        return order
+
+    # return:
+    # local_mats:   np.ndarray, shape is (frames, joints, 4, 4), offset @ translation @ rotation
+    # parameter:
+    # frames_data:  np.ndarray, shape is (frames, joints, 6), rows of anim_data
+    def computeLocalMatrices(self, frames_data):
+        frames = frames_data.shape[0]
+
+        local_mats = np.zeros((frames, self.joints, 4, 4))
+        local_mats[..., 3, 3] = 1.0
+
+        for order, group in self.order_groups.items():
+            local_mats[:, group, :3, :3] = eulerToMatrices(frames_data[:, group, 3:6], order)
+
+        local_mats[..., :3, 3] = self.local_heads + frames_data[..., 0:3]
+
+        return local_mats
+
+    # return:
+    # pose:             PoseFK
+    # parameter:
+    # anim_data:        np.ndarray, shape is (frames+1, joints, 6), first row is initial pose
+    # root_matrices:    np.ndarray, shape is (4, 4) or (frames, 4, 4), applied before root, None is identity
+    # frame_indices:    np.ndarray, frame index to compute, None is all frames
+    def compute(self, anim_data, root_matrices=None, frame_indices=None):
+        if frame_indices is None:
+            frames_data = anim_data[1:]
+        else:
+            # same as NodeBVH.getAnimData, out of range is initial pose
+            rows = np.asarray(frame_indices) + 1
+            rows = np.where(rows < anim_data.shape[0], rows, 0)
+            frames_data = anim_data[rows]
+
+        local_mats = self.computeLocalMatrices(frames_data)
+        model_mats = np.empty_like(local_mats)
+
+        for level in self.levels:
+            parents = self.parents[level]
+            is_root = parents < 0
+
+            if is_root.any():
+                roots = level[is_root]
+                if root_matrices is None:
+                    model_mats[:, roots] = local_mats[:, roots]
+                else:
+                    root_matrices = np.asarray(root_matrices, dtype=np.float64)
+                    if root_matrices.ndim == 2:
+                        model_mats[:, roots] = root_matrices @ local_mats[:, roots]
+                    else:
+                        model_mats[:, roots] = root_matrices[:, None] @ local_mats[:, roots]
+
+            if not is_root.all():
+                childs = level[~is_root]
+                model_mats[:, childs] = model_mats[:, self.parents[childs]] @ local_mats[:, childs]
+
+        return PoseFK(model_mats, self.tail_offsets)
+
+    # same as root's new_anim_data written by NodeBVH.updateWorldPosition
+    # return:
+    # root_data:    np.ndarray, shape is (frames, roots, 6), (x, y, z, rx, ry, rz) in degrees
+    # roots:        np.ndarray, index of root joints
+    # parameter:
+    # pose:         PoseFK
+    def computeRootData(self, pose):
+        roots = np.flatnonzero(self.parents < 0)
+        if pose.root_data is not None:
+            return pose.root_data, roots
+
+        root_data = np.empty((pose.frames, len(roots), 6))
+        root_data[..., 0:3] = pose.world_heads[:, roots]
+        for r, j in enumerate(roots):
+            order = self.rotation_orders[j][::-1] or 'XYZ'
+            root_data[:, r, 3:6] = np.degrees(matricesToEuler(pose.model_mats[:, j], order))
+
+        pose.root_data = root_data
+        return root_data, roots
+
+    # recompute root_data of part of frames if it is computed
+    def updateRootData(self, pose, frame_indices):
+        if pose.root_data is None:
+            return
+
+        roots = np.flatnonzero(self.parents < 0)
+        pose.root_data[frame_indices, :, 0:3] = pose.world_heads[frame_indices][:, roots]
+        for r, j in enumerate(roots):
+            order = self.rotation_orders[j][::-1] or 'XYZ'
+            pose.root_data[frame_indices, r, 3:6] = np.degrees(
+                matricesToEuler(pose.model_mats[frame_indices, j], order))
+
+# world pose of one animation keyed by the transform applied to root,
+# so forward kinematics of same anim_data and root transform is computed once
+# key IDENTITY: no root transform, key PATH: init_to_new_matrixs of motion path editing
+# owner must call invalidate when anim_data or root transform is changed
+class PoseCache:
+    IDENTITY = 'identity'
+    PATH = 'path'
+
+    def __init__(self, forward_kinematics):
+        self.forward_kinematics = forward_kinematics
+        self.poses = {}
+
+        self.hits = 0
+        self.recomputes = 0
+
+    # pose of a root transform is derived from IDENTITY pose, so editing path
+    # only recompute root transforms, not forward kinematics of all joints
+    # return:
+    # pose:     PoseFK
+    # parameter:
+    # key:              str, IDENTITY or PATH
+    # anim_data:        np.ndarray, shape is (frames+1, joints, 6)
+    # frames:           int, number of frames
+    # root_matrices:    same as ForwardKinematics.compute, only used when pose is not cached
+    def getPose(self, key, anim_data, frames, root_matrices=None):
+        pose = self.poses.get(key)
+        if pose is not None and pose.frames == frames:
+            self.hits += 1
+            return pose
+
+        if key != PoseCache.IDENTITY and root_matrices is not None:
+            pose = self.getPose(PoseCache.IDENTITY, anim_data, frames).transformed(root_matrices)
+        else:
+            pose = self.forward_kinematics.compute(anim_data, root_matrices, np.arange(frames))
+
+        self.poses[key] = pose
+        self.recomputes += 1
+        return pose
+
+    # update frames of a cached pose after root transform of these frames is changed,
+    # whole pose is computed if it is not cached
+    # return:
+    # pose:     PoseFK
+    # parameter:
+    # key:              str, not IDENTITY
+    # anim_data:        np.ndarray, shape is (frames+1, joints, 6)
+    # frames:           int, number of frames
+    # frame_indices:    np.ndarray, changed frames
+    # root_matrices:    np.ndarray, shape is (frames, 4, 4), new root transform of all frames
+    def updatePose(self, key, anim_data, frames, frame_indices, root_matrices):
+        pose = self.poses.get(key)
+        if pose is None or pose.frames != frames:
+            return self.getPose(key, anim_data, frames, root_matrices)
+
+        identity = self.getPose(PoseCache.IDENTITY, anim_data, frames)
+        pose.transformFrames(identity, np.asarray(root_matrices)[frame_indices], frame_indices)
+        self.forward_kinematics.updateRootData(pose, frame_indices)
+        return pose
+
+    # replace a cached pose by a pose which is not computed from anim_data(e.g. keyframes corrected by IK),
+    # later updatePose of key still transform changed frames from IDENTITY pose
+    # parameter:
+    # key:  str, not IDENTITY
+    # pose: PoseFK, pose of all frames
+    def setPose(self, key, pose):
+        self.poses[key] = pose
+
+    def hasPose(self, key):
+        return key in self.poses
+
+    # parameter:
+    # key:  str, None mean all poses
+    def invalidate(self, key=None):
+        if key is None:
+            self.poses.clear()
+        else:
+            self.poses.pop(key, None)
+
+    def getStats(self):
+        return {'hits': self.hits, 'recomputes': self.recomputes}
@@ -1,19 +1,22 @@
 import bpy
 from bpy.types import Operator
-import math
-from mathutils import Vector, Euler, Matrix
+import numpy as np
 
 
 from .importBvh import NodeBVH, MotionPathAnimation
-from .createBlenderThing import createPolyCurve
+from .kinematics import PoseCache
+from .createBlenderThing import createPolyCurve, updatePolyCurve
+from . import registrationCore
+from . import registrationPipeline
+from .registrationCache import RegistrationCache
 
 
 class RegistrationCurve:
     registration_curves = []
     
     @classmethod
-    def AddRegistrationCurve(cls, context, bvh_motion_0, bvh_motion_1):
-        curve = RegistrationCurve(context, bvh_motion_0, bvh_motion_1)
+    def AddRegistrationCurve(cls, context, bvh_motion_0, bvh_motion_1, **parameters):
+        curve = RegistrationCurve(context, bvh_motion_0, bvh_motion_1, **parameters)
         
         if curve != None:
             cls.registration_curves.append(curve)
@@ -28,26 +31,37 @@ class RegistrationCurve:
                     return r_curve
         return None
 
+    # return:
+    # motion:       registrationPipeline.MotionData, from cached pose of path, no frame_set
+    # parameter:
+    # bvh_motion:   MotionPathAnimation
+    @staticmethod
+    def extractMotion(bvh_motion):
+        # also write root's new_anim_data of current path
+        pose = bvh_motion.updateWorldPositions(PoseCache.PATH)
+
+        return registrationPipeline.motionFromArrays(
+            bvh_motion.getForwardKinematics(), bvh_motion.anim_data,
+            new_anim_data=bvh_motion.new_anim_data, pose=pose)
+
     def updateBlendingInterpolation(self, w0):
-        for t in range(len(self.M_0)):
-            self.w_0[t] = w0
-        
-        if self.blending_motion is not None:
-            bpy.data.objects.remove(self.blending_motion)
-            self.blending_motion = None
+        self.w_0[:] = w0
 
         self.blending_motion = self.generateBlendingMotion()
         
     def updateBlendingTransition(self):
-        for t in range(len(self.M_0)):
-            self.w_0[t] = 1.0 - (t / (len(self.M_0) - 1))
-
-        if self.blending_motion is not None:
-            bpy.data.objects.remove(self.blending_motion)
+        self.w_0[:] = 1.0 - np.arange(len(self.M_0)) / (len(self.M_0) - 1)
 
         self.blending_motion = self.generateBlendingMotion()
 
-    def __init__(self, context, bvh_motion_0, bvh_motion_1):
+    # parameter:
+    # timewarp_method:  str, 'FULL' compute whole distance map, 'BAND' only cells near diagonal,
+    #                   'MULTISCALE' only cells near path of half resolution(FastDTW)
+    # timewarp_radius:  int, radius of band
+    # timewarp_max_run: int, max consecutive horizontal or vertical steps of time warp, 0 is unlimited
+    # use_numba:        bool, use compiled time warp kernel if numba is installed
+    def __init__(self, context, bvh_motion_0, bvh_motion_1,
+        timewarp_method='FULL', timewarp_radius=8, timewarp_max_run=0, use_numba=True):
         self.context = context
         
         self.name = bvh_motion_0.name + "_blend_" + bvh_motion_1.name
@@ -58,393 +72,130 @@ class RegistrationCurve:
         self.blending_motion = None
         # we only accept 2 motion 
         # mean Mj and j = 0, 1
+        motion_0 = self.extractMotion(self.bvh_motion_0)
+        motion_1 = self.extractMotion(self.bvh_motion_1)
+
+        # whole algorithm is in registrationPipeline, this class only create blender objects,
+        # results of the same 2 motions and parameters are read from RegistrationCache
+        self.registration = RegistrationCache.GetRegistration(
+            motion_0, motion_1,
+            timewarp_method=timewarp_method,
+            timewarp_radius=timewarp_radius,
+            timewarp_max_run=timewarp_max_run,
+            use_numba=use_numba)
 
         # weight of motion 0
+        self.w_0 = np.ones(motion_0.frames)
 
-        def extractMotiondata(skeleton_name, roots, nodes, frame_amount):
-            M = []
-            for f in range(0, frame_amount):
-                M_f = []
-                M_f.append(roots[f].co.xyz)
-                for name in skeleton_name:
-                    joints = [node for node in nodes if name == node.name]
-                    if joints:
-                        node = joints[0]
-                        data = node.getNewAnimData(f)
-                        M_f.append(Vector((
-                            math.radians(data[3]),
-                            math.radians(data[4]),
-                            math.radians(data[5]))))
-                    else:
-                        print("ERROR::TWO_MOTION::SKELETON::UNSAME")
-                        return None
-
-                M.append(tuple(M_f))
-
-            return M
-
-        def extractJointPosition(skeleton_objs, motion_name, skeleton_name, frame_amount):
-            p = []
-            for f in range(frame_amount):
-                p_f = []
-                bpy.context.scene.frame_set(f)
-                for name in skeleton_name:
-                    joint_position = [ob.location.xyz for ob in skeleton_objs if name in ob.name]
-                    if joint_position:
-                        p_f.append(joint_position[0])
-                    else:
-                        print("ERROR::TWO_MOTION::SKELETON::UNSAME")
-                        return None
-                p.append(p_f)
-
-            return p
-
-        self.w_0 = []
-        for t in range(self.bvh_motion_0.frames_bvh):
-            self.w_0.append(1.0)
-
-        skeleton_name = []
-        root = NodeBVH.getRoot(self.bvh_motion_0.nodes_bvh)
-        skeleton_name.append(root.name)
-        for node in self.bvh_motion_0.nodes_bvh.values():
-            if node is not root:
-                skeleton_name.append(node.name)
-
-
-        self.M_0 = extractMotiondata(
-            skeleton_name,
-            self.bvh_motion_0.new_motion.data.splines[0].points.values(),
-            self.bvh_motion_0.nodes_bvh.values(), 
-            self.bvh_motion_0.frames_bvh)
-        self.M_1 = extractMotiondata(
-            skeleton_name,
-            self.bvh_motion_1.new_motion.data.splines[0].points.values(),
-            self.bvh_motion_1.nodes_bvh.values(), 
-            self.bvh_motion_1.frames_bvh)
-
-        skeleton_name = []
-        # set skeleton order
-        for ob in self.bvh_motion_0.skeleton.all_objects.values():
-                if any(x in ob.name for x in ['_head', '_tail']):
-                    skeleton_name.append(ob.name[ob.name.rfind("."):])
-
-
-        self.p_0 = extractJointPosition(
-            self.bvh_motion_0.skeleton.all_objects.values(),
-            self.bvh_motion_0.name,
-            skeleton_name, 
-            self.bvh_motion_0.frames_bvh)
-        self.p_1 = extractJointPosition(
-            self.bvh_motion_1.skeleton.all_objects.values(),
-            self.bvh_motion_1.name,
-            skeleton_name,
-            self.bvh_motion_1.frames_bvh)
-
-        self.generateTransformMap()
-        self.generateDistanceMap()
-
-        # create registration
-        self.generateTimewarpCurve()
-        self.generateAligmentCurve()
-
-    def getAlignmentTransformation(self, F0, F1, frame = 5):
-        F0_end = min(F0 + frame, len(self.p_0))
-        F1_end = min(F1 + frame, len(self.p_1))
-
-        if F0_end - F0 > F1_end - F1:
-            F0_end = F0 + (F1_end - F1)
-        else:
-            F1_end = F1 + (F0_end - F0)
-
-        # 2D list to 1D list
-        # https://www.geeksforgeeks.org/python-ways-to-flatten-a-2d-list/
-        #[j for sub in ini_list for j in sub] 
-
-        y0 = [p_i.y for i in range(F0, F0_end) for p_i in self.p_0[i] ]
-        x0 = [p_i.x for i in range(F0, F0_end) for p_i in self.p_0[i] ]
-        y1 = [p_i.y for i in range(F1, F1_end) for p_i in self.p_1[i] ]
-        x1 = [p_i.x for i in range(F1, F1_end) for p_i in self.p_1[i] ]
-
-        n = len(y0)
-        w_i = 1.0 / n
-
-        y0_bar = sum(w_i * y0[i] for i in range(n))
-        x0_bar = sum(w_i * x0[i] for i in range(n))
-        y1_bar = sum(w_i * y1[i] for i in range(n))
-        x1_bar = sum(w_i * x1[i] for i in range(n))
-
-
-        theta = math.atan(
-            (sum(w_i * (y0[i] * x1[i] - y1[i] * x0[i]) for i in range(n)) - (y0_bar * x1_bar - y1_bar * x0_bar)) / 
-            (sum(w_i * (y0[i] * y1[i] + x0[i] * x1[i]) for i in range(n)) - (y0_bar * y1_bar + x0_bar * x1_bar)) )
-
-        y_0 = y0_bar - y1_bar * math.cos(theta) - x1_bar * math.sin(theta)
-        x_0 = x0_bar + y1_bar * math.sin(theta) - x1_bar * math.cos(theta)
-
-        return (theta, y_0, x_0)
-
-    # (theta, y, x) to transform matrix 
-    @staticmethod
-    def transformVectorToMatrix(vec):
-        return Matrix.Translation(Vector((vec[2], vec[1], 0.0))) @ Matrix.Rotation(vec[0], 4, 'Z')
+        # motion 1 of registration is in joint order of motion 0
+        self.M_0 = motion_0.M
+        self.M_1 = self.registration.motion_1.M
+        self.p_0 = motion_0.positions
+        self.p_1 = self.registration.motion_1.positions
 
-    @staticmethod
-    def transformMatrixToVector(mat):
-        loc, rot, sca = mat.decompose()
-        eul = rot.to_euler()
-        return Vector((eul.z, loc.y, loc.x))
-
-
-    def generateTransformMap(self):
-        self.transform_map = []
-        for F0 in range(len(self.p_0)):
-            row = []
-            for F1 in range(len(self.p_1)):
-                row.append(self.getAlignmentTransformation(F0, F1))
-            self.transform_map.append(row)
-
-    def generateDistanceMap(self):
-        # F0 is frame idx of motion 1
-        # F1 is frame idx of motion 2 
-        def D(F0, F1):
-            n = len(self.p_0[F0])
-            w_i = 1.0 / n
-
-            distance = 0.0
-
-            T = self.transformVectorToMatrix(self.transform_map[F0][F1])
-            for p0_i, p1_i in zip(self.p_0[F0], self.p_1[F1]):
-                distance += w_i * (p0_i - T @ p1_i).length_squared
-
-            return distance
-
-        self.distance_map = []
-        for F0 in range(len(self.p_0)):
-            row = []
-            for F1 in range(len(self.p_1)):    
-                row.append(D(F0, F1))
-            self.distance_map.append(row)
-
-    def generateTimewarpCurve(self):
-        # refer: https://blog.csdn.net/seagal890/article/details/95028066
-        def minimal_cost_connecting_path(cost):
-            w = len(cost)
-            h = len(cost[0])
-            dp = [[0 for y in range(h)] for x in range(w)]
-
-            for i in range(1,w):
-                dp[i][0] = dp[i - 1][0] + cost[i][0] 
-            
-            for j in range(1,h):
-                dp[0][j] = dp[0][j - 1] + cost[0][j]
+        self.transform_map = self.registration.transform_map
+        self.distance_map = self.registration.distance_map
+        self.S = self.registration.S
+        self.A = self.registration.A
 
+        self.B = None
 
-            for j in range(1,h):
-                for i in range(1,w):
-                    min_cost = min(dp[i - 1][j - 1], dp[i - 1][j], dp[i][j - 1])
-                    dp[i][j] = min_cost + cost[i][j]
+    # (theta, y, x) align window of motion 1 at F1 to window of motion 0 at F0
+    def getAlignmentTransformation(self, F0, F1, frame = registrationCore.ALIGNMENT_WINDOW):
+        return tuple(registrationCore.alignmentTransformation(self.p_0, self.p_1, F0, F1, frame))
 
-            
-            # track path
-            # S[u] = (S1, S2)
-            S = []
-            i = w - 1
-            j = h - 1
-            S.append((i, j))
-            while i > 0 and j > 0:
-                min_cost = min(dp[i - 1][j - 1], dp[i - 1][j], dp[i][j - 1])
-                if min_cost == dp[i][j - 1]:
-                    j -= 1
-                elif min_cost == dp[i - 1][j]:
-                    i -= 1
-                else:
-                    i -= 1
-                    j -= 1
-                S.append((i, j))
-            S.reverse()
-            return S
-                
-        self.S = minimal_cost_connecting_path(self.distance_map)
-                    
-    def generateAligmentCurve(self):
-        
-        self.A = []
-        for u in range(len(self.S)):
-            S0_u = self.S[u][0]
-            S1_u = self.S[u][1]
-            
-            self.A.append((
-                Vector((0.0, 0.0, 0.0)), 
-                Vector(self.transform_map[S0_u][S1_u])))
-
-        for u in range(1, len(self.A)):
-            
-            # if delta thete > 0.7 radian, we will inverse that(+- pi radian) 
-            if math.fabs(self.A[u][1][0] - self.A[u-1][1][0]) > 0.7:
-                old_radian = self.A[u][1][0]
-                new_radian = self.A[u][1][0] - math.pi if self.A[u][1][0] > self.A[u-1][1][0] else self.A[u][1][0] + math.pi
+    # return:
+    # bool, blending_motion is still in blend file
+    def hasBlendingMotion(self):
+        if self.blending_motion is None:
+            return False
+        try:
+            return self.blending_motion.name in bpy.data.objects
+        except ReferenceError:
+            return False
 
-                old_translate = Vector((self.A[u][1][2], self.A[u][1][1], 0.0))
-                new_translate = old_translate + Matrix.Rotation(old_radian, 4, 'Z') @ self.M_1[self.S[u][1]][0] - Matrix.Rotation(new_radian, 4, 'Z') @ self.M_1[self.S[u][1]][0]
+    def generateBlendingMotion(self):
+        # B: np.ndarray, shape is (steps, joints+1, 3), B[i, 0] is root position
+        self.B = self.registration.blend(self.w_0)
 
-                # temp1 = Matrix.Translation(old_translate) @ Matrix.Rotation(old_radian, 4, 'Z') @ self.M_1[self.S[u][1]][0]
-                # temp2 = Matrix.Translation(new_translate) @ Matrix.Rotation(new_radian, 4, 'Z') @ self.M_1[self.S[u][1]][0]
+        # points of existing curve are updated in place when weight is changed
+        if self.hasBlendingMotion():
+            return updatePolyCurve(self.blending_motion, self.B[:, 0])
 
-                self.A[u] = (
-                    Vector((0.0, 0.0, 0.0)), 
-                    Vector((new_radian, new_translate.y, new_translate.x)))
+        return createPolyCurve(
+            self.context, self.context.scene.collection, 
+            self.name, self.B[:, 0])
 
-    def generateBlendingMotion(self):
+    def createMotionPathAnimation(self):
 
-        def linearInterpolation(f0, f1, t):
-            return f0 * (1.0 - t) + f1 * t
+        nodes_clone = NodeBVH.nodesBVHCopy(
+            self.bvh_motion_0.nodes_bvh, self.bvh_motion_0.frames_bvh,
+            self.bvh_motion_0.getPose(PoseCache.IDENTITY))
 
 
-        def W0(f):
-            low = int(f)
-            high = low + 1
+        # set nodes to initial position
+        NodeBVH.updateNodesWorldPosition(nodes_clone, -1)
 
-            if high < len(self.w_0):
-                return linearInterpolation(self.w_0[low], self.w_0[high], f - low) 
+        # (lx, ly, lz, rx, ry, rz) of every node, first row is initial pose
+        rotations = np.degrees(self.B[:, 1:])
+        for j, node in enumerate(nodes_clone.values()):
+            node.anim_data = np.zeros((len(self.B) + 1, 6))
+            if node.parent is None:
+                node.anim_data[1:, 0:3] = self.B[:, 0]
+                node.anim_data[1:, 3:6] = rotations[:, 0]
             else:
-                return self.w_0[-1]
-
-        def A(u):
-            low = int(u)
-            high = low + 1
+                node.anim_data[1:, 3:6] = rotations[:, j]
 
-            if high < len(self.A):
-                return (
-                    linearInterpolation(self.A[low][0], self.A[high][0], u - low),
-                    linearInterpolation(self.A[low][1], self.A[high][1], u - low))
-            else:
-                return (self.A[-1][0], self.A[-1][1])
+        for node in nodes_clone.values():
+            node.new_anim_data = node.anim_data.copy()
             
-        def S(u):
-            low = int(u)
-            high = low + 1
-
-            if high < len(self.S):
-                return (
-                    linearInterpolation(self.S[low][0], self.S[high][0], u - low),
-                    linearInterpolation(self.S[low][1], self.S[high][1], u - low))
-            else:
-                return (self.S[-1][0], self.S[-1][1])
+        return MotionPathAnimation.AddPathAnimationFromCreated(
+            self.context, self.blending_motion.name, nodes_clone, len(self.B), self.bvh_motion_0.frame_time_bvh)   
 
-        def M0(f):
-            low = int(f)
-            high = low + 1
+# blend of N motions, every motion is registered to reference motion(first motion)
+class MultiRegistrationCurve(RegistrationCurve):
+    # amount of weights of scene.r_curve_multi_weights
+    MAX_MOTIONS = 8
 
-            if high < len(self.M_0):
-                return [linearInterpolation(Ml_i, Mh_i, f - low) for Ml_i, Mh_i in zip(self.M_0[low], self.M_0[high])]
-            else:
-                return self.M_0[-1]
-        def M1(f):
-            low = int(f)
-            high = low + 1
+    def __init__(self, context, bvh_motions,
+        timewarp_method='FULL', timewarp_radius=8, timewarp_max_run=0, use_numba=True):
+        self.context = context
 
-            if high < len(self.M_1):
-                return [linearInterpolation(Ml_i, Mh_i, f - low) for Ml_i, Mh_i in zip(self.M_1[low], self.M_1[high])]
-            else:
-                return self.M_1[-1]
-
-        self.B = []
-
-        T = []
-        T.append(Vector((0.0, 0.0, 0.0)))
-
-        t = 0
-        u = 0
-        delta_t = 1
-
-        du = 1.0 / len(self.S)
-        dS_0 = 1.0 / len(self.M_0)
-        dS_1 = 1.0 / len(self.M_1)
-
-        w = (W0(0.0), 1.0 - W0(0.0))
-        while u < len(self.S):
-            B_i = []
-
-            A0_u = self.transformVectorToMatrix(A(u)[0])
-            A1_u = self.transformVectorToMatrix(A(u)[1])
-
-            M0_u = M0(S(u)[0])
-            M1_u = M1(S(u)[1])
-            # i = 0~N-1
-            # N is amount of joint
-            for i in range(len(M0_u)):
-                if i == 0:
-                    B_i.append(
-                        w[0] * (A0_u @ M0_u[i]) + 
-                        w[1] * (A1_u @ M1_u[i]) )
-                else:
-                    B_i.append(
-                        w[0] * M0_u[i] + 
-                        w[1] * M1_u[i] )
-
-
-            B_i[0] = self.transformVectorToMatrix(T[t]) @ B_i[0]
-            # B_i[0] = self.transformVectorToMatrix(T[0]) @ self.transformVectorToMatrix(A(0)[0]) @ M0(S(u)[1])[0]
-            # B_i[0] = self.transformVectorToMatrix(T[0]) @ self.transformVectorToMatrix(A(0)[1]) @ M1(S(u)[1])[0]
-            self.B.append(B_i)
-
-            delta_u = w[0] * (du / dS_0) + w[1] * (du / dS_1)
-            t += delta_t
-            u += delta_u
-
-            delta_T = []
-            for j in range(len(w)):
-                T_i_0 = self.transformVectorToMatrix(T[t-delta_t])
-                A_i_0 = self.transformVectorToMatrix(A(u-delta_u)[j])
-                A_i_1 = self.transformVectorToMatrix(A(u)[j])
-                delta_T.append(
-                    self.transformMatrixToVector(
-                    T_i_0 @ A_i_0 @ A_i_1.inverted()))
-
-            T_i = Vector((0.0, 0.0, 0.0))
-            for j in range(len(w)):
-                T_i += w[j] * delta_T[j]
-            T.append(T_i)
-
-            w = (W0(S(u)[0]), 1.0 - W0(S(u)[0]))
-            
+        self.name = "_blend_".join(bvh_motion.name for bvh_motion in bvh_motions)
 
-        return createPolyCurve(
-            self.context, self.context.scene.collection, 
-            self.name, [B_i[0] for B_i in self.B])
+        self.bvh_motions = bvh_motions
+        # reference motion, skeleton of blended motion
+        self.bvh_motion_0 = bvh_motions[0]
 
-    def createMotionPathAnimation(self):
+        self.blending_motion = None
 
-        nodes_clone = NodeBVH.nodesBVHCopy(
-            self.bvh_motion_0.nodes_bvh, self.bvh_motion_0.frames_bvh)
+        self.registration = registrationPipeline.MultiRegistration(
+            [self.extractMotion(bvh_motion) for bvh_motion in bvh_motions],
+            register=RegistrationCache.GetRegistration,
+            timewarp_method=timewarp_method,
+            timewarp_radius=timewarp_radius,
+            timewarp_max_run=timewarp_max_run,
+            use_numba=use_numba)
 
+        self.B = None
 
-        # set nodes to initial position
-        NodeBVH.updateNodesWorldPosition(nodes_clone, -1)
+    # parameter:
+    # weights:  np.ndarray, shape is (N,) or (N, frames of reference motion)
+    def updateBlendingWeights(self, weights):
+        self.registration.setWeights(weights)
+
+        self.blending_motion = self.generateBlendingMotion()
+
+    def generateBlendingMotion(self):
+        self.B = self.registration.blend()
+
+        if self.hasBlendingMotion():
+            return updatePolyCurve(self.blending_motion, self.B[:, 0])
+
+        return createPolyCurve(
+            self.context, self.context.scene.collection, 
+            self.name, self.B[:, 0])
 
-        for node in nodes_clone.values():
-            node.anim_data.clear()
-            node.anim_data = [(0.0, 0.0, 0.0, 0.0, 0.0, 0.0)]
-            node.new_anim_data.clear()
-            node.new_anim_data = [(0.0, 0.0, 0.0, 0.0, 0.0, 0.0)]
-
-        for B_i in self.B:
-            for j, node in enumerate(nodes_clone.values()):
-                if node.parent is None:
-                    data = (
-                        B_i[0].x, B_i[0].y, B_i[0].z, 
-                        math.degrees(B_i[1].x), math.degrees(B_i[1].y), math.degrees(B_i[1].z))
-                    node.anim_data.append(data)
-                    node.new_anim_data.append(data)
-                else:
-                    data = (
-                        0.0, 0.0, 0.0, 
-                        math.degrees(B_i[j+1].x), math.degrees(B_i[j+1].y), math.degrees(B_i[j+1].z))
-                    node.anim_data.append(data)
-                    node.new_anim_data.append(data)
-            
-        return MotionPathAnimation.AddPathAnimationFromCreated(
-            self.context, self.blending_motion.name, nodes_clone, len(self.B), self.bvh_motion_0.frame_time_bvh)   
 
 class MAOGenerateRegistrationCurve(Operator):
     bl_idname = "mao_animation.registration_curve"
@@ -472,7 +223,13 @@ class MAOGenerateRegistrationCurve(Operator):
         motion_1 = MotionPathAnimation.GetPathAnimationByName(motion_1_name)
         motion_2 = MotionPathAnimation.GetPathAnimationByName(motion_2_name)
 
-        blending_motion = RegistrationCurve.AddRegistrationCurve(context, motion_1, motion_2)
+        RegistrationCache.enabled = context.scene.r_curve_use_cache
+        blending_motion = RegistrationCurve.AddRegistrationCurve(
+            context, motion_1, motion_2,
+            timewarp_method=context.scene.r_curve_timewarp_method,
+            timewarp_radius=context.scene.r_curve_timewarp_radius,
+            timewarp_max_run=context.scene.r_curve_timewarp_max_run,
+            use_numba=context.scene.r_curve_use_numba)
         if bpy.context.scene.r_curve_blending_method == 'INT':
             blending_motion.updateBlendingInterpolation(bpy.context.scene.r_curve_motion_1_weight)
         elif bpy.context.scene.r_curve_blending_method == 'TRA':
@@ -480,6 +237,39 @@ class MAOGenerateRegistrationCurve(Operator):
 
         return {'FINISHED'}
 
+class MAOGenerateMultiRegistrationCurve(Operator):
+    bl_idname = "mao_animation.multi_registration_curve"
+    bl_label = "register motions to first motion and blend them by weights"
+    bl_description = "OUO/"
+
+    @staticmethod
+    def getMotions(context):
+        names = [name.strip() for name in context.scene.r_curve_multi_motion_names.split(",") if name.strip()]
+        motions = [MotionPathAnimation.GetPathAnimationByName(name) for name in names]
+        if len(motions) < 2 or len(motions) > MultiRegistrationCurve.MAX_MOTIONS or None in motions:
+            return None
+        return motions
+
+    @classmethod
+    def poll(cls, context):
+        return cls.getMotions(context) is not None
+
+    def execute(self, context):
+        motions = self.getMotions(context)
+
+        RegistrationCache.enabled = context.scene.r_curve_use_cache
+        r_curve = MultiRegistrationCurve(
+            context, motions,
+            timewarp_method=context.scene.r_curve_timewarp_method,
+            timewarp_radius=context.scene.r_curve_timewarp_radius,
+            timewarp_max_run=context.scene.r_curve_timewarp_max_run,
+            use_numba=context.scene.r_curve_use_numba)
+        RegistrationCurve.registration_curves.append(r_curve)
+
+        r_curve.updateBlendingWeights(context.scene.r_curve_multi_weights[:len(motions)])
+
+        return {'FINISHED'}
+
 class MAORegistrationCurveToPathAnimation(Operator):
     bl_idname = "mao_animation.registration_curve_to_path_animation"
     bl_label = "generate registration curve to motion path animation"
@@ -523,15 +313,32 @@ def draw(context, layout):
     row = layout.row()
     row.prop(context.scene,"r_curve_blending_method",text="blending mehod")
 
+    row = layout.row()
+    row.prop(context.scene,"r_curve_timewarp_method",text="time warp")
+    row.prop(context.scene,"r_curve_timewarp_radius",text="radius")
+    row.prop(context.scene,"r_curve_timewarp_max_run",text="max run")
+
+    row = layout.row()
+    row.prop(context.scene,"r_curve_use_cache",text="use cache")
+    row.prop(context.scene,"r_curve_use_numba",text="use numba")
+
     row = layout.row()
     row.operator('mao_animation.registration_curve', text = "generate registration curve")
 
+    row = layout.row()
+    row.prop(context.scene,"r_curve_multi_motion_names",text="motions")
+    row = layout.row()
+    row.prop(context.scene,"r_curve_multi_weights",text="")
+    row = layout.row()
+    row.operator('mao_animation.multi_registration_curve', text = "generate multi registration curve")
+
     row = layout.row()
     row.operator('mao_animation.registration_curve_to_path_animation', text = "generate motion path")
 
 def register():
     bpy.utils.register_class(MAOGenerateRegistrationCurve)
     bpy.utils.register_class(MAORegistrationCurveToPathAnimation)
+    bpy.utils.register_class(MAOGenerateMultiRegistrationCurve)
     
     bpy.types.Scene.select_motion_1_name = bpy.props.StringProperty()
     bpy.types.Scene.select_motion_2_name = bpy.props.StringProperty()
@@ -540,7 +347,7 @@ def register():
         # print(bpy.context.scene.r_curve_motion_1_weight)
         for ob in context.selected_objects:
             r_curve = RegistrationCurve.GetBlendingMotionByName(ob.name)
-            if r_curve is not None:
+            if r_curve is not None and not isinstance(r_curve, MultiRegistrationCurve):
                 r_curve.updateBlendingInterpolation(bpy.context.scene.r_curve_motion_1_weight)
                 r_curve.blending_motion.select_set(True)
 
@@ -554,12 +361,52 @@ def register():
             default='INT',
             )
 
+    bpy.types.Scene.r_curve_timewarp_method = bpy.props.EnumProperty(
+            name="time warp method",
+            description="Select cells of distance map used by time warp",
+            items=(('FULL', "Full", "whole distance map"),
+                   ('BAND', "Band", "cells near diagonal(Sakoe-Chiba band)"),
+                   ('MULTISCALE', "Multiscale", "cells near path of half resolution, for long motion")),
+            default='FULL',
+            )
+    bpy.types.Scene.r_curve_timewarp_radius = bpy.props.IntProperty(default=8,min=1,max=1000)
+    # max consecutive frames a motion is frozen by time warp, 0 is unlimited
+    bpy.types.Scene.r_curve_timewarp_max_run = bpy.props.IntProperty(default=0,min=0,max=100)
+    # compiled time warp kernel if numba is installed, same result as numpy
+    bpy.types.Scene.r_curve_use_numba = bpy.props.BoolProperty(default=True)
+    # read and write results of registration in RegistrationCache
+    bpy.types.Scene.r_curve_use_cache = bpy.props.BoolProperty(default=True)
+
+    def updateMultiBlendingWeights(self, context):
+        for ob in context.selected_objects:
+            r_curve = RegistrationCurve.GetBlendingMotionByName(ob.name)
+            if not isinstance(r_curve, MultiRegistrationCurve):
+                continue
+
+            weights = context.scene.r_curve_multi_weights[:len(r_curve.bvh_motions)]
+            # at least one motion is used
+            if sum(weights) > 0.0:
+                r_curve.updateBlendingWeights(weights)
+                r_curve.blending_motion.select_set(True)
+
+    # comma separated names of motions, first is reference motion
+    bpy.types.Scene.r_curve_multi_motion_names = bpy.props.StringProperty()
+    bpy.types.Scene.r_curve_multi_weights = bpy.props.FloatVectorProperty(
+        size=MultiRegistrationCurve.MAX_MOTIONS, default=(1.0,) * MultiRegistrationCurve.MAX_MOTIONS,
+        min=0.0, max=1.0, update=updateMultiBlendingWeights)
+
 def unregister():
     bpy.utils.unregister_class(MAOGenerateRegistrationCurve)
     bpy.utils.unregister_class(MAORegistrationCurveToPathAnimation)
+    bpy.utils.unregister_class(MAOGenerateMultiRegistrationCurve)
 
     del bpy.types.Scene.select_motion_1_name
     del bpy.types.Scene.select_motion_2_name
     del bpy.types.Scene.r_curve_motion_1_weight
-    
-        
\ No newline at end of file
+    del bpy.types.Scene.r_curve_timewarp_method
+    del bpy.types.Scene.r_curve_timewarp_radius
+    del bpy.types.Scene.r_curve_timewarp_max_run
+    del bpy.types.Scene.r_curve_use_numba
+    del bpy.types.Scene.r_curve_use_cache
+    del bpy.types.Scene.r_curve_multi_motion_names
+    del bpy.types.Scene.r_curve_multi_weights
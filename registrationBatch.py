@@ -0,0 +1,188 @@
+"""
+build registration curves of many motion pairs in worker processes
+
+motion arrays are written once to .npy files in a work directory and every worker maps them
+by np.load(mmap_mode='r'), so a task only send indices of 2 motions instead of pickling arrays
+(multiprocessing.shared_memory needs python 3.8, blender 2.81 ship python 3.7)
+
+run without blender from this directory, register every pair of bvh files of directory:
+python registrationBatch.py directory [workers]
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+try:
+    from . import registrationPipeline
+    from .registrationCache import RegistrationCache
+except ImportError:
+    import registrationPipeline
+    from registrationCache import RegistrationCache
+
+# motions of worker process, set by initializeWorker
+worker_motions = None
+
+# write motions to work directory
+# return:
+# offsets:      np.ndarray, shape is (motions+1,), frames of motion i are offsets[i]:offsets[i+1]
+# parameter:
+# directory:    str, work directory
+# motions:      list[MotionData], all motions have the same joints in the same order
+def writeMotions(directory, motions):
+    offsets = np.zeros(len(motions) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([motion.frames for motion in motions])
+
+    for name in ('positions', 'M'):
+        first = getattr(motions[0], name)
+        data = np.lib.format.open_memmap(
+            os.path.join(directory, name + ".npy"), mode='w+',
+            dtype=np.float64, shape=(int(offsets[-1]),) + first.shape[1:])
+        for i, motion in enumerate(motions):
+            data[offsets[i]:offsets[i + 1]] = getattr(motion, name)
+        data.flush()
+        del data
+
+    return offsets
+
+# map motions written by writeMotions, views are read only and shared by page cache
+# return:
+# motions:      list[MotionData]
+def readMotions(directory, offsets, names, leaves=None):
+    positions = np.load(os.path.join(directory, "positions.npy"), mmap_mode='r')
+    M = np.load(os.path.join(directory, "M.npy"), mmap_mode='r')
+
+    return [
+        registrationPipeline.MotionData(positions[begin:end], M[begin:end], names, leaves)
+        for begin, end in zip(offsets[:-1], offsets[1:])]
+
+def initializeWorker(directory, offsets, names, leaves):
+    global worker_motions
+    worker_motions = readMotions(directory, offsets, names, leaves)
+
+# return:
+# index:    int, index of task
+# results:  dict[str:np.ndarray], Registration.getResults
+def registerPair(index, i, j, parameters, keep_maps):
+    registration = registrationPipeline.Registration(worker_motions[i], worker_motions[j], **parameters)
+    return index, registration.getResults(keep_maps)
+
+# compute registration of every pair in worker processes, results are yielded as they finish
+# return:
+# generator of (index, results), index is index of pairs, not in order
+# parameter:
+# pairs:        list[(MotionData, MotionData)], motion can be used by many pairs
+# workers:      int, amount of worker processes, None is cpu count
+# keep_maps:    bool, also return transform_map and distance_map(F0 x F1 of each pair)
+# progress:     function(done, total), called after each finished pair
+# directory:    str, work directory of motion arrays, None is temp directory removed at end
+# use_cache:    bool, pairs in RegistrationCache are yielded first, computed pairs are saved
+# parameters:   keyword parameters of registrationPipeline.Registration
+def registerPairs(pairs, workers=None, keep_maps=False, progress=None, directory=None, use_cache=False,
+    **parameters):
+    if not pairs:
+        return
+
+    # motion used by many pairs is written once
+    motions = []
+    motion_index = {}
+    tasks = []
+    for motion_0, motion_1 in pairs:
+        indices = []
+        for motion in (motion_0, motion_1):
+            if id(motion) not in motion_index:
+                motion_index[id(motion)] = len(motions)
+                motions.append(motion)
+            indices.append(motion_index[id(motion)])
+        tasks.append(indices)
+
+    # joints are matched by name, every motion is written in joint order of first motion
+    names = motions[0].names
+    motions = [registrationPipeline.matchSkeleton(motion, names) for motion in motions]
+
+    done = 0
+    keys = [None] * len(tasks)
+    need_maps = keep_maps and parameters.get('timewarp_method', 'FULL') == 'FULL'
+    if use_cache:
+        missing = []
+        for index, (i, j) in enumerate(tasks):
+            keys[index] = RegistrationCache.GetKey(motions[i], motions[j], parameters)
+            results = RegistrationCache.Load(keys[index], need_maps)
+            if results is None:
+                missing.append(index)
+                continue
+
+            done += 1
+            if progress is not None:
+                progress(done, len(tasks))
+            yield index, results
+    else:
+        missing = list(range(len(tasks)))
+
+    if not missing:
+        return
+
+    remove_directory = directory is None
+    if remove_directory:
+        directory = tempfile.mkdtemp(prefix="registration_")
+
+    try:
+        offsets = writeMotions(directory, motions)
+
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=initializeWorker,
+            initargs=(directory, offsets, names, motions[0].leaves)) as executor:
+
+            futures = [
+                executor.submit(registerPair, index, *tasks[index], parameters, keep_maps)
+                for index in missing]
+
+            for future in as_completed(futures):
+                index, results = future.result()
+                if use_cache:
+                    RegistrationCache.Save(keys[index], results)
+
+                done += 1
+                if progress is not None:
+                    progress(done, len(tasks))
+                yield index, results
+    finally:
+        if remove_directory:
+            shutil.rmtree(directory, ignore_errors=True)
+
+def printProgress(done, total):
+    print("\r%d / %d" % (done, total), end="" if done < total else "\n", flush=True)
+
+def main(argv):
+    directory = argv[0]
+    workers = int(argv[1]) if len(argv) > 1 else None
+
+    file_names = sorted(name for name in os.listdir(directory) if name.lower().endswith(".bvh"))
+    motions = [
+        registrationPipeline.motionFromFile(os.path.join(directory, name), ('X', 'Z', 'Y'))
+        for name in file_names]
+
+    # only motions of the most common skeleton can be registered together
+    skeletons = {}
+    for name, motion in zip(file_names, motions):
+        skeletons.setdefault(tuple(motion.names), []).append((name, motion))
+    group = max(skeletons.values(), key=len)
+
+    pairs = list(itertools.combinations(range(len(group)), 2))
+    print("%d motions, %d pairs" % (len(group), len(pairs)))
+
+    start = time.perf_counter()
+    for index, results in registerPairs(
+        [(group[i][1], group[j][1]) for i, j in pairs], workers, progress=printProgress,
+        use_cache=True, timewarp_method='BAND'):
+        pass
+    print("%.3fs" % (time.perf_counter() - start))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,219 @@
+"""
+on-disk cache(.npz) of registration results(S, path_transforms, A, transform_map, distance_map)
+
+file name is content hash of both motions and parameters of time warp, so the same 2 motions
+are only registered once, even after reopening project. least recently used files are
+removed when cache directory is larger than max_size
+"""
+
+import os
+import json
+import zipfile
+import hashlib
+import tempfile
+
+import numpy as np
+
+try:
+    from . import registrationCore
+    from . import registrationPipeline
+except ImportError:
+    import registrationCore
+    import registrationPipeline
+
+VERSION = 1
+EXTENSION = '.npz'
+
+class RegistrationCache:
+    enabled = True
+
+    # None is registration_cache in temp directory
+    directory = None
+    # bytes of all cache files
+    max_size = 512 * 1024 * 1024
+
+    hits = 0
+    misses = 0
+
+    @classmethod
+    def GetDirectory(cls):
+        if cls.directory is not None:
+            return cls.directory
+        return os.path.join(tempfile.gettempdir(), "registration_cache")
+
+    # hash of joint positions and rotations, they are computed from channel data and skeleton
+    @staticmethod
+    def updateMotionHash(digest, motion):
+        digest.update(json.dumps(motion.names).encode('utf-8'))
+        for data in (motion.positions, motion.M):
+            data = np.ascontiguousarray(data, dtype=np.float64)
+            digest.update(str(data.shape).encode('utf-8'))
+            digest.update(data.tobytes())
+
+    # return:
+    # key:  str, hex digest of both motions and parameters which change result
+    # parameter:
+    # motion_0, motion_1:   MotionData
+    # parameters:           keyword parameters of registrationPipeline.Registration
+    @classmethod
+    def GetKey(cls, motion_0, motion_1, parameters):
+        # same key for motion 1 whose joints are listed in other order
+        motion_1 = registrationPipeline.matchSkeleton(motion_1, motion_0.names)
+
+        digest = hashlib.sha1()
+        cls.updateMotionHash(digest, motion_0)
+        cls.updateMotionHash(digest, motion_1)
+
+        # use_numba does not change result
+        digest.update(json.dumps({
+            'version': VERSION,
+            'timewarp_method': parameters.get('timewarp_method', 'FULL'),
+            'timewarp_radius': parameters.get('timewarp_radius', 8),
+            'timewarp_max_run': parameters.get('timewarp_max_run', 0),
+            'frame': parameters.get('frame', registrationCore.ALIGNMENT_WINDOW),
+        }, sort_keys=True).encode('utf-8'))
+
+        return digest.hexdigest()
+
+    @classmethod
+    def GetCachePath(cls, key):
+        return os.path.join(cls.GetDirectory(), key + EXTENSION)
+
+    # return:
+    # results:  dict[str:np.ndarray], None if cache is missing
+    # parameter:
+    # key:      str, from GetKey
+    # need_maps:bool, cache without transform_map and distance_map is a miss
+    @classmethod
+    def Load(cls, key, need_maps=False):
+        if not cls.enabled:
+            return None
+
+        cache_path = cls.GetCachePath(key)
+        try:
+            with np.load(cache_path) as data:
+                results = {name: data[name] if name in data.files else None
+                    for name in registrationPipeline.Registration.RESULT_NAMES}
+            # modified time is last used time of LRU
+            os.utime(cache_path)
+        except FileNotFoundError:
+            cls.misses += 1
+            return None
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            # half written or corrupt file is registered again
+            try:
+                os.remove(cache_path)
+            except OSError:
+                pass
+            cls.misses += 1
+            return None
+
+        if need_maps and results['distance_map'] is None:
+            cls.misses += 1
+            return None
+
+        cls.hits += 1
+        return results
+
+    # write cache file, failure(e.g. read only directory) is ignored
+    # return:
+    # bool, cache file is written
+    # parameter:
+    # key:      str, from GetKey
+    # results:  dict[str:np.ndarray], from Registration.getResults, None is not saved
+    @classmethod
+    def Save(cls, key, results):
+        if not cls.enabled:
+            return False
+
+        cache_path = cls.GetCachePath(key)
+        try:
+            os.makedirs(cls.GetDirectory(), exist_ok=True)
+
+            # write to unique temp file and rename, other reader never see half file,
+            # other writer(batch worker, second blender) of same key never write same temp file
+            handle, temp_path = tempfile.mkstemp(dir=cls.GetDirectory(), suffix=EXTENSION)
+        except OSError:
+            return False
+
+        try:
+            with os.fdopen(handle, 'wb') as cache_file:
+                np.savez_compressed(cache_file, **{
+                    name: value for name, value in results.items() if value is not None})
+            os.replace(temp_path, cache_path)
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return False
+
+        cls.Evict()
+        return True
+
+    # remove least recently used files until size of cache directory is not larger than max_size
+    # return:
+    # int, amount of deleted files
+    @classmethod
+    def Evict(cls, max_size=None):
+        if max_size is None:
+            max_size = cls.max_size
+
+        directory = cls.GetDirectory()
+        entries = []
+        try:
+            for name in os.listdir(directory):
+                if name.endswith(EXTENSION):
+                    stat = os.stat(os.path.join(directory, name))
+                    entries.append((stat.st_mtime_ns, stat.st_size, name))
+        except OSError:
+            return 0
+
+        size = sum(entry[1] for entry in entries)
+        removed = 0
+        for mtime, file_size, name in sorted(entries):
+            if size <= max_size:
+                break
+            try:
+                os.remove(os.path.join(directory, name))
+                size -= file_size
+                removed += 1
+            except OSError:
+                pass
+
+        return removed
+
+    # delete every cache file
+    # return:
+    # int, amount of deleted files
+    @classmethod
+    def Clear(cls):
+        return cls.Evict(max_size=-1)
+
+    # registration of 2 motions, read from cache if both motions and parameters are the same
+    # return:
+    # registration: registrationPipeline.Registration
+    # parameter:
+    # motion_0, motion_1:   MotionData
+    # parameters:           keyword parameters of registrationPipeline.Registration
+    @classmethod
+    def GetRegistration(cls, motion_0, motion_1, **parameters):
+        key = cls.GetKey(motion_0, motion_1, parameters)
+        need_maps = parameters.get('timewarp_method', 'FULL') == 'FULL'
+
+        results = cls.Load(key, need_maps)
+        if results is not None:
+            return registrationPipeline.Registration.FromResults(motion_0, motion_1, results, **parameters)
+
+        registration = registrationPipeline.Registration(motion_0, motion_1, **parameters)
+        cls.Save(key, registration.getResults())
+        return registration
+
+    @classmethod
+    def GetStats(cls):
+        return {'hits': cls.hits, 'misses': cls.misses}
+
+    @classmethod
+    def ResetStats(cls):
+        cls.hits = 0
+        cls.misses = 0
@@ -0,0 +1,672 @@
+"""
+registration curve computed with numpy
+refer: Kovar and Gleicher, Flexible Automatic Motion Blending with Registration Curves
+
+positions of a motion are np.ndarray, shape is (frames, points, 3),
+a 2D rigid transform is (theta, y, x), rotation around z axis then translation in xy plane
+"""
+
+import numpy as np
+
+# optional, run limited time warp kernel is compiled if numba is installed
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# default amount of frames of a window to align two motions
+ALIGNMENT_WINDOW = 5
+
+# prefix sum along frame axis, prefix[f] is sum of frame 0 ~ f-1
+def framePrefixSum(values):
+    prefix = np.zeros((values.shape[0] + 1,) + values.shape[1:])
+    np.cumsum(values, axis=0, out=prefix[1:])
+    return prefix
+
+# prefix sum along diagonal, prefix[i, j] is sum of values[i-k, j-k] for k = 1 ~ min(i, j)
+def diagonalPrefixSum(values):
+    prefix = np.zeros((values.shape[0] + 1, values.shape[1] + 1))
+    prefix[1:, 1:] = values
+    for i in range(1, prefix.shape[0]):
+        prefix[i, 1:] += prefix[i - 1, :-1]
+    return prefix
+
+# return:
+# L:    np.ndarray, shape is (F0, F1), amount of frames of window start at (F0, F1),
+#       window is cut by end of both motions
+def windowLength(frames_0, frames_1, frame=ALIGNMENT_WINDOW):
+    remain_0 = np.minimum(frames_0 - np.arange(frames_0), frame)
+    remain_1 = np.minimum(frames_1 - np.arange(frames_1), frame)
+    return np.minimum(remain_0[:, None], remain_1[None, :])
+
+# closed form 2D rigid transform align window of p_1 to window of p_0
+# return:
+# transform:    np.ndarray, shape is (3,), (theta, y, x)
+# parameter:
+# p_0, p_1:     np.ndarray, shape is (frames, points, 3)
+# F0, F1:       int, first frame of window
+# frame:        int, amount of frames of window
+def alignmentTransformation(p_0, p_1, F0, F1, frame=ALIGNMENT_WINDOW):
+    L = min(frame, len(p_0) - F0, len(p_1) - F1)
+
+    x0 = p_0[F0:F0 + L, :, 0].ravel()
+    y0 = p_0[F0:F0 + L, :, 1].ravel()
+    x1 = p_1[F1:F1 + L, :, 0].ravel()
+    y1 = p_1[F1:F1 + L, :, 1].ravel()
+
+    x0_bar, y0_bar, x1_bar, y1_bar = x0.mean(), y0.mean(), x1.mean(), y1.mean()
+
+    theta = np.arctan(
+        (np.mean(y0 * x1 - y1 * x0) - (y0_bar * x1_bar - y1_bar * x0_bar)) /
+        (np.mean(y0 * y1 + x0 * x1) - (y0_bar * y1_bar + x0_bar * x1_bar)))
+
+    y_0 = y0_bar - y1_bar * np.cos(theta) - x1_bar * np.sin(theta)
+    x_0 = x0_bar + y1_bar * np.sin(theta) - x1_bar * np.cos(theta)
+
+    return np.array((theta, y_0, x_0))
+
+# sum over points of products of frame F0 of motion 0 and frame F1 of motion 1,
+# shared by transformMap and distanceMap
+# return:
+# dot:      np.ndarray, shape is (F0, F1), sum of x0 * x1 + y0 * y1
+# cross:    np.ndarray, shape is (F0, F1), sum of y0 * x1 - x0 * y1
+# z:        np.ndarray, shape is (F0, F1), sum of z0 * z1
+# parameter:
+# p_0, p_1: np.ndarray, shape is (frames, points, 3)
+def crossMoments(p_0, p_1):
+    p_0 = np.asarray(p_0, dtype=np.float64)
+    p_1 = np.asarray(p_1, dtype=np.float64)
+
+    x0, y0, z0 = p_0[..., 0], p_0[..., 1], p_0[..., 2]
+    x1, y1, z1 = p_1[..., 0], p_1[..., 1], p_1[..., 2]
+
+    return (
+        x0 @ x1.T + y0 @ y1.T,
+        y0 @ x1.T - x0 @ y1.T,
+        z0 @ z1.T)
+
+# alignmentTransformation of every (F0, F1), windowed sums come from prefix sums
+# return:
+# transform_map:    np.ndarray, shape is (F0, F1, 3), (theta, y, x) of every cell
+# parameter:
+# p_0, p_1:         np.ndarray, shape is (frames, points, 3)
+# frame:            int, amount of frames of window
+# moments:          tuple, result of crossMoments, None will compute
+def transformMap(p_0, p_1, frame=ALIGNMENT_WINDOW, moments=None):
+    p_0 = np.asarray(p_0, dtype=np.float64)
+    p_1 = np.asarray(p_1, dtype=np.float64)
+    frames_0, frames_1 = len(p_0), len(p_1)
+    if moments is None:
+        moments = crossMoments(p_0, p_1)
+
+    x0, y0 = p_0[..., 0], p_0[..., 1]
+    x1, y1 = p_1[..., 0], p_1[..., 1]
+
+    L = windowLength(frames_0, frames_1, frame)
+    n = L * p_0.shape[1]
+    F0 = np.arange(frames_0)[:, None]
+    F1 = np.arange(frames_1)[None, :]
+
+    # sum of every motion
+    def windowSum(prefix, start):
+        return prefix[start + L] - prefix[start]
+
+    prefix_0 = framePrefixSum(np.stack((x0.sum(axis=1), y0.sum(axis=1)), axis=1))
+    prefix_1 = framePrefixSum(np.stack((x1.sum(axis=1), y1.sum(axis=1)), axis=1))
+    x0_bar = windowSum(prefix_0[:, 0], F0) / n
+    y0_bar = windowSum(prefix_0[:, 1], F0) / n
+    x1_bar = windowSum(prefix_1[:, 0], F1) / n
+    y1_bar = windowSum(prefix_1[:, 1], F1) / n
+
+    # sum of products of paired frames(F0+k, F1+k), along diagonal
+    def diagonalSum(values):
+        prefix = diagonalPrefixSum(values)
+        return prefix[F0 + L, F1 + L] - prefix[F0, F1]
+
+    dot = diagonalSum(moments[0]) / n
+    cross = diagonalSum(moments[1]) / n
+
+    transform_map = np.empty((frames_0, frames_1, 3))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        theta = np.arctan(
+            (cross - (y0_bar * x1_bar - y1_bar * x0_bar)) /
+            (dot - (y0_bar * y1_bar + x0_bar * x1_bar)))
+    cos, sin = np.cos(theta), np.sin(theta)
+
+    transform_map[..., 0] = theta
+    transform_map[..., 1] = y0_bar - y1_bar * cos - x1_bar * sin
+    transform_map[..., 2] = x0_bar + y1_bar * sin - x1_bar * cos
+
+    return transform_map
+
+# weighted squared distance of points of frame F0 and transformed points of frame F1,
+# |p0 - (R p1 + t)|^2 is expanded into per frame sums and crossMoments
+# return:
+# distance_map: np.ndarray, shape is (F0, F1), float32, C contiguous
+# parameter:
+# p_0, p_1:         np.ndarray, shape is (frames, points, 3)
+# transform_map:    np.ndarray, shape is (F0, F1, 3), from transformMap
+# moments:          tuple, result of crossMoments, None will compute
+def distanceMap(p_0, p_1, transform_map, moments=None):
+    p_0 = np.asarray(p_0, dtype=np.float64)
+    p_1 = np.asarray(p_1, dtype=np.float64)
+    if moments is None:
+        moments = crossMoments(p_0, p_1)
+
+    sums_0 = frameSums(p_0)
+    sums_1 = frameSums(p_1)
+
+    distance_map = rigidDistance(
+        tuple(s[:, None] for s in sums_0), tuple(s[None, :] for s in sums_1),
+        moments, transform_map, p_0.shape[1])
+
+    return np.ascontiguousarray(distance_map, dtype=np.float32)
+
+# return:
+# square:       np.ndarray, shape is (frames,), sum of |p|^2 of every frame
+# x_sum, y_sum: np.ndarray, shape is (frames,)
+def frameSums(p):
+    return np.einsum('fpd,fpd->f', p, p), p[..., 0].sum(axis=1), p[..., 1].sum(axis=1)
+
+# mean of |p0 - (R p1 + t)|^2 over points, arguments are broadcasted
+# parameter:
+# sums_0, sums_1:   tuple, frameSums of frames of motion 0 and motion 1
+# moments:          tuple, crossMoments of pair of frames
+# transforms:       np.ndarray, shape is (..., 3), (theta, y, x)
+# points:           int, amount of points of a frame
+def rigidDistance(sums_0, sums_1, moments, transforms, points):
+    square_0, x0_sum, y0_sum = sums_0
+    square_1, x1_sum, y1_sum = sums_1
+    dot, cross, z = moments
+
+    # w_i = 1 / n
+    w_i = 1.0 / points
+
+    theta = transforms[..., 0]
+    ty = transforms[..., 1]
+    tx = transforms[..., 2]
+    cos, sin = np.cos(theta), np.sin(theta)
+
+    # sum of p0 . R p1
+    p0_rp1 = cos * dot + sin * cross + z
+    # sum of p0 . t and R p1 . t
+    p0_t = tx * x0_sum + ty * y0_sum
+    rp1_t = tx * (cos * x1_sum - sin * y1_sum) + ty * (sin * x1_sum + cos * y1_sum)
+    n_t = points * (tx * tx + ty * ty)
+
+    distance = w_i * (square_0 + square_1 + n_t - 2.0 * p0_rp1 - 2.0 * p0_t + 2.0 * rp1_t)
+
+    return np.maximum(distance, 0.0)
+
+# crossMoments of cells of band, a row of band is one matrix product
+# return:
+# dot, cross, z:    np.ndarray, shape is (cells,), same order as bandCells
+# parameter:
+# p_0, p_1:         np.ndarray, shape is (frames, points, 3)
+# lo, hi:           np.ndarray, band
+def bandMoments(p_0, p_1, lo, hi):
+    x0, y0, z0 = p_0[..., 0], p_0[..., 1], p_0[..., 2]
+    zeros = np.zeros_like(x0)
+
+    # (F0, 3, 3 * points) @ (3 * points, F1) is dot, cross and z of a row
+    left = np.stack((
+        np.concatenate((x0, y0, zeros), axis=1),
+        np.concatenate((y0, -x0, zeros), axis=1),
+        np.concatenate((zeros, zeros, z0), axis=1)), axis=1)
+    right = np.concatenate((p_1[..., 0], p_1[..., 1], p_1[..., 2]), axis=1)
+
+    rows, cols, offsets = bandCells(lo, hi)
+    moments = np.empty((3, offsets[-1]))
+    for i in range(len(lo)):
+        moments[:, offsets[i]:offsets[i + 1]] = left[i] @ right[lo[i]:hi[i]].T
+
+    return moments[0], moments[1], moments[2]
+
+# transformMap of cells of band, windowed sums come from prefix sums along diagonals of
+# a band which also contain every window(i+k, j+k) of cells of band
+# return:
+# transforms:   np.ndarray, shape is (cells, 3), (theta, y, x), same order as bandCells
+# moments:      tuple, bandMoments of cells of band, reused by distanceMapBand
+# parameter:
+# p_0, p_1:     np.ndarray, shape is (frames, points, 3)
+# lo, hi:       np.ndarray, band
+# frame:        int, amount of frames of window
+def transformMapBand(p_0, p_1, lo, hi, frame=ALIGNMENT_WINDOW):
+    p_0 = np.asarray(p_0, dtype=np.float64)
+    p_1 = np.asarray(p_1, dtype=np.float64)
+    frames_0, frames_1 = len(p_0), len(p_1)
+    rows, cols, offsets = bandCells(lo, hi)
+
+    # band of windows, row i contain column j+k of cell (i-k, j)
+    window_lo, window_hi = lo.copy(), hi.copy()
+    for k in range(1, min(frame, frames_0)):
+        window_lo[k:] = np.minimum(window_lo[k:], lo[:-k] + k)
+        window_hi[k:] = np.maximum(window_hi[k:], hi[:-k] + k)
+    window_hi = np.minimum(window_hi, frames_1)
+    window_offsets = bandCells(window_lo, window_hi)[2]
+
+    moments = np.stack(bandMoments(p_0, p_1, window_lo, window_hi))
+
+    # prefix sum along diagonal, (i-1, j-1) outside of window band is 0
+    prefix = moments[0:2].copy()
+    for i in range(1, frames_0):
+        start = max(window_lo[i], window_lo[i - 1] + 1)
+        end = min(window_hi[i], window_hi[i - 1] + 1)
+        if start < end:
+            prefix[:, window_offsets[i] + start - window_lo[i]:window_offsets[i] + end - window_lo[i]] += \
+                prefix[:, window_offsets[i - 1] + start - 1 - window_lo[i - 1]:window_offsets[i - 1] + end - 1 - window_lo[i - 1]]
+
+    L = np.minimum(np.minimum(frames_0 - rows, frames_1 - cols), frame)
+    n = L * p_0.shape[1]
+
+    prefix_0 = framePrefixSum(p_0[..., 0:2].sum(axis=1))
+    prefix_1 = framePrefixSum(p_1[..., 0:2].sum(axis=1))
+    x0_bar, y0_bar = ((prefix_0[rows + L] - prefix_0[rows]) / n[:, None]).T
+    x1_bar, y1_bar = ((prefix_1[cols + L] - prefix_1[cols]) / n[:, None]).T
+
+    # sum of products of paired frames(F0+k, F1+k)
+    last = bandIndex(window_lo, window_hi, window_offsets, rows + L - 1, cols + L - 1)
+    before = bandIndex(window_lo, window_hi, window_offsets, rows - 1, cols - 1)
+    window_sum = prefix[:, last] - np.where(before >= 0, prefix[:, before], 0.0)
+    dot, cross = window_sum / n
+
+    transforms = np.empty((len(rows), 3))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        theta = np.arctan(
+            (cross - (y0_bar * x1_bar - y1_bar * x0_bar)) /
+            (dot - (y0_bar * y1_bar + x0_bar * x1_bar)))
+    cos, sin = np.cos(theta), np.sin(theta)
+
+    transforms[:, 0] = theta
+    transforms[:, 1] = y0_bar - y1_bar * cos - x1_bar * sin
+    transforms[:, 2] = x0_bar + y1_bar * sin - x1_bar * cos
+
+    cells = bandIndex(window_lo, window_hi, window_offsets, rows, cols)
+    return transforms, tuple(moments[:, cells])
+
+# distanceMap of cells of band
+# return:
+# distances:    np.ndarray, shape is (cells,), float32, same order as bandCells
+# parameter:
+# p_0, p_1:     np.ndarray, shape is (frames, points, 3)
+# lo, hi:       np.ndarray, band
+# transforms:   np.ndarray, shape is (cells, 3), from transformMapBand
+# moments:      tuple, from transformMapBand, None will compute
+def distanceMapBand(p_0, p_1, lo, hi, transforms, moments=None):
+    p_0 = np.asarray(p_0, dtype=np.float64)
+    p_1 = np.asarray(p_1, dtype=np.float64)
+    rows, cols, offsets = bandCells(lo, hi)
+    if moments is None:
+        moments = bandMoments(p_0, p_1, lo, hi)
+
+    sums_0 = frameSums(p_0)
+    sums_1 = frameSums(p_1)
+
+    distances = rigidDistance(
+        tuple(s[rows] for s in sums_0), tuple(s[cols] for s in sums_1),
+        moments, transforms, p_0.shape[1])
+
+    return distances.astype(np.float32)
+
+# band of time warp, row F0 of motion 0 is matched with frame lo[F0] ~ hi[F0]-1 of motion 1
+# return:
+# lo, hi:   np.ndarray, shape is (F0,)
+def fullBand(frames_0, frames_1):
+    return np.zeros(frames_0, dtype=np.intp), np.full(frames_0, frames_1, dtype=np.intp)
+
+# Sakoe-Chiba band, cells whose distance to diagonal(from (0, 0) to end of both motion) <= radius
+def sakoeChibaBand(frames_0, frames_1, radius):
+    center = np.arange(frames_0) * ((frames_1 - 1) / max(frames_0 - 1, 1))
+    lo = np.clip(np.floor(center - radius).astype(np.intp), 0, frames_1 - 1)
+    hi = np.clip(np.ceil(center + radius).astype(np.intp) + 1, 1, frames_1)
+    return lo, hi
+
+# project path of half resolution to full resolution and expand it by radius(FastDTW)
+# return:
+# lo, hi:   np.ndarray, shape is (F0,), monotone band from (0, 0) to end of both motion
+# parameter:
+# path:     np.ndarray, shape is (U, 2), path in half resolution
+# frames_0, frames_1:   int, full resolution
+# radius:   int
+def bandFromPath(path, frames_0, frames_1, radius):
+    path = np.asarray(path, dtype=np.intp)
+
+    # backtracking stop at first row or column, path is extended along it to (0, 0)
+    i, j = path[0]
+    start = np.array([(k, 0) for k in range(i)] + [(0, k) for k in range(j)], dtype=np.intp).reshape(-1, 2)
+    path = np.concatenate((start, path))
+
+    lo = np.full(frames_0, frames_1, dtype=np.intp)
+    hi = np.zeros(frames_0, dtype=np.intp)
+
+    # cell (i, j) cover cell (2i ~ 2i+1, 2j ~ 2j+1)
+    for di in range(2):
+        rows = np.minimum(path[:, 0] * 2 + di, frames_0 - 1)
+        np.minimum.at(lo, rows, path[:, 1] * 2)
+        np.maximum.at(hi, rows, path[:, 1] * 2 + 2)
+
+    # expand by radius in both direction
+    band_lo, band_hi = lo.copy(), hi.copy()
+    for offset in range(1, radius + 1):
+        band_lo[offset:] = np.minimum(band_lo[offset:], lo[:-offset])
+        band_lo[:-offset] = np.minimum(band_lo[:-offset], lo[offset:])
+        band_hi[offset:] = np.maximum(band_hi[offset:], hi[:-offset])
+        band_hi[:-offset] = np.maximum(band_hi[:-offset], hi[offset:])
+
+    lo = np.clip(band_lo - radius, 0, frames_1 - 1)
+    hi = np.clip(band_hi + radius, 1, frames_1)
+
+    # rows not covered by path(e.g. odd last row) are filled by monotone band,
+    # band start at (0, 0) and end at (F0-1, F1-1)
+    lo[0] = 0
+    hi[-1] = frames_1
+    lo = np.minimum.accumulate(lo[::-1])[::-1]
+    hi = np.maximum.accumulate(hi)
+
+    if not (hi > lo).all():
+        raise Exception("Band of time warp has empty row")
+
+    return lo, hi
+
+# return:
+# rows, cols:   np.ndarray, shape is (cells,), all cells of band in row order
+# offsets:      np.ndarray, shape is (F0+1,), cells of row i are offsets[i] ~ offsets[i+1]-1
+def bandCells(lo, hi):
+    widths = hi - lo
+    offsets = np.zeros(len(lo) + 1, dtype=np.intp)
+    np.cumsum(widths, out=offsets[1:])
+
+    rows = np.repeat(np.arange(len(lo)), widths)
+    cols = np.arange(offsets[-1]) - np.repeat(offsets[:-1] - lo, widths)
+
+    return rows, cols, offsets
+
+# accumulated cost of dynamic time warping in band, one row at a time
+# dp[i, j] = cost[i, j] + min(dp[i-1, j-1], dp[i-1, j], dp[i, j-1]),
+# dp[i, j-1] term of a row is solved by prefix minimum
+# return:
+# dp:       np.ndarray, shape is (cells,), same order as bandCells
+# parameter:
+# costs:    np.ndarray, shape is (cells,)
+# lo, hi:   np.ndarray, band
+def accumulateCost(costs, lo, hi):
+    rows, cols, offsets = bandCells(lo, hi)
+    dp = np.empty(len(costs))
+
+    prev = None
+    for i in range(len(lo)):
+        cost = costs[offsets[i]:offsets[i + 1]].astype(np.float64)
+
+        # min(dp[i-1, j-1], dp[i-1, j]), overlap of previous row is a slice
+        a = np.full(len(cost), np.inf)
+        if prev is None:
+            a[0] = 0.0
+        else:
+            prev_lo, prev_hi, prev_dp = prev
+            for shift in (0, 1):
+                start = max(lo[i], prev_lo + shift)
+                end = min(hi[i], prev_hi + shift)
+                if start < end:
+                    overlap = a[start - lo[i]:end - lo[i]]
+                    np.minimum(overlap, prev_dp[start - shift - prev_lo:end - shift - prev_lo], out=overlap)
+
+        # dp[j] = C[j] + min(a[k] - C[k-1]), k <= j
+        cumulative = np.cumsum(cost)
+        row_dp = cumulative + np.minimum.accumulate(a - (cumulative - cost))
+
+        dp[offsets[i]:offsets[i + 1]] = row_dp
+        prev = (lo[i], hi[i], row_dp)
+
+    return dp
+
+# track path from end of both motion, same rule as original list version
+# return:
+# path:     np.ndarray, shape is (U, 2), S[u] = (S0, S1)
+# parameter:
+# dp:       np.ndarray, from accumulateCost
+# lo, hi:   np.ndarray, band
+def backtrackPath(dp, lo, hi):
+    rows, cols, offsets = bandCells(lo, hi)
+
+    def D(i, j):
+        if lo[i] <= j < hi[i]:
+            return dp[offsets[i] + j - lo[i]]
+        return np.inf
+
+    i = len(lo) - 1
+    j = hi[-1] - 1
+    path = [(i, j)]
+    while i > 0 and j > 0:
+        min_cost = min(D(i - 1, j - 1), D(i - 1, j), D(i, j - 1))
+        if min_cost == D(i, j - 1):
+            j -= 1
+        elif min_cost == D(i - 1, j):
+            i -= 1
+        else:
+            i -= 1
+            j -= 1
+        path.append((i, j))
+    path.reverse()
+
+    return np.array(path, dtype=np.intp)
+
+# return:
+# index:    np.ndarray, flat index of cells (i, j) in band, -1 if cell is not in band
+# parameter:
+# lo, hi, offsets:  band and offsets of bandCells
+# i, j:     np.ndarray, row and column of cells
+def bandIndex(lo, hi, offsets, i, j):
+    i_clip = np.clip(i, 0, len(lo) - 1)
+    is_valid = (i >= 0) & (i < len(lo)) & (j >= lo[i_clip]) & (j < hi[i_clip])
+    return np.where(is_valid, offsets[i_clip] + j - lo[i_clip], -1)
+
+# flat index of neighbor cells in band, -1 if neighbor is not in band
+# return:
+# up, left, diag:   np.ndarray, shape is (cells,), index of (i-1, j), (i, j-1), (i-1, j-1)
+def bandNeighbors(lo, hi):
+    rows, cols, offsets = bandCells(lo, hi)
+
+    return (
+        bandIndex(lo, hi, offsets, rows - 1, cols),
+        bandIndex(lo, hi, offsets, rows, cols - 1),
+        bandIndex(lo, hi, offsets, rows - 1, cols - 1))
+
+# accumulated cost of time warp which has at most max_run consecutive non-diagonal steps,
+# horizontal or vertical runs freeze a motion(Kovar and Gleicher, slope limit)
+# dp[0] end with diagonal step, dp[r] end with r non-diagonal steps after last diagonal step
+# cells of same anti-diagonal(i + j) are independent, so they are computed at once
+# return:
+# dp:           np.ndarray, shape is (max_run+1, cells+1), last column is inf(neighbor -1)
+# parameter:
+# costs:        np.ndarray, shape is (cells,), same order as bandCells
+# lo, hi:       np.ndarray, band
+# max_run:      int, > 0
+# neighbors:    tuple, bandNeighbors(lo, hi)
+# use_numba:    bool, use compiled kernel if numba is installed
+def accumulateRunLimitedCost(costs, lo, hi, max_run, neighbors, use_numba=True):
+    up, left, diag = neighbors
+    costs = np.asarray(costs, dtype=np.float64)
+
+    dp = np.full((max_run + 1, len(costs) + 1), np.inf)
+    # start at (0, 0)
+    dp[0, 0] = costs[0]
+
+    if use_numba and numba is not None:
+        accumulateRunLimitedCostCompiled(costs, up, left, diag, dp)
+        return dp
+
+    rows, cols, offsets = bandCells(lo, hi)
+    waves = rows + cols
+    order = np.argsort(waves, kind='stable')
+    bounds = np.searchsorted(waves[order], np.arange(waves.max() + 2))
+
+    for wave in range(1, len(bounds) - 1):
+        cells = order[bounds[wave]:bounds[wave + 1]]
+        cost = costs[cells]
+
+        dp[0, cells] = cost + dp[:, diag[cells]].min(axis=0)
+        for r in range(1, max_run + 1):
+            dp[r, cells] = cost + np.minimum(dp[r - 1, up[cells]], dp[r - 1, left[cells]])
+
+    return dp
+
+if numba is not None:
+    # same as accumulateRunLimitedCost, cells in row order already have computed neighbors
+    @numba.njit(cache=True)
+    def accumulateRunLimitedCostCompiled(costs, up, left, diag, dp):
+        max_run = dp.shape[0] - 1
+        for c in range(1, len(costs)):
+            best = np.inf
+            for r in range(max_run + 1):
+                best = min(best, dp[r, diag[c]])
+            dp[0, c] = costs[c] + best
+            for r in range(1, max_run + 1):
+                dp[r, c] = costs[c] + min(dp[r - 1, up[c]], dp[r - 1, left[c]])
+
+# track path of accumulateRunLimitedCost from end of both motion
+# return:
+# path:     np.ndarray, shape is (U, 2)
+def backtrackRunLimitedPath(dp, lo, hi, neighbors):
+    up, left, diag = neighbors
+    rows, cols, offsets = bandCells(lo, hi)
+
+    i = len(lo) - 1
+    j = hi[-1] - 1
+    c = offsets[i] + j - lo[i]
+    r = int(np.argmin(dp[:, c]))
+    if not np.isfinite(dp[r, c]):
+        raise Exception("Time warp is impossible with max run length %d" % (dp.shape[0] - 1))
+
+    path = [(i, j)]
+    while i > 0 and j > 0:
+        if r == 0:
+            c = diag[c]
+            r = int(np.argmin(dp[:, c]))
+            i -= 1
+            j -= 1
+        else:
+            if dp[r - 1, left[c]] <= dp[r - 1, up[c]]:
+                c = left[c]
+                j -= 1
+            else:
+                c = up[c]
+                i -= 1
+            r -= 1
+        path.append((i, j))
+    path.reverse()
+
+    return np.array(path, dtype=np.intp)
+
+# time warp of costs in band
+# return:
+# path:         np.ndarray, shape is (U, 2)
+# parameter:
+# costs:        np.ndarray, shape is (cells,), same order as bandCells
+# lo, hi:       np.ndarray, band
+# max_run:      int, max consecutive non-diagonal steps, 0 is unlimited
+# use_numba:    bool
+def timewarpBand(costs, lo, hi, max_run=0, use_numba=True):
+    if not max_run:
+        return backtrackPath(accumulateCost(costs, lo, hi), lo, hi)
+
+    neighbors = bandNeighbors(lo, hi)
+    dp = accumulateRunLimitedCost(costs, lo, hi, max_run, neighbors, use_numba)
+    return backtrackRunLimitedPath(dp, lo, hi, neighbors)
+
+# time warp of full distance map
+# return:
+# path:             np.ndarray, shape is (U, 2)
+# parameter:
+# distance_map:     np.ndarray, shape is (F0, F1)
+# max_run:          int, max consecutive non-diagonal steps, 0 is unlimited
+# use_numba:        bool
+def timewarpPath(distance_map, max_run=0, use_numba=True):
+    lo, hi = fullBand(*distance_map.shape)
+    return timewarpBand(distance_map.ravel(), lo, hi, max_run, use_numba)
+
+# original list version of time warp, kept as reference of timewarpPath
+# refer: https://blog.csdn.net/seagal890/article/details/95028066
+def minimalCostConnectingPath(cost):
+    w = len(cost)
+    h = len(cost[0])
+    dp = [[0 for y in range(h)] for x in range(w)]
+
+    for i in range(1,w):
+        dp[i][0] = dp[i - 1][0] + cost[i][0]
+
+    for j in range(1,h):
+        dp[0][j] = dp[0][j - 1] + cost[0][j]
+
+    for j in range(1,h):
+        for i in range(1,w):
+            min_cost = min(dp[i - 1][j - 1], dp[i - 1][j], dp[i][j - 1])
+            dp[i][j] = min_cost + cost[i][j]
+
+    # track path
+    # S[u] = (S1, S2)
+    S = []
+    i = w - 1
+    j = h - 1
+    S.append((i, j))
+    while i > 0 and j > 0:
+        min_cost = min(dp[i - 1][j - 1], dp[i - 1][j], dp[i][j - 1])
+        if min_cost == dp[i][j - 1]:
+            j -= 1
+        elif min_cost == dp[i - 1][j]:
+            i -= 1
+        else:
+            i -= 1
+            j -= 1
+        S.append((i, j))
+    S.reverse()
+    return S
+
+# time warp in band, transform and distance are only computed in band
+# return:
+# path:         np.ndarray, shape is (U, 2)
+# transforms:   np.ndarray, shape is (U, 3), transform of cells of path
+# parameter:
+# p_0, p_1:     np.ndarray, shape is (frames, points, 3)
+# lo, hi:       np.ndarray, band
+# frame:        int, amount of frames of alignment window
+# max_run:      int, max consecutive non-diagonal steps, 0 is unlimited
+# use_numba:    bool
+def bandedTimewarp(p_0, p_1, lo, hi, frame=ALIGNMENT_WINDOW, max_run=0, use_numba=True):
+    rows, cols, offsets = bandCells(lo, hi)
+
+    transforms, moments = transformMapBand(p_0, p_1, lo, hi, frame)
+    costs = distanceMapBand(p_0, p_1, lo, hi, transforms, moments)
+
+    path = timewarpBand(costs, lo, hi, max_run, use_numba)
+    return path, transforms[offsets[path[:, 0]] + path[:, 1] - lo[path[:, 0]]]
+
+# average every 2 frames, last frame is kept if amount of frames is odd
+def halveResolution(p):
+    half = (p[0:len(p) - 1:2] + p[1::2]) * 0.5
+    if len(p) % 2 == 1:
+        half = np.concatenate((half, p[-1:]))
+    return half
+
+# coarse to fine time warp(FastDTW), path of half resolution is expanded by radius
+# and used as band of next resolution, memory is O((F0 + F1) * radius)
+# return: same as bandedTimewarp
+# parameter:
+# p_0, p_1:     np.ndarray, shape is (frames, points, 3)
+# radius:       int, expanded cells around coarse path
+# frame:        int, amount of frames of alignment window
+# min_size:     int, full band is used if a motion has fewer frames
+# max_run:      int, max consecutive non-diagonal steps, 0 is unlimited
+# use_numba:    bool
+def multiscaleTimewarp(p_0, p_1, radius=8, frame=ALIGNMENT_WINDOW, min_size=64, max_run=0, use_numba=True):
+    p_0 = np.asarray(p_0, dtype=np.float64)
+    p_1 = np.asarray(p_1, dtype=np.float64)
+
+    if len(p_0) <= min_size or len(p_1) <= min_size:
+        lo, hi = fullBand(len(p_0), len(p_1))
+    else:
+        # window of half resolution cover the same time, or coarse path differ from full resolution path
+        coarse_path, _ = multiscaleTimewarp(
+            halveResolution(p_0), halveResolution(p_1), radius, max(frame // 2, 1), min_size, max_run, use_numba)
+        lo, hi = bandFromPath(coarse_path, len(p_0), len(p_1), radius)
+
+    return bandedTimewarp(p_0, p_1, lo, hi, frame, max_run, use_numba)
@@ -0,0 +1,612 @@
+"""
+registration curve pipeline without blender:
+extract motion -> transform map -> distance map -> time warp -> alignment curve -> blend
+
+a motion is MotionData of arrays, it is created from NodeBVH dict or raw anim_data by
+forward kinematics, so this module can run in batch worker or plain python
+"""
+
+import math
+
+import numpy as np
+
+# relative import inside blender add-on, absolute import when run from this directory
+try:
+    from . import bvhReader
+    from . import registrationCore
+    from .kinematics import ForwardKinematics
+except ImportError:
+    import bvhReader
+    import registrationCore
+    from kinematics import ForwardKinematics
+
+# motion used by registration curve
+# positions:    np.ndarray, shape is (frames, points, 3), heads of all joints then tails of leaf joints
+# M:            np.ndarray, shape is (frames, joints+1, 3),
+#               M[f, 0] is root position, M[f, j+1] is rotation(radians) of joint j in skeleton order
+# names:        list[str], joint names in skeleton order(root first)
+# leaves:       list[str], names of leaf joints in order of their tails in positions, None is unknown
+class MotionData:
+    __slots__ = ('positions', 'M', 'names', 'leaves')
+
+    def __init__(self, positions, M, names, leaves=None):
+        self.positions = positions
+        self.M = M
+        self.names = names
+        self.leaves = leaves
+
+    @property
+    def frames(self):
+        return len(self.M)
+
+# return:
+# order:    list[int], root first, then other joints by index
+def skeletonOrder(forward_kinematics):
+    roots = [j for j in range(forward_kinematics.joints) if forward_kinematics.parents[j] < 0]
+    return roots[:1] + [j for j in range(forward_kinematics.joints) if j != roots[0]]
+
+# return:
+# motion:               MotionData
+# parameter:
+# forward_kinematics:   ForwardKinematics
+# anim_data:            np.ndarray, shape is (frames+1, joints, 6)
+# root_matrices:        np.ndarray, shape is (frames, 4, 4), e.g. init_to_new_matrixs of path, None is identity
+# new_anim_data:        np.ndarray, shape is (frames+1, joints, 6), None will compute root row from pose
+# pose:                 PoseFK, pose of anim_data and root_matrices, None will compute
+# order:                list[int], skeleton order, None is skeletonOrder
+def motionFromArrays(forward_kinematics, anim_data, root_matrices=None, new_anim_data=None, pose=None, order=None):
+    if pose is None:
+        pose = forward_kinematics.compute(anim_data, root_matrices)
+    frames = len(pose.world_heads)
+    if order is None:
+        order = skeletonOrder(forward_kinematics)
+
+    if new_anim_data is None:
+        # same as root's new_anim_data written by NodeBVH.updateNodesWorldPositions
+        new_anim_data = np.array(anim_data, dtype=np.float64)
+        root_data, roots = forward_kinematics.computeRootData(pose)
+        new_anim_data[1:frames + 1, roots] = root_data
+
+    parents = set(forward_kinematics.parents.tolist())
+    leaves = [j for j in order if j not in parents]
+    positions = np.concatenate((pose.world_heads[:, order], pose.world_tails[:, leaves]), axis=1)
+
+    M = np.empty((frames, len(order) + 1, 3))
+    M[:, 0] = pose.world_heads[:, order[0]]
+    M[:, 1:] = np.radians(new_anim_data[1:frames + 1][:, order, 3:6])
+
+    return MotionData(
+        positions, M, [forward_kinematics.names[j] for j in order],
+        [forward_kinematics.names[j] for j in leaves])
+
+# joints of motion in order of names, skeletons of bvh files can list the same joints in other order
+# return:
+# motion:   MotionData, motion itself if it is already in order of names
+# parameter:
+# motion:   MotionData
+# names:    list[str], joint names of other motion
+def matchSkeleton(motion, names):
+    if motion.names == names:
+        return motion
+    if sorted(motion.names) != sorted(names) or names[0] != motion.names[0]:
+        raise Exception("Skeleton of two motions are not same")
+    if motion.leaves is None:
+        raise Exception("Leaf joints of motion are unknown, joints can not be reordered")
+
+    index = [motion.names.index(name) for name in names]
+    leaves = [name for name in names if name in motion.leaves]
+    tails = [len(motion.names) + motion.leaves.index(name) for name in leaves]
+
+    return MotionData(
+        motion.positions[:, index + tails], motion.M[:, [0] + [j + 1 for j in index]], list(names), leaves)
+
+# return:
+# motion:       MotionData
+# parameter:
+# nodes_bvh:    dict[name:NodeBVH], anim_data of every node is (frames+1, 6)
+# root_matrices:np.ndarray, shape is (frames, 4, 4), None is identity
+def motionFromNodes(nodes_bvh, root_matrices=None):
+    nodes_list = sorted(nodes_bvh.values(), key=lambda node: node.index)
+    anim_data = np.stack([node.anim_data for node in nodes_list], axis=1)
+
+    return motionFromArrays(ForwardKinematics(nodes_bvh), anim_data, root_matrices)
+
+# return:
+# motion:       MotionData
+# parameter:
+# file_path:    str, path of bvh
+# axis:         tuple(str, str, str), blender axis to data axis
+def motionFromFile(file_path, axis=('X', 'Y', 'Z')):
+    with open(file_path, 'r') as file:
+        joints, frames, frame_time = bvhReader.readHierarchy(file)
+        channel_index, channel_amount = bvhReader.computeJointsChannelIndex(joints, axis)
+        frames_data = bvhReader.readFrames(file, channel_amount, frames)
+
+    return motionFromArrays(
+        ForwardKinematics.fromJoints(joints, axis), bvhReader.createAnimData(frames_data, channel_index))
+
+# (theta, y, x) to 2D rigid transform, compose, inverse and apply in closed form,
+# same as transformVectorToMatrix of 4x4 matrix
+
+# return: wrapped to (-pi, pi], same as euler of decomposed matrix
+def wrapAngle(theta):
+    return np.arctan2(np.sin(theta), np.cos(theta))
+
+# return: transform a @ b
+def composeTransform(a, b):
+    cos, sin = np.cos(a[..., 0]), np.sin(a[..., 0])
+    return np.stack((
+        a[..., 0] + b[..., 0],
+        sin * b[..., 2] + cos * b[..., 1] + a[..., 1],
+        cos * b[..., 2] - sin * b[..., 1] + a[..., 2]), axis=-1)
+
+def inverseTransform(a):
+    cos, sin = np.cos(a[..., 0]), np.sin(a[..., 0])
+    return np.stack((
+        -a[..., 0],
+        sin * a[..., 2] - cos * a[..., 1],
+        -cos * a[..., 2] - sin * a[..., 1]), axis=-1)
+
+# return: transformed points, z is kept
+def applyTransform(a, points):
+    cos, sin = np.cos(a[..., 0]), np.sin(a[..., 0])
+    return np.stack((
+        cos * points[..., 0] - sin * points[..., 1] + a[..., 2],
+        sin * points[..., 0] + cos * points[..., 1] + a[..., 1],
+        points[..., 2]), axis=-1)
+
+# alignment curve A of motion 1(A of motion 0 is identity),
+# if delta theta > 0.7 radian, theta is inversed(+- pi radian) and root of motion 1 is kept
+# return:
+# A:                np.ndarray, shape is (U, 3)
+# parameter:
+# path_transforms:  np.ndarray, shape is (U, 3), transform of cells of time warp path
+# S:                np.ndarray, shape is (U, 2)
+# roots_1:          np.ndarray, shape is (F1, 3), root position of motion 1
+def alignmentCurve(path_transforms, S, roots_1):
+    A = np.array(path_transforms, dtype=np.float64)
+
+    for u in range(1, len(A)):
+        if math.fabs(A[u][0] - A[u-1][0]) > 0.7:
+            old = A[u].copy()
+            new = old.copy()
+            new[0] = old[0] - math.pi if old[0] > A[u-1][0] else old[0] + math.pi
+
+            root = roots_1[S[u][1]]
+            translate = (
+                applyTransform(np.array((old[0], 0.0, 0.0)), root) -
+                applyTransform(np.array((new[0], 0.0, 0.0)), root))
+            new[1] = old[1] + translate[1]
+            new[2] = old[2] + translate[0]
+            A[u] = new
+
+    return A
+
+# linear interpolation of frames at float index, last frame if index is out of range
+def interpolateFrame(values, f):
+    low = int(f)
+    high = low + 1
+
+    if high < len(values):
+        return values[low] * (1.0 - (f - low)) + values[high] * (f - low)
+    return values[-1]
+
+# blend 2 motions along registration curve, step by step reference of synthesizeBlend
+# return:
+# B:        np.ndarray, shape is (steps, joints+1, 3), same layout as MotionData.M
+# parameter:
+# M_0, M_1: np.ndarray, MotionData.M of both motion
+# S:        np.ndarray, shape is (U, 2), time warp path
+# A:        np.ndarray, shape is (U, 3), alignment curve of motion 1
+# w_0:      np.ndarray, shape is (F0,), weight of motion 0 of every frame of motion 0
+def blendMotion(M_0, M_1, S, A, w_0):
+    S = np.asarray(S, dtype=np.float64)
+    identity = np.zeros(3)
+
+    B = []
+    T = [np.zeros(3)]
+
+    t = 0
+    u = 0.0
+    delta_t = 1
+
+    du = 1.0 / len(S)
+    dS_0 = 1.0 / len(M_0)
+    dS_1 = 1.0 / len(M_1)
+
+    w = (interpolateFrame(w_0, 0.0), 1.0 - interpolateFrame(w_0, 0.0))
+    while u < len(S):
+        S_u = interpolateFrame(S, u)
+        A1_u = interpolateFrame(A, u)
+
+        M0_u = interpolateFrame(M_0, S_u[0])
+        M1_u = interpolateFrame(M_1, S_u[1])
+
+        B_i = w[0] * M0_u + w[1] * M1_u
+        B_i[0] = w[0] * M0_u[0] + w[1] * applyTransform(A1_u, M1_u[0])
+        B_i[0] = applyTransform(T[t], B_i[0])
+        B.append(B_i)
+
+        delta_u = w[0] * (du / dS_0) + w[1] * (du / dS_1)
+        t += delta_t
+        u += delta_u
+
+        delta_T = []
+        for A_j in (None, A):
+            A_0 = identity if A_j is None else interpolateFrame(A_j, u - delta_u)
+            A_1 = identity if A_j is None else interpolateFrame(A_j, u)
+            delta_T_j = composeTransform(composeTransform(T[t - delta_t], A_0), inverseTransform(A_1))
+            delta_T_j[0] = wrapAngle(delta_T_j[0])
+            delta_T.append(delta_T_j)
+
+        # theta is accumulated by wrapped delta, average of 2 wrapped angles jump at +-pi
+        T_t = w[0] * delta_T[0] + w[1] * delta_T[1]
+        T_t[0] = T[t - delta_t][0] + w[1] * wrapAngle(delta_T[1][0] - delta_T[0][0])
+        T.append(T_t)
+
+        S_u = interpolateFrame(S, u)
+        w = (interpolateFrame(w_0, S_u[0]), 1.0 - interpolateFrame(w_0, S_u[0]))
+
+    return np.array(B)
+
+# linear interpolation of samples at every float index of u, last sample if index is out of range,
+# same as interpolateFrame
+# return:
+# values:   np.ndarray, shape is (len(u),) + values.shape[1:]
+def interpolateFrames(values, u):
+    low = np.minimum(u.astype(np.int64), len(values) - 1)
+    high = np.minimum(low + 1, len(values) - 1)
+    t = np.where(low + 1 < len(values), u - low, 0.0).reshape((-1,) + (1,) * (values.ndim - 1))
+
+    return values[low] * (1.0 - t) + values[high] * t
+
+# samples of registration curve at every cell of time warp path,
+# one step of S is 0 or 1 frame, so M0(S(u)) is linear interpolation of M0 samples at u
+# return:
+# samples:  tuple(S, A, M0, M1), np.ndarray of U samples
+def blendSamples(M_0, M_1, S, A):
+    S = np.asarray(S)
+    return (S.astype(np.float64), np.asarray(A, dtype=np.float64),
+        np.ascontiguousarray(M_0[S[:, 0]]), np.ascontiguousarray(M_1[S[:, 1]]))
+
+# u of every step of blended motion, step length depend on weight at S(u)
+# return:
+# u:        np.ndarray, shape is (steps,)
+# w:        np.ndarray, shape is (steps,), weight of motion 0 of every step
+# delta_u:  np.ndarray, shape is (steps,), u of next step is u + delta_u
+# parameter:
+# S:        np.ndarray, shape is (U, 2)
+# frames:   (int, int), amount of frames of both motions
+# w_0:      np.ndarray, shape is (F0,) weight of motion 0, or float for all frames
+def blendSteps(S, frames, w_0):
+    w_0 = np.asarray(w_0, dtype=np.float64)
+    scale = (frames[0] / len(S), frames[1] / len(S))
+
+    if w_0.ndim == 0 or (w_0 == w_0.flat[0]).all():
+        # delta u is the same for every step, same sequential sum as u += delta_u
+        w = float(w_0.flat[0])
+        delta = w * scale[0] + (1.0 - w) * scale[1]
+        u = np.cumsum(np.full(int(len(S) / delta) + 2, delta))
+        u = np.concatenate(([0.0], u[u < len(S)]))
+        return u, np.full(len(u), w), np.full(len(u), delta)
+
+    # only scalar interpolation is sequential
+    S_0 = S[:, 0].tolist()
+    w_0 = w_0.tolist()
+    u_list = []
+    w_list = []
+
+    u = 0.0
+    w = interpolateFrame(w_0, 0.0)
+    while u < len(S):
+        u_list.append(u)
+        w_list.append(w)
+        u += w * scale[0] + (1.0 - w) * scale[1]
+        w = interpolateFrame(w_0, interpolateFrame(S_0, u))
+
+    w = np.array(w_list)
+    return np.array(u_list), w, w * scale[0] + (1.0 - w) * scale[1]
+
+# blend 2 motions along registration curve, vectorized version of blendMotion
+# return:
+# B:        np.ndarray, shape is (steps, joints+1, 3), same layout as MotionData.M
+# parameter:
+# samples:  tuple, from blendSamples
+# u, w, delta_u:    np.ndarray, from blendSteps
+def synthesizeBlend(samples, u, w, delta_u):
+    S, A, M0, M1 = samples
+    w_0 = w[:, None, None]
+    w_1 = 1.0 - w
+
+    A_u = interpolateFrames(A, u)
+    M0_u = interpolateFrames(M0, u)
+    M1_u = interpolateFrames(M1, u)
+    B = w_0 * M0_u + (1.0 - w_0) * M1_u
+    B[:, 0] = w_0[:, 0] * M0_u[:, 0] + w_1[:, None] * applyTransform(A_u, M1_u[:, 0])
+
+    # A of motion 0 is identity, it does not change T
+    delta_A = composeTransform(A_u, inverseTransform(interpolateFrames(A, u + delta_u)))
+    T = accumulateRootTransform(delta_A[:, None], w_1[:, None])
+
+    B[:, 0] = applyTransform(T, B[:, 0])
+    return B
+
+# root transform of every step of blended motion
+# T(t) = sum of w_j * (T(t-1) @ A_j(u(t-1)) @ A_j(u(t))^-1)
+# rotation of all terms only differ by delta theta of A_j, translation by R(theta(t-1)) @ d_j,
+# so theta and translation are cumulative sums
+# return:
+# T:        np.ndarray, shape is (steps, 3)
+# parameter:
+# delta_A:  np.ndarray, shape is (steps, N, 3), A_j(u(t)) @ A_j(u(t+1))^-1
+# w:        np.ndarray, shape is (steps, N), weight of every motion of every step
+def accumulateRootTransform(delta_A, w):
+    theta = (w * wrapAngle(delta_A[..., 0])).sum(axis=-1)
+    d_y = (w * delta_A[..., 1]).sum(axis=-1)
+    d_x = (w * delta_A[..., 2]).sum(axis=-1)
+
+    T = np.zeros((len(w), 3))
+    T[1:, 0] = np.cumsum(theta[:-1])
+    cos, sin = np.cos(T[:-1, 0]), np.sin(T[:-1, 0])
+    T[1:, 1] = np.cumsum(sin * d_x[:-1] + cos * d_y[:-1])
+    T[1:, 2] = np.cumsum(cos * d_x[:-1] - sin * d_y[:-1])
+    return T
+
+# registration of 2 motions, all results are np.ndarray
+# S:                np.ndarray, shape is (U, 2), time warp path
+# path_transforms:  np.ndarray, shape is (U, 3)
+# A:                np.ndarray, shape is (U, 3), alignment curve of motion 1
+# transform_map, distance_map:  np.ndarray, only for 'FULL' time warp, else None
+class Registration:
+    RESULT_NAMES = ('S', 'path_transforms', 'A', 'transform_map', 'distance_map')
+
+    # parameter:
+    # motion_0, motion_1:   MotionData
+    # timewarp_method:      str, 'FULL', 'BAND' or 'MULTISCALE'
+    # timewarp_radius:      int, radius of band
+    # timewarp_max_run:     int, max consecutive non-diagonal steps, 0 is unlimited
+    # use_numba:            bool
+    # frame:                int, amount of frames of alignment window
+    def __init__(self, motion_0, motion_1,
+        timewarp_method='FULL', timewarp_radius=8, timewarp_max_run=0, use_numba=True,
+        frame=registrationCore.ALIGNMENT_WINDOW):
+        # joints are matched by name
+        self.motion_0 = motion_0
+        self.motion_1 = matchSkeleton(motion_1, motion_0.names)
+
+        self.timewarp_method = timewarp_method
+        self.timewarp_radius = timewarp_radius
+        self.timewarp_max_run = timewarp_max_run
+        self.use_numba = use_numba
+        self.frame = frame
+
+        self.transform_map = None
+        self.distance_map = None
+
+        self.generateTimewarpCurve()
+        self.generateAlignmentCurve()
+
+    def generateMaps(self):
+        p_0 = self.motion_0.positions
+        p_1 = self.motion_1.positions
+
+        # products of joint positions of every pair of frames, shared by both maps
+        moments = registrationCore.crossMoments(p_0, p_1)
+        self.transform_map = registrationCore.transformMap(p_0, p_1, self.frame, moments)
+        self.distance_map = registrationCore.distanceMap(p_0, p_1, self.transform_map, moments)
+
+    def generateTimewarpCurve(self):
+        p_0 = self.motion_0.positions
+        p_1 = self.motion_1.positions
+
+        if self.timewarp_method == 'FULL':
+            self.generateMaps()
+            path = registrationCore.timewarpPath(self.distance_map, self.timewarp_max_run, self.use_numba)
+            # transform of cells of path
+            self.path_transforms = self.transform_map[path[:, 0], path[:, 1]]
+
+        elif self.timewarp_method == 'BAND':
+            lo, hi = registrationCore.sakoeChibaBand(len(p_0), len(p_1), self.timewarp_radius)
+            path, self.path_transforms = registrationCore.bandedTimewarp(
+                p_0, p_1, lo, hi, self.frame, self.timewarp_max_run, self.use_numba)
+        else:
+            path, self.path_transforms = registrationCore.multiscaleTimewarp(
+                p_0, p_1, self.timewarp_radius, self.frame,
+                max_run=self.timewarp_max_run, use_numba=self.use_numba)
+
+        self.S = path
+
+    def generateAlignmentCurve(self):
+        self.A = alignmentCurve(self.path_transforms, self.S, self.motion_1.M[:, 0])
+
+    # return:
+    # results:  dict[str:np.ndarray], RESULT_NAMES, maps are None for band time warp
+    # parameter:
+    # keep_maps:bool, False drop transform_map and distance_map, they are (F0, F1) large
+    def getResults(self, keep_maps=True):
+        results = {name: getattr(self, name) for name in self.RESULT_NAMES}
+        if not keep_maps:
+            results['transform_map'] = None
+            results['distance_map'] = None
+        return results
+
+    # registration of computed results without running time warp again
+    # return:
+    # registration: Registration
+    # parameter:
+    # motion_0, motion_1:   MotionData
+    # results:              dict[str:np.ndarray], from getResults
+    # parameters:           same keyword parameters as __init__
+    @classmethod
+    def FromResults(cls, motion_0, motion_1, results, **parameters):
+        registration = cls.__new__(cls)
+        registration.motion_0 = motion_0
+        registration.motion_1 = matchSkeleton(motion_1, motion_0.names)
+
+        registration.timewarp_method = parameters.get('timewarp_method', 'FULL')
+        registration.timewarp_radius = parameters.get('timewarp_radius', 8)
+        registration.timewarp_max_run = parameters.get('timewarp_max_run', 0)
+        registration.use_numba = parameters.get('use_numba', True)
+        registration.frame = parameters.get('frame', registrationCore.ALIGNMENT_WINDOW)
+
+        for name in cls.RESULT_NAMES:
+            setattr(registration, name, results.get(name))
+        return registration
+
+    # samples are computed once, blend of other weight only interpolate them
+    def getBlendSamples(self):
+        if getattr(self, 'samples', None) is None:
+            self.samples = blendSamples(self.motion_0.M, self.motion_1.M, self.S, self.A)
+        return self.samples
+
+    # return:
+    # B:    np.ndarray, shape is (steps, joints+1, 3), blended motion
+    # parameter:
+    # w_0:  np.ndarray, shape is (F0,) weight of motion 0, or float for all frames
+    def blend(self, w_0):
+        samples = self.getBlendSamples()
+        u, w, delta_u = blendSteps(samples[0], (self.motion_0.frames, self.motion_1.frames), w_0)
+        return synthesizeBlend(samples, u, w, delta_u)
+
+# samples of motion registered to reference motion at every frame of reference motion,
+# frames of motion matched to the same reference frame are averaged,
+# reference frames not covered by time warp path are interpolated from covered frames
+# return:
+# frames:       np.ndarray, shape is (F_ref,), float frame of motion
+# A:            np.ndarray, shape is (F_ref, 3), alignment curve of motion
+# parameter:
+# S:            np.ndarray, shape is (U, 2), time warp path of (reference, motion)
+# A_path:       np.ndarray, shape is (U, 3)
+# reference_frames: int
+def referenceSamples(S, A_path, reference_frames):
+    counts = np.bincount(S[:, 0], minlength=reference_frames)
+    covered = np.flatnonzero(counts)
+
+    def average(weights):
+        return np.bincount(S[:, 0], weights=weights, minlength=reference_frames)[covered] / counts[covered]
+
+    # theta is unwrapped between covered frames, so interpolation does not cross -pi/pi the long way
+    A = np.stack([average(A_path[:, i]) for i in range(3)], axis=-1)
+    A[:, 0] = np.unwrap(A[:, 0])
+
+    # frames before first or after last covered frame take the nearest covered frame
+    index = np.arange(reference_frames)
+    frames = np.interp(index, covered, average(S[:, 1]))
+    A = np.stack([np.interp(index, covered, A[:, i]) for i in range(3)], axis=-1)
+    A[:, 0] = wrapAngle(A[:, 0])
+
+    return frames, A
+
+# registration of N motions, every motion is registered to the reference motion,
+# so time warp of all motions is through frames of reference motion and any weight vector
+# is blended in one pass without registering pairs again
+# registrations:    list[Registration], (reference, motion j), None for reference
+# weights:          np.ndarray, shape is (N, F_ref), weight curve of every motion
+class MultiRegistration:
+
+    # parameter:
+    # motions:      list[MotionData], all motions have the same joints, they are matched by name
+    # reference:    int, index of reference motion
+    # register:     function(motion_0, motion_1, **parameters), return Registration,
+    #               e.g. RegistrationCache.GetRegistration
+    # parameters:   keyword parameters of Registration
+    def __init__(self, motions, reference=0, register=None, **parameters):
+        if len(motions) < 2:
+            raise Exception("Need at least two motions")
+        if register is None:
+            register = Registration
+
+        reference_motion = motions[reference]
+        motions = [matchSkeleton(motion, reference_motion.names) for motion in motions]
+
+        self.motions = motions
+        self.reference = reference
+
+        self.registrations = [
+            None if j == reference else register(reference_motion, motion, **parameters)
+            for j, motion in enumerate(motions)]
+
+        self.generateSamples()
+
+        # reference motion only
+        self.weights = np.zeros((len(motions), reference_motion.frames))
+        self.weights[reference] = 1.0
+
+    # M: np.ndarray, shape is (N, F_ref, joints+1, 3), M of every motion at every reference frame
+    # A: np.ndarray, shape is (N, F_ref, 3), alignment curve, identity for reference motion
+    def generateSamples(self):
+        reference_frames = self.motions[self.reference].frames
+
+        self.M = np.empty((len(self.motions), reference_frames) + self.motions[self.reference].M.shape[1:])
+        self.A = np.zeros((len(self.motions), reference_frames, 3))
+        for j, (motion, registration) in enumerate(zip(self.motions, self.registrations)):
+            if registration is None:
+                self.M[j] = motion.M
+                continue
+
+            frames, self.A[j] = referenceSamples(registration.S, registration.A, reference_frames)
+            self.M[j] = interpolateFrames(motion.M, frames)
+
+    # parameter:
+    # weights:  np.ndarray, shape is (N,) for all frames or (N, F_ref) weight curves,
+    #           normalized to sum 1 at every frame
+    def setWeights(self, weights):
+        weights = np.broadcast_to(
+            np.asarray(weights, dtype=np.float64).reshape(len(self.motions), -1), self.weights.shape)
+        total = weights.sum(axis=0)
+        if (total <= 0.0).any():
+            raise Exception("Sum of weights must be positive")
+
+        self.weights = weights / total
+
+    # u of every step, a frame of motion j is F_ref / F_j reference frames,
+    # so length of blended motion is between lengths of motions
+    # return:
+    # u:        np.ndarray, shape is (steps,), float reference frame
+    # w:        np.ndarray, shape is (steps, N)
+    # delta_u:  np.ndarray, shape is (steps,)
+    def blendSteps(self):
+        reference_frames = self.weights.shape[1]
+        scale = np.array([reference_frames / motion.frames for motion in self.motions])
+
+        if (self.weights == self.weights[:, :1]).all():
+            w = self.weights[:, 0]
+            delta = float(w @ scale)
+            u = np.cumsum(np.full(int(reference_frames / delta) + 2, delta))
+            u = np.concatenate(([0.0], u[u < reference_frames]))
+            return u, np.broadcast_to(w, (len(u), len(w))), np.full(len(u), delta)
+
+        # only scalar interpolation is sequential
+        speed = (scale @ self.weights).tolist()
+        u_list = []
+        u = 0.0
+        while u < reference_frames:
+            u_list.append(u)
+            u += interpolateFrame(speed, u)
+
+        u = np.array(u_list)
+        w = interpolateFrames(self.weights.T, u)
+        return u, w, w @ scale
+
+    # return:
+    # B:        np.ndarray, shape is (steps, joints+1, 3), same layout as MotionData.M
+    # parameter:
+    # weights:  None is weights of setWeights, else same as setWeights
+    def blend(self, weights=None):
+        if weights is not None:
+            self.setWeights(weights)
+
+        u, w, delta_u = self.blendSteps()
+
+        # (steps, N, ...) samples of every motion
+        M_u = interpolateFrames(self.M.swapaxes(0, 1), u)
+        A_u = interpolateFrames(self.A.swapaxes(0, 1), u)
+
+        B = np.einsum('sn,snjc->sjc', w, M_u)
+        B[:, 0] = np.einsum('sn,snc->sc', w, applyTransform(A_u, M_u[:, :, 0]))
+
+        delta_A = composeTransform(A_u, inverseTransform(interpolateFrames(self.A.swapaxes(0, 1), u + delta_u)))
+        T = accumulateRootTransform(delta_A, w)
+
+        B[:, 0] = applyTransform(T, B[:, 0])
+        return B
@@ -0,0 +1,10 @@
+"""
+numpy modules of add-on are imported as top level modules, same as benchmarkRegistration.py,
+root of add-on is a package which import bpy
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
@@ -0,0 +1,73 @@
+"""
+checks of b-spline evaluation and fitting
+run from root of add-on: python -m pytest tests
+"""
+
+import numpy as np
+
+import bspline
+
+def test_basis_is_partition_of_unity():
+    t = np.linspace(0.0, 1.0, 50)
+    np.testing.assert_allclose(bspline.basisMatrix(t).sum(axis=1), 1.0)
+    np.testing.assert_allclose(bspline.basisMatrix(t, 1).sum(axis=1), 0.0, atol=1e-12)
+
+def test_evaluate_tangent_is_derivative_of_point():
+    rng = np.random.default_rng(0)
+    c_points = rng.normal(size=(7, 3))
+    # inside of segments, derivative jump at knots
+    t = np.linspace(0.01, 0.99, 40)
+    h = 1e-6
+
+    difference = (bspline.evaluate(t + h, c_points) - bspline.evaluate(t - h, c_points)) / (2.0 * h)
+    np.testing.assert_allclose(bspline.evaluate(t, c_points, 1), difference, rtol=1e-5, atol=1e-5)
+
+def test_fit_straight_line_exactly():
+    # uniform speed line, chord length parameter is uniform, line is in space of every spline
+    t = np.linspace(0.0, 1.0, 60)
+    Q = np.stack((3.0 + 40.0 * t, -2.0 + 10.0 * t, np.zeros_like(t)), axis=-1)
+
+    for segments in (1, 2, 5):
+        c_points, fit_t = bspline.fit(Q, segments)
+        assert c_points.shape == (segments + 3, 3)
+        np.testing.assert_allclose(fit_t, t, atol=1e-12)
+        np.testing.assert_allclose(bspline.evaluate(fit_t, c_points), Q, atol=1e-8)
+
+def test_fit_jump_keeps_empty_segments_on_line():
+    # jump of 100 in middle, chord length parameter leave segments 4 ~ 6 without data points
+    Q = np.zeros((40, 3))
+    Q[:, 0] = np.arange(40.0)
+    Q[20:, 0] += 100.0
+
+    c_points, t = bspline.fit(Q, 10)
+    np.testing.assert_allclose(bspline.evaluate(t, c_points), Q, atol=1e-6)
+    assert (np.diff(c_points[:, 0]) > 0.0).all()
+    np.testing.assert_allclose(np.diff(c_points[:, 0], 2), 0.0, atol=1e-6)
+
+def test_fit_curve_round_trip():
+    angle = np.linspace(0.0, 1.5 * np.pi, 200)
+    Q = np.stack((100.0 * np.cos(angle), 100.0 * np.sin(angle), np.zeros_like(angle)), axis=-1)
+
+    errors = []
+    for segments in (1, 4, 16):
+        c_points, t = bspline.fit(Q, segments)
+        errors.append(np.linalg.norm(bspline.evaluate(t, c_points) - Q, axis=1).max())
+    assert errors[0] > errors[1] > errors[2]
+    assert errors[2] < 0.1
+
+    c_points, t = bspline.fitWithTolerance(Q, 1.0)
+    assert np.linalg.norm(bspline.evaluate(t, c_points) - Q, axis=1).max() <= 1.0
+
+def test_reparameterize():
+    rng = np.random.default_rng(1)
+    Q = np.cumsum(rng.normal(size=(80, 3)), axis=0)
+    t = bspline.chordLengthParameter(Q)
+
+    np.testing.assert_allclose(bspline.reparameterize(t, Q, 1), t, atol=1e-12)
+
+    # local update of affected frames is same as whole update
+    segments = 6
+    whole = bspline.reparameterize(t, Q, segments)
+    frames = bspline.affectedFrames(t, segments, [4])
+    local = bspline.reparameterize(t, Q, segments, frames, re_t=t)
+    np.testing.assert_allclose(local[frames], whole[frames], atol=1e-12)
@@ -0,0 +1,90 @@
+"""
+checks of sidecar cache of parsed bvh, broken cache file is a miss and is removed
+run from root of add-on: python -m pytest tests
+"""
+
+import json
+import os
+import shutil
+import struct
+
+import numpy as np
+
+import bvhReader
+from bvhCache import BvhCache, MAGIC
+
+SAMPLE_DIRECTORY = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bvh_sample_files", "bvh_sample_files")
+
+AXIS = ('X', 'Z', 'Y')
+
+# copy of sample file in temp directory and its parsed data saved to cache
+def savedSample(tmp_path, name="walk_loop.bvh"):
+    path = str(tmp_path / name)
+    shutil.copy(os.path.join(SAMPLE_DIRECTORY, name), path)
+
+    with open(path, 'r') as file:
+        joints, frames, frame_time = bvhReader.readHierarchy(file)
+        channel_index, channel_amount = bvhReader.computeJointsChannelIndex(joints, AXIS)
+        anim_data = bvhReader.createAnimData(bvhReader.readFrames(file, channel_amount, frames), channel_index)
+
+    assert BvhCache.Save(path, AXIS, joints, frames, frame_time, anim_data)
+    return path, joints, frames, anim_data
+
+def rewriteHeader(cache_path, change):
+    with open(cache_path, 'rb') as cache_file:
+        header, data_offset = BvhCache.readHeader(cache_file)
+        cache_file.seek(data_offset)
+        data = cache_file.read()
+
+    change(header)
+    header_bytes = json.dumps(header).encode('utf-8')
+    header_bytes += b' ' * (data_offset - len(MAGIC) - 4 - len(header_bytes))
+    with open(cache_path, 'wb') as cache_file:
+        cache_file.write(MAGIC + struct.pack('<I', len(header_bytes)) + header_bytes + data)
+
+def test_load_saved_cache(tmp_path):
+    path, joints, frames, anim_data = savedSample(tmp_path)
+
+    cached = BvhCache.Load(path, AXIS)
+    assert cached is not None
+    # offsets of header are lists
+    assert [joint['name'] for joint in cached[0]] == [joint['name'] for joint in joints]
+    assert cached[1] == frames
+    np.testing.assert_array_equal(cached[3], anim_data)
+
+    # other axis has own cache file
+    assert BvhCache.Load(path, ('X', 'Y', 'Z')) is None
+
+def test_stale_cache_is_miss(tmp_path):
+    path, joints, frames, anim_data = savedSample(tmp_path)
+    with open(path, 'a') as file:
+        file.write("\n")
+
+    assert BvhCache.Load(path, AXIS) is None
+
+def test_truncated_data_is_removed(tmp_path):
+    path, joints, frames, anim_data = savedSample(tmp_path)
+    cache_path = BvhCache.GetCachePath(path, AXIS)
+    with open(cache_path, 'r+b') as cache_file:
+        cache_file.truncate(os.path.getsize(cache_path) - 100)
+
+    assert BvhCache.Load(path, AXIS) is None
+    assert not os.path.exists(cache_path)
+
+def test_header_without_key_is_removed(tmp_path):
+    path, joints, frames, anim_data = savedSample(tmp_path)
+    cache_path = BvhCache.GetCachePath(path, AXIS)
+    rewriteHeader(cache_path, lambda header: header.pop('dtype'))
+
+    assert BvhCache.Load(path, AXIS) is None
+    assert not os.path.exists(cache_path)
+
+def test_broken_header_is_removed(tmp_path):
+    path, joints, frames, anim_data = savedSample(tmp_path)
+    cache_path = BvhCache.GetCachePath(path, AXIS)
+    with open(cache_path, 'wb') as cache_file:
+        cache_file.write(MAGIC + struct.pack('<I', 5) + b'{bad}')
+
+    assert BvhCache.Load(path, AXIS) is None
+    assert not os.path.exists(cache_path)
@@ -0,0 +1,91 @@
+"""
+checks of chunked frame reader against line by line parsing, on all sample files
+run from root of add-on: python -m pytest tests
+"""
+
+import io
+import os
+
+import numpy as np
+import pytest
+
+import bvhReader
+
+SAMPLE_DIRECTORY = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bvh_sample_files", "bvh_sample_files")
+
+def sampleFiles():
+    return sorted(
+        os.path.join(SAMPLE_DIRECTORY, name) for name in os.listdir(SAMPLE_DIRECTORY)
+        if name.lower().endswith(".bvh"))
+
+def readChannelAmount(file):
+    joints, frames, frame_time = bvhReader.readHierarchy(file)
+    return bvhReader.countChannels(joints), frames
+
+# line by line reference, same as reading of bvh before chunked reader
+def readFramesByLine(path):
+    with open(path, 'r') as file:
+        joints, frames, frame_time = bvhReader.readHierarchy(file)
+        channel_amount = bvhReader.countChannels(joints)
+
+        rows = []
+        for line in file:
+            tokens = line.split()
+            if len(tokens) != channel_amount:
+                continue
+            rows.append([float(token) for token in tokens])
+            if len(rows) == frames:
+                break
+
+    return np.array(rows, dtype=np.float64).reshape(-1, channel_amount), frames
+
+def test_read_frames_same_as_line_by_line():
+    for path in sampleFiles():
+        reference, frames = readFramesByLine(path)
+        assert len(reference) == frames
+
+        with open(path, 'r') as file:
+            joints, frames, frame_time = bvhReader.readHierarchy(file)
+            frames_data = bvhReader.readFrames(file, bvhReader.countChannels(joints), frames)
+
+        np.testing.assert_array_equal(frames_data, reference, err_msg=path)
+
+def test_iter_frames_same_as_line_by_line():
+    for path in sampleFiles():
+        reference, frames = readFramesByLine(path)
+
+        # small chunk, most chunks end in the middle of motion
+        chunks = list(bvhReader.iterFrames(path, chunk=37))
+        assert all(len(chunk) <= 37 for chunk in chunks)
+        np.testing.assert_array_equal(np.concatenate(chunks), reference, err_msg=path)
+
+def test_parse_frames_of_text():
+    text = "1 2 3\n4 5 6\n\n7 8 9\n"
+    np.testing.assert_array_equal(bvhReader.parseFrames(text, 3), [[1, 2, 3], [4, 5, 6], [7, 8, 9]])
+    np.testing.assert_array_equal(bvhReader.parseFrames(text, 3, frames=2), [[1, 2, 3], [4, 5, 6]])
+    assert bvhReader.parseFrames(text, 3, dtype=np.float32).dtype == np.float32
+
+def test_read_frames_without_frame_count():
+    file = io.StringIO("1 2\n3 4\n5 6\n")
+    np.testing.assert_array_equal(bvhReader.readFrames(file, 2, None, chunk=2), [[1, 2], [3, 4], [5, 6]])
+
+def test_broken_lines_are_skipped_not_shifted():
+    # short and long lines in middle of chunk, baseline skipped those lines
+    text = "1 2 3\n4 5\n6 7 8\n9 10 11 12 13\n14 15 16\n"
+    np.testing.assert_array_equal(bvhReader.parseFrames(text, 3), [[1, 2, 3], [6, 7, 8], [14, 15, 16]])
+
+    path = os.path.join(SAMPLE_DIRECTORY, "walk_loop.bvh")
+    with open(path, 'r') as file:
+        lines = file.readlines()
+    first = next(k for k, line in enumerate(lines) if line.strip().lower().startswith('frame time')) + 1
+    lines[first + 50] = ' '.join(lines[first + 50].split()[:-1]) + '\n'
+
+    with open(path, 'r') as file:
+        reference = bvhReader.readFrames(file, *readChannelAmount(file))
+    frames_data = bvhReader.readFrames(io.StringIO(''.join(lines[first:])), reference.shape[1], chunk=37)
+    np.testing.assert_array_equal(frames_data, np.delete(reference, 50, axis=0))
+
+def test_not_number_raise():
+    with pytest.raises(ValueError):
+        bvhReader.parseFrames("1 2 3\n4 x 6\n", 3)
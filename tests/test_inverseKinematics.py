@@ -0,0 +1,67 @@
+"""
+checks of batched leg solvers, only numpy is needed
+run from root of add-on: python -m pytest tests
+"""
+
+import numpy as np
+
+import inverseKinematics
+
+# (F, 3, 3) legs (foot, knee, hip) with random bend and reachable targets of foot
+def randomLegs(frames=200, seed=0):
+    rng = np.random.default_rng(seed)
+
+    hip = rng.normal(size=(frames, 3)) * 10.0
+    knee = hip + inverseKinematics.normalize(rng.normal(size=(frames, 3))) * rng.uniform(3.0, 5.0, (frames, 1))
+    foot = knee + inverseKinematics.normalize(rng.normal(size=(frames, 3))) * rng.uniform(3.0, 5.0, (frames, 1))
+    legs = np.stack((foot, knee, hip), axis=1)
+
+    lengths = boneLengths(legs)
+    reach = rng.uniform(np.abs(lengths[:, 0] - lengths[:, 1]) + 0.1, lengths.sum(axis=-1) - 0.1)
+    targets = hip + inverseKinematics.normalize(rng.normal(size=(frames, 3))) * reach[:, None]
+
+    return legs, targets
+
+def boneLengths(positions):
+    return np.linalg.norm(positions[:, :-1] - positions[:, 1:], axis=-1)
+
+def checkChain(legs, positions, rotations):
+    np.testing.assert_allclose(boneLengths(positions), boneLengths(legs), atol=1e-8)
+    np.testing.assert_array_equal(positions[:, -1], legs[:, -1])
+    np.testing.assert_allclose(np.linalg.norm(rotations, axis=-1), 1.0, atol=1e-8)
+
+def test_fabrik_keeps_bones_and_reaches_targets():
+    legs, targets = randomLegs()
+    # targets close to folded leg converge slowly
+    positions, rotations = inverseKinematics.solveFABRIK(legs, targets, legs[:, 1], iterations=1000, epsilon=1e-12)
+
+    checkChain(legs, positions, rotations)
+    np.testing.assert_allclose(positions[:, 0], targets, atol=1e-4)
+
+def test_two_bone_keeps_bones_and_reaches_targets():
+    legs, targets = randomLegs()
+    positions, rotations = inverseKinematics.solveTwoBone(legs, targets, legs[:, 1])
+
+    checkChain(legs, positions, rotations)
+    np.testing.assert_allclose(positions[:, 0], targets, atol=1e-8)
+
+def test_two_bone_straight_leg_with_knee_as_pole():
+    # unit chain along -z, pole is on line of hip to target
+    legs = np.array([[[0.0, 0.0, -2.0], [0.0, 0.0, -1.0], [0.0, 0.0, 0.0]]])
+    targets = np.array([[0.0, 0.0, -1.5]])
+    positions, rotations = inverseKinematics.solveTwoBone(legs, targets, legs[:, 1])
+
+    checkChain(legs, positions, rotations)
+    np.testing.assert_allclose(positions[:, 0], targets, atol=1e-12)
+
+def test_unreachable_target_stretch_toward_target():
+    legs, targets = randomLegs(frames=20, seed=1)
+    direction = inverseKinematics.normalize(targets - legs[:, 2])
+    targets = legs[:, 2] + direction * (boneLengths(legs).sum(axis=-1) + 5.0)[:, None]
+
+    for solve in (inverseKinematics.solveFABRIK, inverseKinematics.solveTwoBone):
+        positions, rotations = solve(legs, targets, legs[:, 1])
+
+        checkChain(legs, positions, rotations)
+        np.testing.assert_allclose(
+            inverseKinematics.normalize(positions[:, 0] - legs[:, 2]), direction, atol=1e-6)
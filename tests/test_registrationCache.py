@@ -0,0 +1,96 @@
+"""
+checks of on-disk cache of registration results, broken cache file is registered again
+run from root of add-on: python -m pytest tests
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+import registrationPipeline
+from registrationCache import RegistrationCache
+
+SAMPLE_DIRECTORY = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bvh_sample_files", "bvh_sample_files")
+
+AXIS = ('X', 'Z', 'Y')
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(RegistrationCache, 'enabled', True)
+    monkeypatch.setattr(RegistrationCache, 'directory', str(tmp_path))
+    monkeypatch.setattr(RegistrationCache, 'hits', 0)
+    monkeypatch.setattr(RegistrationCache, 'misses', 0)
+    return RegistrationCache
+
+def loadMotions():
+    return [
+        registrationPipeline.motionFromFile(os.path.join(SAMPLE_DIRECTORY, name), AXIS)
+        for name in ("walk_loop.bvh", "frighten_walk.bvh")]
+
+def test_registration_is_read_from_cache(cache):
+    motion_0, motion_1 = loadMotions()
+    registration = cache.GetRegistration(motion_0, motion_1, timewarp_method='BAND')
+    cached = cache.GetRegistration(motion_0, motion_1, timewarp_method='BAND')
+
+    assert cache.GetStats() == {'hits': 1, 'misses': 1}
+    np.testing.assert_array_equal(cached.S, registration.S)
+    np.testing.assert_array_equal(cached.A, registration.A)
+
+    # other parameters are other key
+    assert cache.GetKey(motion_0, motion_1, {'timewarp_method': 'FULL'}) != \
+        cache.GetKey(motion_0, motion_1, {'timewarp_method': 'BAND'})
+
+def test_full_registration_need_maps(cache):
+    motion_0, motion_1 = loadMotions()
+    key = cache.GetKey(motion_0, motion_1, {})
+    cache.Save(key, registrationPipeline.Registration(motion_0, motion_1).getResults(keep_maps=False))
+
+    assert cache.Load(key, need_maps=True) is None
+    assert cache.Load(key) is not None
+
+@pytest.mark.parametrize('damage', ['truncate', 'empty', 'garbage'])
+def test_broken_cache_file_is_removed(cache, damage):
+    motion_0, motion_1 = loadMotions()
+    registration = cache.GetRegistration(motion_0, motion_1, timewarp_method='BAND')
+
+    key = cache.GetKey(motion_0, motion_1, {'timewarp_method': 'BAND'})
+    cache_path = cache.GetCachePath(key)
+    with open(cache_path, 'rb') as cache_file:
+        data = cache_file.read()
+    with open(cache_path, 'wb') as cache_file:
+        cache_file.write({'truncate': data[:len(data) // 2], 'empty': b'', 'garbage': b'PK' + data[::-1]}[damage])
+
+    assert cache.Load(key) is None
+    assert not os.path.exists(cache_path)
+
+    # registered again and saved
+    again = cache.GetRegistration(motion_0, motion_1, timewarp_method='BAND')
+    np.testing.assert_array_equal(again.S, registration.S)
+    assert cache.Load(key) is not None
+
+def test_evict_least_recently_used(cache):
+    for k in range(4):
+        key = "%040x" % k
+        cache.Save(key, {'S': np.zeros((1000, 2), dtype=np.intp) + k})
+        os.utime(cache.GetCachePath(key), ns=(k * 10 ** 9, k * 10 ** 9))
+
+    # newest 2 files fit
+    size = sum(os.path.getsize(cache.GetCachePath("%040x" % k)) for k in (2, 3))
+    assert cache.Evict(max_size=size) == 2
+    assert cache.Load("%040x" % 0) is None
+    assert cache.Load("%040x" % 3) is not None
+
+    assert cache.Clear() == 2
+
+def test_save_leave_no_temp_file(cache, tmp_path, monkeypatch):
+    key = "%040x" % 1
+    assert cache.Save(key, {'S': np.arange(10)})
+    assert os.listdir(str(tmp_path)) == [key + ".npz"]
+
+    def failedReplace(source, destination):
+        raise OSError("disk is full")
+    monkeypatch.setattr(os, 'replace', failedReplace)
+    assert not cache.Save("%040x" % 2, {'S': np.arange(10)})
+    assert os.listdir(str(tmp_path)) == [key + ".npz"]
@@ -0,0 +1,157 @@
+"""
+checks of time warp of registrationCore, only numpy is needed
+run from root of add-on: python -m pytest tests
+"""
+
+import os
+
+import numpy as np
+
+import registrationCore
+import registrationPipeline
+
+SAMPLE_DIRECTORY = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bvh_sample_files", "bvh_sample_files")
+
+# z is up in blender
+AXIS = ('X', 'Z', 'Y')
+
+def loadPositions(name):
+    return registrationPipeline.motionFromFile(os.path.join(SAMPLE_DIRECTORY, name), AXIS).positions
+
+# path end at last frame of both motion, start at first row or column,
+# every step is (1, 0), (0, 1) or (1, 1)
+def checkPath(path, frames_0, frames_1):
+    path = np.asarray(path)
+    assert tuple(path[-1]) == (frames_0 - 1, frames_1 - 1)
+    assert path[0, 0] == 0 or path[0, 1] == 0
+
+    steps = np.diff(path, axis=0)
+    assert ((steps >= 0) & (steps <= 1)).all()
+    assert (steps.sum(axis=1) > 0).all()
+
+def checkBand(lo, hi, frames_1):
+    assert (hi > lo).all()
+    assert lo[0] == 0 and hi[-1] == frames_1
+    assert (np.diff(lo) >= 0).all() and (np.diff(hi) >= 0).all()
+
+def test_band_from_path_not_starting_at_origin():
+    # backtracking stop at first column, coarse path start at (10, 0)
+    path = np.array([(10 + k, k) for k in range(4)])
+    lo, hi = registrationCore.bandFromPath(path, 28, 8, 1)
+    checkBand(lo, hi, 8)
+
+def test_multiscale_with_frozen_start():
+    p_1 = loadPositions("walk_loop.bvh")
+    p_0 = np.concatenate((np.repeat(p_1[:1], 120, axis=0), p_1))
+
+    path, transforms = registrationCore.multiscaleTimewarp(p_0, p_1, radius=2, min_size=32)
+    checkPath(path, len(p_0), len(p_1))
+    assert len(transforms) == len(path)
+
+def test_timewarp_path_same_as_list_version():
+    rng = np.random.default_rng(0)
+    for k in range(30):
+        distance_map = rng.random((rng.integers(1, 40), rng.integers(1, 40)))
+        path = registrationCore.timewarpPath(distance_map)
+        np.testing.assert_array_equal(path, registrationCore.minimalCostConnectingPath(distance_map.tolist()))
+
+    # ties of integer costs follow the same rule
+    distance_map = rng.integers(0, 3, (30, 25)).astype(np.float64)
+    path = registrationCore.timewarpPath(distance_map)
+    np.testing.assert_array_equal(path, registrationCore.minimalCostConnectingPath(distance_map.tolist()))
+
+def test_timewarp_path_of_motions_same_as_list_version():
+    p_0 = loadPositions("walk_loop.bvh")
+    p_1 = loadPositions("frighten_walk.bvh")
+    distance_map = registrationCore.distanceMap(p_0, p_1, registrationCore.transformMap(p_0, p_1))
+
+    path = registrationCore.timewarpPath(distance_map)
+    np.testing.assert_array_equal(path, registrationCore.minimalCostConnectingPath(distance_map.tolist()))
+
+    # without max run limit, run limited kernel find path of same cost
+    limited = registrationCore.timewarpPath(distance_map, max_run=len(p_0) + len(p_1), use_numba=False)
+    checkPath(limited, len(p_0), len(p_1))
+
+# per cell reference of transformMap and distanceMap
+def cellTransformDistance(p_0, p_1, F0, F1):
+    theta, y, x = registrationCore.alignmentTransformation(p_0, p_1, F0, F1)
+    cos, sin = np.cos(theta), np.sin(theta)
+
+    q = p_1[F1]
+    moved = np.stack((cos * q[:, 0] - sin * q[:, 1] + x, sin * q[:, 0] + cos * q[:, 1] + y, q[:, 2]), axis=-1)
+    return (theta, y, x), np.mean(np.sum((p_0[F0] - moved) ** 2, axis=-1))
+
+def test_maps_same_as_per_cell_reference():
+    p_0 = loadPositions("walk_loop.bvh")[:40]
+    p_1 = loadPositions("frighten_walk.bvh")[:30]
+
+    transform_map = registrationCore.transformMap(p_0, p_1)
+    distance_map = registrationCore.distanceMap(p_0, p_1, transform_map)
+
+    for F0 in range(len(p_0)):
+        for F1 in range(len(p_1)):
+            transform, distance = cellTransformDistance(p_0, p_1, F0, F1)
+            np.testing.assert_allclose(transform_map[F0, F1], transform, rtol=1e-6, atol=1e-6)
+            np.testing.assert_allclose(distance_map[F0, F1], distance, rtol=1e-4, atol=1e-3)
+
+def test_band_maps_same_as_full_maps():
+    p_0 = loadPositions("walk_loop.bvh")
+    p_1 = loadPositions("frighten_walk.bvh")
+    transform_map = registrationCore.transformMap(p_0, p_1)
+    distance_map = registrationCore.distanceMap(p_0, p_1, transform_map)
+
+    for lo, hi in (
+        registrationCore.fullBand(len(p_0), len(p_1)),
+        registrationCore.sakoeChibaBand(len(p_0), len(p_1), 4)):
+        rows, cols, offsets = registrationCore.bandCells(lo, hi)
+        transforms, moments = registrationCore.transformMapBand(p_0, p_1, lo, hi)
+        distances = registrationCore.distanceMapBand(p_0, p_1, lo, hi, transforms, moments)
+
+        np.testing.assert_allclose(transforms, transform_map[rows, cols], atol=1e-8)
+        np.testing.assert_allclose(distances, distance_map[rows, cols], rtol=1e-5, atol=1e-3)
+
+def test_banded_timewarp_with_full_band_same_as_full():
+    p_0 = loadPositions("walk_loop.bvh")
+    p_1 = loadPositions("frighten_walk.bvh")
+    transform_map = registrationCore.transformMap(p_0, p_1)
+    distance_map = registrationCore.distanceMap(p_0, p_1, transform_map)
+
+    lo, hi = registrationCore.fullBand(len(p_0), len(p_1))
+    path, transforms = registrationCore.bandedTimewarp(p_0, p_1, lo, hi)
+
+    np.testing.assert_array_equal(path, registrationCore.timewarpPath(distance_map))
+    np.testing.assert_allclose(transforms, transform_map[path[:, 0], path[:, 1]], atol=1e-8)
+
+def test_banded_and_multiscale_paths_are_valid():
+    # breakdance is 10 times longer than actor, it need runs longer than 4
+    pairs = [
+        ("walk_loop.bvh", "frighten_walk.bvh", (0, 4)),
+        ("cowboy.bvh", "footballexsize.bvh", (0, 4)),
+        ("breakdance.bvh", "actor.bvh", (0,))]
+    for name_0, name_1, max_runs in pairs:
+        p_0 = loadPositions(name_0)
+        p_1 = loadPositions(name_1)
+
+        lo, hi = registrationCore.sakoeChibaBand(len(p_0), len(p_1), 8)
+        for max_run in max_runs:
+            path, transforms = registrationCore.bandedTimewarp(p_0, p_1, lo, hi, max_run=max_run, use_numba=False)
+            checkPath(path, len(p_0), len(p_1))
+            assert ((path[:, 1] >= lo[path[:, 0]]) & (path[:, 1] < hi[path[:, 0]])).all()
+
+            path, transforms = registrationCore.multiscaleTimewarp(p_0, p_1, 8, min_size=32, max_run=max_run, use_numba=False)
+            checkPath(path, len(p_0), len(p_1))
+            assert len(transforms) == len(path)
+
+def test_multiscale_close_to_full_path():
+    p_0 = loadPositions("cowboy.bvh")
+    p_1 = loadPositions("footballexsize.bvh")
+    distance_map = registrationCore.distanceMap(p_0, p_1, registrationCore.transformMap(p_0, p_1))
+
+    full = registrationCore.timewarpPath(distance_map)
+    path, transforms = registrationCore.multiscaleTimewarp(p_0, p_1, 8)
+
+    def cost(path):
+        return distance_map[path[:, 0], path[:, 1]].sum()
+
+    assert cost(path) <= 1.01 * cost(full)